@@ -33,8 +33,8 @@ async def main():
     )
 
     # text = "This is a Legal document"
-    text = pdf_content_extractor_engine.run()
-    doc_clf_response = doc_classifier_engine.run(text, DIR_STRUCTURE)
+    text = await pdf_content_extractor_engine.arun()
+    doc_clf_response = await doc_classifier_engine.arun(text, DIR_STRUCTURE)
     rprint(doc_clf_response)
     # %%
 
@@ -44,7 +44,7 @@ async def main():
 
     kg_extractor_engine = KGExtractorEngine(config=KGExtractorEngineConfig(llm_model_id=LLMOptions.OPENAI_O3_MINI))
 
-    full_nodes, full_relations = await kg_extractor_engine.run(text, node_classes_list, relation_classes_list, ontology_name)
+    full_nodes, full_relations, _ = await kg_extractor_engine.run(text, node_classes_list, relation_classes_list, ontology_name)
     kg_extractor_engine.plot_network(full_nodes, full_relations)
 
 
@@ -0,0 +1,199 @@
+import asyncio
+import datetime
+import enum
+import random
+import time
+import types
+from collections import deque
+from typing import Any, Literal, Union, cast, get_args, get_origin
+
+from annotated_types import Ge, Gt, Le, Lt
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel, Field
+from pydantic_core import PydanticUndefined
+
+from sw_ai_service.llm.tokens import estimate_tokens
+
+WORDS = ["sözleşme", "taraf", "madde", "bedel", "tarih", "kira", "işveren", "teslim", "süre", "fesih", "ödeme", "adres", "hüküm", "yükümlülük"]
+# nested models deeper than this are left empty when the field allows it, so recursive schemas terminate
+MAX_DEPTH = 4
+
+
+class FakeLLMConfig(BaseModel):
+    latency_seconds: float = Field(default=0.05, ge=0)
+    latency_jitter: float = Field(default=0.5, ge=0, le=1, description="Latency varies uniformly by this share around latency_seconds")
+    error_rate: float = Field(default=0.0, ge=0, le=1, description="Share of calls failing with a retryable 429 error")
+    requests_per_minute: int | None = Field(default=None, ge=1, description="Calls above this rate fail with a 429 error like a provider would")
+    list_items: int = Field(default=2, ge=0, description="Items generated for every list field, scales the number of extracted nodes")
+    words_per_string: int = Field(default=4, ge=1)
+    seed: int = 0
+
+
+class FakeLLMStats(BaseModel):
+    calls: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+
+class FakeLLMError(RuntimeError):
+    """Transient provider error, status_code 429 makes the scheduler retry it"""
+
+    def __init__(self, message: str, status_code: int = 429):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _FakeRunResponse(BaseModel):
+    content: Any
+
+
+class FakeAgent:
+    """Stand-in for an agno agent with a response model"""
+
+    def __init__(self, llm: "FakeLLM", response_model: type[BaseModel]):
+        self.llm = llm
+        self.response_model = response_model
+
+    def run(self, message: str) -> _FakeRunResponse:
+        return _FakeRunResponse(content=self.llm.respond(message, self.response_model))
+
+    async def arun(self, message: str) -> _FakeRunResponse:
+        return _FakeRunResponse(content=await self.llm.arespond(message, self.response_model))
+
+
+class FakeLLM:
+    """Deterministic local model returning schema-valid structured outputs, with configurable latency, errors and rate limits"""
+
+    def __init__(self, config: FakeLLMConfig | None = None, model_name: str = "fake-model"):
+        self.config = config or FakeLLMConfig()
+        self.model_name = model_name
+        self.stats = FakeLLMStats()
+        self._rng = random.Random(self.config.seed)  # noqa: S311
+        self._calls: deque[float] = deque()
+
+    def _admit(self, prompt: str) -> None:
+        """Counts the call and raises the error a provider would return for it"""
+        self.stats.calls += 1
+        self.stats.input_tokens += estimate_tokens(prompt)
+        if self.config.requests_per_minute is not None:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.config.requests_per_minute:
+                self.stats.rate_limited += 1
+                raise FakeLLMError("rate limit exceeded")
+            self._calls.append(now)
+        if self._rng.random() < self.config.error_rate:
+            self.stats.errors += 1
+            raise FakeLLMError("server overloaded")
+
+    def _latency(self) -> float:
+        jitter = self.config.latency_seconds * self.config.latency_jitter
+        return max(0.0, self._rng.uniform(self.config.latency_seconds - jitter, self.config.latency_seconds + jitter))
+
+    def _output(self, response_model: type[BaseModel]) -> BaseModel:
+        response = sample_model(response_model, self._rng, self.config.list_items, self.config.words_per_string)
+        self.stats.output_tokens += estimate_tokens(response.model_dump_json())
+        return response
+
+    def respond(self, prompt: str, response_model: type[BaseModel]) -> BaseModel:
+        self._admit(prompt)
+        time.sleep(self._latency())
+        return self._output(response_model)
+
+    async def arespond(self, prompt: str, response_model: type[BaseModel]) -> BaseModel:
+        self._admit(prompt)
+        await asyncio.sleep(self._latency())
+        return self._output(response_model)
+
+    def with_structured_output(self, schema: type[BaseModel], include_raw: bool = False, **kwargs: Any) -> RunnableLambda:
+        """Drop-in for ChatOpenAI.with_structured_output, the prompt value is only used to count tokens; include_raw wraps the response with a raw message carrying its token usage"""
+
+        def output(prompt: str, response: BaseModel) -> Any:
+            if not include_raw:
+                return response
+            usage = {"input_tokens": estimate_tokens(prompt), "output_tokens": estimate_tokens(response.model_dump_json())}
+            raw = AIMessage(content=response.model_dump_json(), usage_metadata={**usage, "total_tokens": usage["input_tokens"] + usage["output_tokens"]})
+            return {"raw": raw, "parsed": response, "parsing_error": None}
+
+        def invoke(prompt_value: Any) -> Any:
+            prompt = _prompt_text(prompt_value)
+            return output(prompt, self.respond(prompt, schema))
+
+        async def ainvoke(prompt_value: Any) -> Any:
+            prompt = _prompt_text(prompt_value)
+            return output(prompt, await self.arespond(prompt, schema))
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+    def agent(self, response_model: type[BaseModel]) -> FakeAgent:
+        """Drop-in for the agno agents of the doc classifier"""
+        return FakeAgent(self, response_model)
+
+
+def _prompt_text(prompt_value: Any) -> str:
+    return prompt_value.to_string() if hasattr(prompt_value, "to_string") else str(prompt_value)
+
+
+def _bounds(metadata: list[Any]) -> tuple[float | None, float | None]:
+    lower: float | None = None
+    upper: float | None = None
+    # only asked for int and float fields, whose annotated_types bounds are numbers
+    for constraint in metadata:
+        if isinstance(constraint, Ge | Gt):
+            lower = cast(float, constraint.ge) if isinstance(constraint, Ge) else cast(float, constraint.gt) + 1
+        elif isinstance(constraint, Le | Lt):
+            upper = cast(float, constraint.le) if isinstance(constraint, Le) else cast(float, constraint.lt) - 1
+    return lower, upper
+
+
+def sample_value(annotation: Any, rng: random.Random, list_items: int, words_per_string: int, metadata: list[Any] | None = None, depth: int = 0) -> Any:
+    """Value of the annotated type; enums take their first member and bounded numbers their upper bound, so answers are valid and predictable"""
+    origin = get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        options = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if depth >= MAX_DEPTH and len(options) < len(get_args(annotation)):
+            return None
+        return sample_value(options[0], rng, list_items, words_per_string, metadata, depth)
+    if origin is list:
+        (item_type,) = get_args(annotation) or (str,)
+        return [sample_value(item_type, rng, list_items, words_per_string, None, depth + 1) for _ in range(list_items)]
+    if origin is Literal:
+        return get_args(annotation)[0]
+    if isinstance(annotation, type):
+        if issubclass(annotation, BaseModel):
+            return sample_model(annotation, rng, list_items, words_per_string, depth + 1)
+        if issubclass(annotation, enum.Enum):
+            return next(iter(annotation))
+        if issubclass(annotation, bool):
+            return rng.random() < 0.5
+        if issubclass(annotation, int | float):
+            lower, upper = _bounds(metadata or [])
+            value = upper if upper is not None else lower if lower is not None else 1
+            return annotation(value)
+        if issubclass(annotation, datetime.datetime):
+            return datetime.datetime(2024, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+        if issubclass(annotation, datetime.date):
+            return datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+        if issubclass(annotation, str):
+            return " ".join(rng.choice(WORDS) for _ in range(words_per_string))
+    if annotation is Any:
+        return None
+    raise TypeError(f"Cannot generate a fake value for {annotation!r}")
+
+
+def sample_model(model: type[BaseModel], rng: random.Random, list_items: int = 2, words_per_string: int = 4, depth: int = 0) -> BaseModel:
+    """Schema-valid instance of model, fields with a default factory (ids, timestamps) keep their default"""
+    data = {}
+    for name, field_info in model.model_fields.items():
+        if field_info.default_factory is not None:
+            continue
+        if depth >= MAX_DEPTH and not field_info.is_required():
+            continue
+        data[name] = sample_value(field_info.annotation, rng, list_items, words_per_string, field_info.metadata, depth)
+        if data[name] is None and field_info.default is PydanticUndefined:
+            data.pop(name)
+    return model.model_validate(data)
@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, Field
+from rich import print as rprint
+from rich.table import Table
+
+from sw_ai_service.benchmark.fake_llm import FakeLLM, FakeLLMConfig, FakeLLMStats
+from sw_ai_service.benchmark.synthetic import write_synthetic_pdf
+from sw_ai_service.configs import LLMOptions, NodeGroupModeEnum, PDFLoaderEnum, PDFLoaderModeEnum, VerbosityEnum
+from sw_ai_service.doc_classifier.engine import Engine as DocClassifierEngine
+from sw_ai_service.doc_classifier.engine import EngineConfig as DocClassifierEngineConfig
+from sw_ai_service.llm.scheduler import RateLimit, SchedulerConfig
+from sw_ai_service.pdf_content_extractor.engine import Engine as PDFContentExtractorEngine
+from sw_ai_service.pdf_content_extractor.engine import EngineConfig as PDFContentExtractorEngineConfig
+from sw_ai_service.pdf_content_extractor.engine import get_parse_pool, shutdown_parse_pools
+from sw_ai_service.tracing import TRACER, TracingConfig
+
+STAGES = ["parse", "classify", "extract"]
+
+
+class BenchmarkScenario(BaseModel):
+    name: str
+    pages: int = Field(ge=1)
+    lines_per_page: int = Field(default=20, ge=1)
+    list_items: int = Field(default=2, ge=0, description="Items the fake model returns for every list field, scales the number of nodes and relation pairs")
+
+
+DEFAULT_SCENARIOS = [
+    BenchmarkScenario(name="small", pages=2, list_items=1),
+    BenchmarkScenario(name="medium", pages=10, list_items=3),
+    BenchmarkScenario(name="large", pages=40, list_items=6),
+]
+
+
+class BenchmarkConfig(BaseModel):
+    scenarios: list[BenchmarkScenario] = Field(default_factory=lambda: list(DEFAULT_SCENARIOS))
+    stages: list[str] = Field(default_factory=lambda: list(STAGES))
+    fake_llm: FakeLLMConfig = Field(default_factory=FakeLLMConfig)
+    pdf_loader_id: PDFLoaderEnum = PDFLoaderEnum.PYPDF
+    parse_workers: int | None = Field(default=None, ge=1)
+    scheduler_max_in_flight: int = Field(default=32, ge=1)
+    scheduler_requests_per_minute: int | None = Field(default=None, ge=1, description="Rate limit the scheduler budgets for, unlimited by default so only orchestration is measured")
+    node_group_mode: NodeGroupModeEnum = Field(default=NodeGroupModeEnum.PER_CLASS, description="Grouped mode extracts several node classes per LLM call, compare both to measure the call savings")
+    # console output would be measured along with the pipeline
+    tracing: TracingConfig = Field(default_factory=lambda: TracingConfig(verbosity=VerbosityEnum.QUIET))
+
+
+class StageResult(BaseModel):
+    scenario: str
+    stage: str
+    wall_seconds: float
+    llm_calls: int
+    llm_errors: int
+    rate_limited: int
+    tokens_estimated: int
+    peak_rss_mb: float = Field(description="Peak resident memory of the benchmark process so far, parse workers are not included")
+    details: dict[str, Any] = Field(default_factory=dict)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+class Benchmark:
+    """Drives the PDF extractor, doc classifier and KG extractor on synthetic documents against a local fake model"""
+
+    def __init__(self, config: BenchmarkConfig, workdir: Path, dir_structure: dict | None = None):
+        self.config = config
+        self.workdir = workdir
+        self.dir_structure = dir_structure
+        TRACER.configure(config.tracing)
+
+    def _result(self, scenario: BenchmarkScenario, stage: str, start: float, before: FakeLLMStats, fake: FakeLLM, **details: Any) -> StageResult:
+        after = fake.stats
+        return StageResult(
+            scenario=scenario.name,
+            stage=stage,
+            wall_seconds=time.perf_counter() - start,
+            llm_calls=after.calls - before.calls,
+            llm_errors=after.errors - before.errors,
+            rate_limited=after.rate_limited - before.rate_limited,
+            tokens_estimated=after.input_tokens + after.output_tokens - before.input_tokens - before.output_tokens,
+            peak_rss_mb=peak_rss_mb(),
+            details=details,
+        )
+
+    def _scheduler_config(self) -> SchedulerConfig:
+        rpm = self.config.scheduler_requests_per_minute or 1_000_000
+        return SchedulerConfig(
+            max_in_flight=self.config.scheduler_max_in_flight,
+            rate_limits={},
+            default_rate_limit=RateLimit(requests_per_minute=rpm, tokens_per_minute=1_000_000_000),
+            base_delay=0.05,
+            max_delay=1.0,
+        )
+
+    async def run_scenario(self, scenario: BenchmarkScenario) -> list[StageResult]:
+        fake = FakeLLM(self.config.fake_llm.model_copy(update={"list_items": scenario.list_items}))
+        results = []
+        pdf_path = self.workdir / f"{scenario.name}.pdf"
+        pages = write_synthetic_pdf(pdf_path, scenario.pages, scenario.lines_per_page)
+        text = " ".join(pages)
+
+        if "parse" in self.config.stages:
+            start, before = time.perf_counter(), fake.stats.model_copy()
+            pdf_config = PDFContentExtractorEngineConfig(pdf_loader_id=self.config.pdf_loader_id, page_mode=PDFLoaderModeEnum.PAGE, pdf_path=pdf_path, parse_workers=self.config.parse_workers)
+            text = await PDFContentExtractorEngine(pdf_config).arun(get_parse_pool(self.config.pdf_loader_id, self.config.parse_workers))
+            results.append(self._result(scenario, "parse", start, before, fake, pages=scenario.pages, characters=len(text)))
+
+        lib_name = ontology_name = None
+        # extraction needs the classification to pick its ontology
+        if "classify" in self.config.stages or "extract" in self.config.stages:
+            if self.dir_structure is None:
+                from sw_onto_generation import DIR_STRUCTURE
+
+                self.dir_structure = DIR_STRUCTURE
+            # agno retries inside the agent, the classifier has no retry path a failing fake could exercise
+            classifier_fake = FakeLLM(self.config.fake_llm.model_copy(update={"error_rate": 0.0}))
+            start, before = time.perf_counter(), classifier_fake.stats.model_copy()
+            classifier_config = DocClassifierEngineConfig(llm_model_id=LLMOptions.OPENAI_GPT4_1_NANO, markdown=False, debug_mode=False)
+            classification = await DocClassifierEngine(classifier_config, agent_factory=classifier_fake.agent).arun(text, self.dir_structure)
+            lib_name, ontology_name = classification.lib_name, classification.ontology_name
+            # every stage reports the error rate it ran with, here always 0 whatever --error-rate says
+            results.append(self._result(scenario, "classify", start, before, classifier_fake, lib_name=lib_name, ontology_name=ontology_name, error_rate=classifier_fake.config.error_rate))
+
+        if "extract" in self.config.stages:
+            # imported here so the parse and classify stages run without the ontology package
+            from sw_onto_generation.utils import get_all_common_and_specific_root_classes
+
+            from sw_ai_service.kg_extractor.engine import Engine as KGExtractorEngine
+            from sw_ai_service.kg_extractor.engine import EngineConfig as KGExtractorEngineConfig
+
+            if ontology_name is None:
+                raise ValueError("the extract stage needs the ontology the classify stage picks")
+            start, before = time.perf_counter(), fake.stats.model_copy()
+            node_classes_list, relation_classes_list = get_all_common_and_specific_root_classes(lib_name=lib_name, ontology_name=ontology_name)
+            kg_config = KGExtractorEngineConfig(llm_model_id=LLMOptions.OPENAI_O3_MINI, scheduler=self._scheduler_config(), node_group_mode=self.config.node_group_mode)
+            full_nodes, full_relations, _ = await KGExtractorEngine(kg_config, llm=fake).run(text, node_classes_list, relation_classes_list, ontology_name)
+            results.append(self._result(scenario, "extract", start, before, fake, nodes=len(full_nodes), relations=len(full_relations), error_rate=fake.config.error_rate))
+        return results
+
+    async def run(self) -> list[StageResult]:
+        results = []
+        try:
+            for scenario in self.config.scenarios:
+                results.extend(await self.run_scenario(scenario))
+        finally:
+            shutdown_parse_pools()
+            TRACER.flush()
+        return results
+
+
+def print_results(results: list[StageResult]) -> None:
+    table = Table(title="Pipeline benchmark")
+    for column in ["scenario", "stage", "wall s", "LLM calls", "errors", "429s", "tokens", "peak RSS MB", "details"]:
+        table.add_column(column)
+    for result in results:
+        table.add_row(
+            result.scenario,
+            result.stage,
+            f"{result.wall_seconds:.3f}",
+            str(result.llm_calls),
+            str(result.llm_errors),
+            str(result.rate_limited),
+            str(result.tokens_estimated),
+            f"{result.peak_rss_mb:.1f}",
+            json.dumps(result.details, ensure_ascii=False),
+        )
+    rprint(table)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline offline against a fake LLM on synthetic documents")
+    parser.add_argument("--scenarios", default=",".join(scenario.name for scenario in DEFAULT_SCENARIOS), help="Comma separated names of the default scenarios")
+    parser.add_argument("--stages", default=",".join(STAGES))
+    parser.add_argument("--latency", type=float, default=FakeLLMConfig().latency_seconds, help="Mean latency of a fake LLM call in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of fake LLM calls failing with a 429, applies to extract only, classify always runs at 0")
+    parser.add_argument("--requests-per-minute", type=int, help="Rate limit of the fake LLM, the scheduler budgets for the same rate")
+    parser.add_argument("--node-group-mode", type=NodeGroupModeEnum, default=NodeGroupModeEnum.PER_CLASS, help="grouped extracts several node classes with one LLM call")
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON")
+    parser.add_argument("--trace-path", type=Path, help="Write spans per stage and per LLM call to this JSON-lines file")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",")
+    config = BenchmarkConfig(
+        scenarios=[scenario for scenario in DEFAULT_SCENARIOS if scenario.name in names],
+        stages=args.stages.split(","),
+        fake_llm=FakeLLMConfig(latency_seconds=args.latency, error_rate=args.error_rate, requests_per_minute=args.requests_per_minute),
+        scheduler_requests_per_minute=args.requests_per_minute,
+        node_group_mode=args.node_group_mode,
+        tracing=TracingConfig(enabled=args.trace_path is not None, export_path=args.trace_path, verbosity=VerbosityEnum.QUIET),
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(Benchmark(config, Path(workdir)).run())
+    print_results(results)
+    if args.output is not None:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps([result.model_dump() for result in results], indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import random
+from pathlib import Path
+
+# ASCII only, the synthetic PDFs use a standard font without an encoding table
+CLAUSE_TEMPLATES = [
+    "Madde {n}: Kiraya veren {name} ile kiraci {other} arasinda {day} tarihinde bu sozlesme imzalanmistir.",
+    "Madde {n}: Aylik kira bedeli {amount} TL olup her ayin {day_of_month}. gunu odenir.",
+    "Madde {n}: Kiraci mecuru {name} adresinde teslim almis ve depozito olarak {amount} TL odemistir.",
+    "Madde {n}: Sozlesmenin suresi {years} yil olup taraflardan {other} fesih hakkini sakli tutar.",
+    "Madde {n}: Isveren {name} isci {other} icin yillik {days} gun izin vermeyi kabul eder.",
+]
+NAMES = ["Ahmet Yilmaz", "Ayse Demir", "Mehmet Kaya", "Fatma Celik", "Ali Sahin", "Zeynep Arslan", "ABC Insaat A.S.", "Deniz Lojistik Ltd."]
+
+
+def synthetic_page(page: int, lines: int, rng: random.Random) -> str:
+    clauses = []
+    for i in range(lines):
+        template = rng.choice(CLAUSE_TEMPLATES)
+        clauses.append(
+            template.format(
+                n=page * lines + i + 1,
+                name=rng.choice(NAMES),
+                other=rng.choice(NAMES),
+                day=f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.2024",
+                amount=rng.randrange(1_000, 100_000, 250),
+                day_of_month=rng.randint(1, 28),
+                years=rng.randint(1, 5),
+                days=rng.randint(14, 30),
+            )
+        )
+    return " ".join(clauses).encode("ascii", "ignore").decode()
+
+
+def synthetic_pages(n_pages: int, lines_per_page: int = 20, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)  # noqa: S311
+    return [synthetic_page(page, lines_per_page, rng) for page in range(n_pages)]
+
+
+def make_pdf(page_texts: list[str]) -> bytes:
+    """Minimal multi-page PDF with one line of Helvetica text per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", ""]
+    kids = []
+    for text in page_texts:
+        page_id, content_id = len(objects) + 1, len(objects) + 2
+        kids.append(f"{page_id} 0 R")
+        escaped = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({escaped}) Tj ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {content_id} 0 R /Resources << /Font << /F1 {len(page_texts) * 2 + 3} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def write_synthetic_pdf(path: Path, n_pages: int, lines_per_page: int = 20, seed: int = 0) -> list[str]:
+    """Writes a synthetic contract of n_pages and returns the text of its pages"""
+    pages = synthetic_pages(n_pages, lines_per_page, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(make_pdf(pages))
+    return pages
@@ -11,6 +11,22 @@ class LLMOptions(StrEnum):
     OPENAI_GPT4_1_NANO = "gpt-4.1-nano"
 
 
+class LLMContextLimits(BaseModel):
+    context_window: int
+    max_output_tokens: int
+    max_schema_tokens: int = 4_000
+
+
+LLM_CONTEXT_LIMITS: dict[str, LLMContextLimits] = {
+    LLMOptions.OPENAI_O3: LLMContextLimits(context_window=200_000, max_output_tokens=100_000, max_schema_tokens=8_000),
+    LLMOptions.OPENAI_O3_MINI: LLMContextLimits(context_window=200_000, max_output_tokens=100_000, max_schema_tokens=6_000),
+    LLMOptions.OPENAI_GPT4o: LLMContextLimits(context_window=128_000, max_output_tokens=16_384, max_schema_tokens=6_000),
+    LLMOptions.OPENAI_GPT4o_MINI: LLMContextLimits(context_window=128_000, max_output_tokens=16_384, max_schema_tokens=4_000),
+    LLMOptions.OPENAI_GPT4_1_NANO: LLMContextLimits(context_window=1_047_576, max_output_tokens=32_768, max_schema_tokens=3_000),
+}
+DEFAULT_CONTEXT_LIMITS = LLMContextLimits(context_window=128_000, max_output_tokens=16_384)
+
+
 class PDFLoaderEnum(StrEnum):
     PYPDF = "pypdf"
     UNSTRUCTURED = "unstructured"
@@ -32,3 +48,39 @@ class AgentConfig(BaseModel):
 class PDFLoaderModeEnum(StrEnum):
     SINGLE = "single"
     PAGE = "page"
+
+
+class RelationBatchModeEnum(StrEnum):
+    NONE = "none"
+    RELATION_CLASS = "relation_class"
+    SOURCE_NODE = "source_node"
+
+
+class CacheModeEnum(StrEnum):
+    OFF = "off"
+    READ_WRITE = "read_write"
+    REPLAY = "replay"
+
+
+class NodeGroupModeEnum(StrEnum):
+    PER_CLASS = "per_class"
+    GROUPED = "grouped"
+
+
+class ClassificationModeEnum(StrEnum):
+    TWO_STEP = "two_step"
+    COMBINED = "combined"
+
+
+class VerbosityEnum(StrEnum):
+    QUIET = "quiet"
+    NORMAL = "normal"
+    VERBOSE = "verbose"
+
+
+class DocumentStageEnum(StrEnum):
+    PENDING = "pending"
+    PARSED = "parsed"
+    CLASSIFIED = "classified"
+    EXTRACTED = "extracted"
+    SKIPPED = "skipped"
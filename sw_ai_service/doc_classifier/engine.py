@@ -1,10 +1,16 @@
 import enum
+from collections.abc import Callable
+from typing import Any, Protocol
 
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
 from pydantic import BaseModel, Field
 
-from sw_ai_service.configs import LLMOptions
+from sw_ai_service.configs import ClassificationModeEnum, LLMOptions
+from sw_ai_service.doc_classifier.local_classifier import DOCUMENT_TYPE_SEPARATOR, UNK, LocalClassifier, LocalClassifierConfig
+from sw_ai_service.llm.cache import CacheConfig, LLMResponseCache
+from sw_ai_service.llm.clients import LLM_CLIENTS, record_agno_usage
+from sw_ai_service.llm.model_registry import MODEL_REGISTRY
+from sw_ai_service.llm.tokens import CHARS_PER_TOKEN
+from sw_ai_service.tracing import TRACER
 
 INSTRUCTIONS = """
     Sen bir classification uzmanısın, sana bir dökümanın alabileceği 
@@ -19,62 +25,221 @@ class DocClassifierResponse(BaseModel):
     ontology_name: str | None
 
 
+def lib_classification_response(possible_lib_names: tuple[str, ...]) -> type[BaseModel]:
+    """Response model of the library classification step, generated once per set of library names"""
+
+    def create() -> type[BaseModel]:
+        lib_enum: type[enum.StrEnum] = enum.StrEnum("LibEnum", possible_lib_names)
+
+        class LibClassificationResponse(BaseModel):
+            lib_enum_instance: lib_enum
+            score: int = Field(description="describes how confident the model is about the document type", ge=0, le=100)
+            rationale: str = Field(description="sence bu döküman neden senin seçtiğin türe ait")
+
+        return LibClassificationResponse
+
+    return MODEL_REGISTRY.get_or_create(("LibClassificationResponse", possible_lib_names), create)
+
+
+def ontology_classification_response(possible_ontology_names: tuple[str, ...]) -> type[BaseModel]:
+    """Response model of the ontology classification step, generated once per set of ontology names"""
+
+    def create() -> type[BaseModel]:
+        ontology_name_enum: type[enum.StrEnum] = enum.StrEnum("OntologyNameEnum", possible_ontology_names)
+
+        class OntologyClassificationResponse(BaseModel):
+            ontology_name: ontology_name_enum
+            score: int = Field(description="describes how confident the model is about the ontology name", ge=0, le=100)
+            rationale: str = Field(description="sence bu döküman neden senin seçtiğin türe ait")
+
+        return OntologyClassificationResponse
+
+    return MODEL_REGISTRY.get_or_create(("OntologyClassificationResponse", possible_ontology_names), create)
+
+
+def document_type_classification_response(possible_document_types: tuple[str, ...]) -> type[BaseModel]:
+    """Response model of the combined classification step, choosing library and ontology at once, generated once per set of document types"""
+
+    def create() -> type[BaseModel]:
+        document_type_enum: type[enum.StrEnum] = enum.StrEnum("DocumentTypeEnum", [(name, name) for name in possible_document_types])
+
+        class DocumentTypeClassificationResponse(BaseModel):
+            document_type: document_type_enum = Field(description=f"kütüphane{DOCUMENT_TYPE_SEPARATOR}ontoloji biçiminde döküman türü")
+            score: int = Field(description="describes how confident the model is about the document type", ge=0, le=100)
+            rationale: str = Field(description="sence bu döküman neden senin seçtiğin türe ait")
+
+        return DocumentTypeClassificationResponse
+
+    return MODEL_REGISTRY.get_or_create(("DocumentTypeClassificationResponse", possible_document_types), create)
+
+
+def lib_names(dir_structure: dict) -> tuple[str, ...]:
+    return (*dir_structure.keys(), UNK)
+
+
+def ontology_names(dir_structure: dict, lib_name: str) -> tuple[str, ...]:
+    return (*dir_structure[lib_name], UNK)
+
+
+def document_types(dir_structure: dict) -> tuple[str, ...]:
+    """Every library and ontology pair of the directory structure flattened into one list of choices"""
+    return (*(f"{lib_name}{DOCUMENT_TYPE_SEPARATOR}{ontology_name}" for lib_name, ontologies in dir_structure.items() for ontology_name in ontologies), UNK)
+
+
+class ClassifierAgent(Protocol):
+    """Agent answering with its response model, an agno Agent or the fake agent of the benchmarks"""
+
+    def run(self, message: str) -> Any: ...
+
+    async def arun(self, message: str) -> Any: ...
+
+
 class EngineConfig(BaseModel):
     llm_model_id: LLMOptions
     markdown: bool
     debug_mode: bool
     description: str = Field(default="We are running structured output task for classification")
     instructions: str = Field(default=INSTRUCTIONS)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    mode: ClassificationModeEnum = Field(default=ClassificationModeEnum.TWO_STEP, description="Combined mode picks library and ontology in a single call")
+    prefix_tokens: int | None = Field(default=None, ge=1, description="Classify from this many leading tokens first and only send the full text when the score is below min_score")
+    min_score: int = Field(default=50, ge=0, le=100)
+    local_classifier: LocalClassifierConfig = Field(default_factory=LocalClassifierConfig)
 
 
 class Engine:
-    def __init__(self, config: EngineConfig):
+    def __init__(self, config: EngineConfig, agent_factory: Callable[[type[BaseModel]], ClassifierAgent] | None = None):
+        """agent_factory replaces the agno agents, e.g. with the fake model of the benchmarks"""
         self.config = config
-        self.agent = Agent(
-            model=OpenAIChat(id=config.llm_model_id),
-            description=config.description,
-            instructions=config.instructions,
-            markdown=config.markdown,
-            debug_mode=config.debug_mode,
+        self.agent_factory = agent_factory
+        self.cache = LLMResponseCache(config.cache)
+        model_path = config.local_classifier.model_path
+        self.local_classifier = LocalClassifier.load(model_path) if model_path is not None and model_path.exists() else None
+
+    def _create_agent(self, response_model: type[BaseModel]) -> ClassifierAgent:
+        """New agent for every call, agno agents keep each run and the document text in their memory and track the current run on the instance"""
+        if self.agent_factory is not None:
+            return self.agent_factory(response_model)
+        # agno is imported with the first real agent, engines built with a fake agent factory never load it
+        from agno.agent import Agent
+        from agno.models.openai import OpenAIChat
+
+        # agents are cheap to build, every agent talks through the process-wide connection pool instead of opening its own
+        client, async_client = LLM_CLIENTS.openai_clients()
+        return Agent(
+            model=OpenAIChat(id=self.config.llm_model_id, client=client, async_client=async_client),
+            description=self.config.description,
+            instructions=self.config.instructions,
+            markdown=self.config.markdown,
+            debug_mode=self.config.debug_mode,
+            response_model=response_model,
         )
 
-    def run(self, text: str, dir_structure: dict) -> DocClassifierResponse:
-        # first step
-        possible_lib_names = [key for key in dir_structure.keys()]
-        possible_lib_names.append("UNK")
-        lib_enum: type[enum.StrEnum] = enum.StrEnum("LibEnum", possible_lib_names)
+    def _prompt(self, text: str) -> str:
+        return "\n".join([self.config.description, self.config.instructions, text])
 
-        class LibClassificationResponse(BaseModel):
-            lib_enum_instance: lib_enum
-            score: int = Field(description="describes how confident the model is about the document type", ge=0, le=100)
-            rationale: str = Field(description="sence bu döküman neden senin seçtiğin türe ait")
+    def _ask(self, text: str, response_model: type[BaseModel]) -> Any:
+        def call() -> Any:
+            response = self._create_agent(response_model).run(message=text)
+            record_agno_usage(getattr(response, "metrics", None))
+            return response.content
+
+        return self.cache.get_or_run(
+            call,
+            model=self.config.llm_model_id,
+            prompt=self._prompt(text),
+            response_model=response_model,
+        )
+
+    async def _aask(self, text: str, response_model: type[BaseModel]) -> Any:
+        async def call() -> Any:
+            response = await self._create_agent(response_model).arun(message=text)
+            record_agno_usage(getattr(response, "metrics", None))
+            return response.content
+
+        return await self.cache.get_or_call(call, model=self.config.llm_model_id, prompt=self._prompt(text), response_model=response_model)
+
+    def _local_result(self, text: str, dir_structure: dict) -> DocClassifierResponse | None:
+        """Prediction of the local classifier when it is confident and names a type of the current directory structure, None means ask the LLM"""
+        if self.local_classifier is None:
+            return None
+        document_type, confidence = self.local_classifier.predict(text)
+        TRACER.current().set(local_document_type=document_type, local_confidence=confidence)
+        # a document the local model does not recognize is left to the LLM, which may still know its type
+        if document_type == UNK or confidence < self.config.local_classifier.min_confidence or document_type not in document_types(dir_structure):
+            return None
+        TRACER.log(f"Local classifier picked {document_type} with confidence {confidence:.2f}, skipping the LLM")
+        lib_name, ontology_name = document_type.split(DOCUMENT_TYPE_SEPARATOR, 1)
+        return DocClassifierResponse(lib_name=lib_name, ontology_name=ontology_name)
+
+    def _samples(self, text: str) -> list[str]:
+        """Texts to classify in order, a prefix first when prefix_tokens is set and the document is longer than that"""
+        if self.config.prefix_tokens is None or len(text) <= self.config.prefix_tokens * CHARS_PER_TOKEN:
+            return [text]
+        return [text[: self.config.prefix_tokens * CHARS_PER_TOKEN], text]
+
+    def _lib_result(self, lib_response: Any) -> DocClassifierResponse | None:
+        """Final result of the library step when there is no ontology step to run"""
+        if lib_response.lib_enum_instance.name == UNK or lib_response.score < self.config.min_score:
+            return DocClassifierResponse(lib_name=UNK, ontology_name=UNK)
+        return None
+
+    def _document_type_result(self, response: Any) -> DocClassifierResponse:
+        if response.document_type.value == UNK or response.score < self.config.min_score:
+            return DocClassifierResponse(lib_name=UNK, ontology_name=UNK)
+        lib_name, ontology_name = response.document_type.value.split(DOCUMENT_TYPE_SEPARATOR, 1)
+        return DocClassifierResponse(lib_name=lib_name, ontology_name=ontology_name)
+
+    def _classify(self, text: str, dir_structure: dict) -> tuple[DocClassifierResponse, int]:
+        """Classifies text once, returning the result and the lowest score of the steps that ran"""
+        if self.config.mode == ClassificationModeEnum.COMBINED:
+            response = self._ask(text, document_type_classification_response(document_types(dir_structure)))
+            return self._document_type_result(response), response.score
+        lib_response = self._ask(text, lib_classification_response(lib_names(dir_structure)))
+        if (result := self._lib_result(lib_response)) is not None:
+            return result, lib_response.score
+        lib_name = lib_response.lib_enum_instance.name
+        ontology_response = self._ask(text, ontology_classification_response(ontology_names(dir_structure, lib_name)))
+        return DocClassifierResponse(lib_name=lib_name, ontology_name=ontology_response.ontology_name.name), min(lib_response.score, ontology_response.score)
+
+    async def _aclassify(self, text: str, dir_structure: dict) -> tuple[DocClassifierResponse, int]:
+        """Async counterpart of _classify"""
+        if self.config.mode == ClassificationModeEnum.COMBINED:
+            response = await self._aask(text, document_type_classification_response(document_types(dir_structure)))
+            return self._document_type_result(response), response.score
+        lib_response = await self._aask(text, lib_classification_response(lib_names(dir_structure)))
+        if (result := self._lib_result(lib_response)) is not None:
+            return result, lib_response.score
+        lib_name = lib_response.lib_enum_instance.name
+        ontology_response = await self._aask(text, ontology_classification_response(ontology_names(dir_structure, lib_name)))
+        return DocClassifierResponse(lib_name=lib_name, ontology_name=ontology_response.ontology_name.name), min(lib_response.score, ontology_response.score)
+
+    def _escalate(self, sample: str, score: int) -> bool:
+        if score >= self.config.min_score:
+            return False
+        TRACER.log(f"Classification score {score} from the first {len(sample)} characters is below {self.config.min_score}, classifying the full text")
+        TRACER.current().set(escalated=True)
+        return True
+
+    def run(self, text: str, dir_structure: dict) -> DocClassifierResponse:
+        with TRACER.span("doc.classify", mode=self.config.mode, text_chars=len(text)):
+            if (result := self._local_result(text, dir_structure)) is not None:
+                return result
+            samples = self._samples(text)
+            for sample in samples[:-1]:
+                result, score = self._classify(sample, dir_structure)
+                if not self._escalate(sample, score):
+                    return result
+            return self._classify(samples[-1], dir_structure)[0]
 
-        self.agent.response_model = LibClassificationResponse
-
-        first_response: LibClassificationResponse = self.agent.run(message=text).content
-        lib_name = first_response.lib_enum_instance.name
-        # if lib_name is UNK, return first_response, None
-        if lib_name == "UNK":
-            return DocClassifierResponse(lib_name=first_response.lib_enum_instance.name, ontology_name="UNK")
-        # elif score is less than 50, return first_response, None
-        elif first_response.score < 50:
-            first_response.lib_enum_instance = lib_enum.UNK
-            return DocClassifierResponse(lib_name=first_response.lib_enum_instance.name, ontology_name="UNK")
-        # else, check ontology
-        else:
-            possible_ontology_names = [key for key in dir_structure[lib_name]]
-            possible_ontology_names.append("UNK")
-            ontology_name_enum: type[enum.StrEnum] = enum.StrEnum("OntologyNameEnum", possible_ontology_names)
-
-            class OntologyClassificationResponse(BaseModel):
-                ontology_name: ontology_name_enum
-                score: int = Field(description="describes how confident the model is about the ontology name", ge=0, le=100)
-                rationale: str = Field(description="sence bu döküman neden senin seçtiğin türe ait")
-
-            # if score is less than 50, return first_response, None
-            if first_response.score < 50:
-                return DocClassifierResponse(lib_name=first_response.lib_enum_instance.name, ontology_name="UNK")
-            else:
-                self.agent.response_model = OntologyClassificationResponse
-                second_response: OntologyClassificationResponse = self.agent.run(message=text).content
-                return DocClassifierResponse(lib_name=first_response.lib_enum_instance.name, ontology_name=second_response.ontology_name.name)
+    async def arun(self, text: str, dir_structure: dict) -> DocClassifierResponse:
+        """Async counterpart of run, the agent calls do not block the event loop so classification can overlap with parsing and extraction"""
+        with TRACER.span("doc.classify", mode=self.config.mode, text_chars=len(text)):
+            if (result := self._local_result(text, dir_structure)) is not None:
+                return result
+            samples = self._samples(text)
+            for sample in samples[:-1]:
+                result, score = await self._aclassify(sample, dir_structure)
+                if not self._escalate(sample, score):
+                    return result
+            return (await self._aclassify(samples[-1], dir_structure))[0]
@@ -0,0 +1,231 @@
+import argparse
+import json
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+from pydantic import BaseModel, Field
+from rich import print as rprint
+
+UNK = "UNK"
+# joins library and ontology names into the document types of the combined and local classification
+DOCUMENT_TYPE_SEPARATOR = "/"
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class LocalClassifierConfig(BaseModel):
+    model_path: Path | None = Field(default=None, description="Trained model, the local classifier is skipped when it is not set or does not exist")
+    min_confidence: float = Field(default=0.9, ge=0, le=1, description="Calibrated probability above which the local prediction is returned without asking the LLM")
+
+
+class CalibrationBin(BaseModel):
+    lower: float
+    upper: float
+    count: int
+    mean_confidence: float
+    accuracy: float
+
+
+class CalibrationReport(BaseModel):
+    n_train: int
+    n_calibration: int = Field(description="Held-out documents the temperature is fitted on, kept apart from the ones the report scores")
+    n_eval: int
+    labels: list[str]
+    temperature: float
+    accuracy: float
+    expected_calibration_error: float
+    min_confidence: float
+    coverage_at_min_confidence: float = Field(description="Share of documents the local classifier would answer on its own")
+    accuracy_at_min_confidence: float = Field(description="Accuracy on the documents it would answer on its own")
+    bins: list[CalibrationBin]
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def hashed_term_counts(texts: list[str], ngram_sizes: tuple[int, ...], hash_dim: int) -> np.ndarray:
+    """Counts of character n-grams and words per text, hashed into hash_dim buckets with a stable hash"""
+    counts = np.zeros((len(texts), hash_dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = " ".join(text.lower().split())
+        terms = [f"w:{word}" for word in WORD_PATTERN.findall(text)]
+        terms.extend(text[i : i + n] for n in ngram_sizes for i in range(len(text) - n + 1))
+        np.add.at(counts[row], [zlib.crc32(term.encode()) % hash_dim for term in terms], 1.0)
+    return counts
+
+
+class LocalClassifier:
+    """TF-IDF over hashed character n-grams and words with a softmax regression on top, calibrated with temperature scaling"""
+
+    def __init__(self, labels: list[str], idf: np.ndarray, weights: np.ndarray, bias: np.ndarray, temperature: float = 1.0, ngram_sizes: tuple[int, ...] = (3, 4, 5), max_chars: int = 20_000):
+        self.labels = labels
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.temperature = temperature
+        self.ngram_sizes = ngram_sizes
+        self.max_chars = max_chars
+
+    @staticmethod
+    def _tf_idf(counts: np.ndarray, idf: np.ndarray) -> np.ndarray:
+        features = np.log1p(counts) * idf
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        return features / np.where(norms == 0, 1.0, norms)
+
+    def featurize(self, texts: list[str]) -> np.ndarray:
+        # the start of a document names its type, the rest only costs CPU
+        return self._tf_idf(hashed_term_counts([text[: self.max_chars] for text in texts], self.ngram_sizes, len(self.idf)), self.idf)
+
+    def logits(self, texts: list[str]) -> np.ndarray:
+        return self.featurize(texts) @ self.weights + self.bias
+
+    def predict_proba(self, texts: list[str]) -> np.ndarray:
+        return _softmax(self.logits(texts) / self.temperature)
+
+    def predict(self, text: str) -> tuple[str, float]:
+        """Most likely label of text and its calibrated probability"""
+        probabilities = self.predict_proba([text])[0]
+        best = int(probabilities.argmax())
+        return self.labels[best], float(probabilities[best])
+
+    @classmethod
+    def fit(
+        cls,
+        texts: list[str],
+        labels: list[str],
+        hash_dim: int = 2**14,
+        ngram_sizes: tuple[int, ...] = (3, 4, 5),
+        max_chars: int = 20_000,
+        epochs: int = 300,
+        learning_rate: float = 5.0,
+        l2: float = 1e-4,
+    ) -> "LocalClassifier":
+        """Trains with full-batch gradient descent, the features are dense so this is meant for corpora of up to a few thousand documents"""
+        label_names = sorted(set(labels))
+        if len(label_names) < 2:
+            raise ValueError("Training the local classifier needs documents of at least two types")
+        counts = hashed_term_counts([text[:max_chars] for text in texts], ngram_sizes, hash_dim)
+        document_frequency = (counts > 0).sum(axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+        features = cls._tf_idf(counts, idf)
+
+        targets = np.zeros((len(texts), len(label_names)), dtype=np.float32)
+        targets[np.arange(len(texts)), [label_names.index(label) for label in labels]] = 1.0
+        weights = np.zeros((hash_dim, len(label_names)), dtype=np.float32)
+        bias = np.zeros(len(label_names), dtype=np.float32)
+        for _ in range(epochs):
+            gradient = (_softmax(features @ weights + bias) - targets) / len(texts)
+            weights -= learning_rate * (features.T @ gradient + l2 * weights)
+            bias -= learning_rate * gradient.sum(axis=0)
+        return cls(label_names, idf, weights, bias, ngram_sizes=ngram_sizes, max_chars=max_chars)
+
+    def calibrate(self, texts: list[str], labels: list[str]) -> None:
+        """Picks the temperature that minimizes the negative log likelihood of held-out documents"""
+        logits = self.logits(texts)
+        targets = np.array([self.labels.index(label) for label in labels])
+
+        def nll(temperature: float) -> float:
+            probabilities = _softmax(logits / temperature)
+            return float(-np.log(probabilities[np.arange(len(targets)), targets] + 1e-12).mean())
+
+        self.temperature = float(min(np.geomspace(0.05, 20, 60), key=nll))
+
+    def report(self, texts: list[str], labels: list[str], min_confidence: float, n_train: int, n_calibration: int = 0, n_bins: int = 10) -> CalibrationReport:
+        probabilities = self.predict_proba(texts)
+        confidences = probabilities.max(axis=1)
+        correct = np.array([self.labels[i] == label for i, label in zip(probabilities.argmax(axis=1), labels)])  # noqa: B905
+        bins = []
+        ece = 0.0
+        edges = np.linspace(0, 1, n_bins + 1)
+        for lower, upper in zip(edges[:-1], edges[1:]):  # noqa: B905
+            mask = (confidences > lower) & (confidences <= upper)
+            if mask.any():
+                bins.append(CalibrationBin(lower=lower, upper=upper, count=int(mask.sum()), mean_confidence=float(confidences[mask].mean()), accuracy=float(correct[mask].mean())))
+                ece += mask.mean() * abs(confidences[mask].mean() - correct[mask].mean())
+        confident = confidences >= min_confidence
+        return CalibrationReport(
+            n_train=n_train,
+            n_calibration=n_calibration,
+            n_eval=len(texts),
+            labels=self.labels,
+            temperature=self.temperature,
+            accuracy=float(correct.mean()),
+            expected_calibration_error=float(ece),
+            min_confidence=min_confidence,
+            coverage_at_min_confidence=float(confident.mean()),
+            accuracy_at_min_confidence=float(correct[confident].mean()) if confident.any() else 0.0,
+            bins=bins,
+        )
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {"labels": self.labels, "temperature": self.temperature, "ngram_sizes": self.ngram_sizes, "max_chars": self.max_chars}
+        with path.open("wb") as f:
+            np.savez_compressed(f, idf=self.idf, weights=self.weights, bias=self.bias, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path: Path) -> "LocalClassifier":
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            return cls(meta["labels"], data["idf"], data["weights"], data["bias"], meta["temperature"], tuple(meta["ngram_sizes"]), meta["max_chars"])
+
+
+def load_training_documents(corpus_dir: Path) -> tuple[list[str], list[str]]:
+    """Texts and labels of the documents the corpus runner classified, documents classified as UNK are kept under the UNK label so the model learns to recognize them"""
+    texts, labels = [], []
+    for classification_path in sorted(corpus_dir.glob("*/classification.json")):
+        text_path = classification_path.with_name("text.txt")
+        classification = json.loads(classification_path.read_text(encoding="utf-8"))
+        names = (classification.get("lib_name"), classification.get("ontology_name"))
+        if not text_path.exists() or None in names:
+            continue
+        texts.append(text_path.read_text(encoding="utf-8"))
+        labels.append(UNK if UNK in names else f"{names[0]}{DOCUMENT_TYPE_SEPARATOR}{names[1]}")
+    return texts, labels
+
+
+def train_and_evaluate(texts: list[str], labels: list[str], min_confidence: float, eval_fraction: float = 0.2, seed: int = 0) -> tuple[LocalClassifier, CalibrationReport]:
+    """Trains on a random split and halves the held-out rest, the temperature is fitted on one half and the report scores the other so it is not optimistic"""
+    order = np.random.default_rng(seed).permutation(len(texts))
+    n_held_out = max(2, int(len(texts) * eval_fraction))
+    held_out_rows, train_rows = order[:n_held_out], order[n_held_out:]
+    model = LocalClassifier.fit([texts[i] for i in train_rows], [labels[i] for i in train_rows])
+    # documents of a type the training split never saw cannot be scored
+    scorable_rows = [i for i in held_out_rows if labels[i] in model.labels]
+    calibration_rows, eval_rows = scorable_rows[: len(scorable_rows) // 2], scorable_rows[len(scorable_rows) // 2 :]
+    if not calibration_rows:
+        raise ValueError("Fewer than two held-out documents of a known type, the corpus is too small to calibrate and evaluate")
+    model.calibrate([texts[i] for i in calibration_rows], [labels[i] for i in calibration_rows])
+    report = model.report([texts[i] for i in eval_rows], [labels[i] for i in eval_rows], min_confidence, n_train=len(train_rows), n_calibration=len(calibration_rows))
+    return model, report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Train or evaluate the local document classifier on documents the corpus runner classified")
+    parser.add_argument("command", choices=["train", "evaluate"])
+    parser.add_argument("--corpus-dir", type=Path, required=True, help="Output directory of the corpus runner")
+    parser.add_argument("--model-path", type=Path, required=True)
+    parser.add_argument("--min-confidence", type=float, default=LocalClassifierConfig().min_confidence)
+    parser.add_argument("--report-path", type=Path)
+    args = parser.parse_args()
+
+    texts, labels = load_training_documents(args.corpus_dir)
+    rprint(f"Loaded {len(texts)} classified documents of {len(set(labels))} types")
+    if args.command == "train":
+        model, report = train_and_evaluate(texts, labels, args.min_confidence)
+        model.save(args.model_path)
+    else:
+        model = LocalClassifier.load(args.model_path)
+        known = [i for i, label in enumerate(labels) if label in model.labels]
+        report = model.report([texts[i] for i in known], [labels[i] for i in known], args.min_confidence, n_train=0)
+    rprint(report.model_dump())
+    if args.report_path is not None:
+        args.report_path.parent.mkdir(parents=True, exist_ok=True)
+        args.report_path.write_text(report.model_dump_json(indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
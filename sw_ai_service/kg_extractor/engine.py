@@ -1,50 +1,141 @@
-from langchain_openai import ChatOpenAI
-from pydantic import BaseModel
-from pyvis.network import Network
+from pathlib import Path
+
+from pydantic import BaseModel, Field
 from sw_onto_generation.base.base_node import BaseNode
 from sw_onto_generation.base.base_relation import BaseRelation
 
-from sw_ai_service.configs import LLMOptions
+from sw_ai_service.configs import LLMOptions, NodeGroupModeEnum, RelationBatchModeEnum
+from sw_ai_service.kg_extractor.entity_resolution import EntityMerge, EntityResolutionConfig, EntityResolver
+from sw_ai_service.kg_extractor.graph_export import aggregate_graph, build_graph, export_graph, render_html
+from sw_ai_service.kg_extractor.incremental import IncrementalState, RunMemo, class_fingerprint, content_hash, diff_states
 from sw_ai_service.kg_extractor.node_extractor import NodeExtractor
+from sw_ai_service.kg_extractor.node_render import NodeRenderConfig
+from sw_ai_service.kg_extractor.pair_pruner import PairPruner, PairPrunerConfig
 from sw_ai_service.kg_extractor.relation_extractor import RelationExtractor
+from sw_ai_service.llm.cache import CacheConfig, LLMResponseCache
+from sw_ai_service.llm.clients import LLM_CLIENTS, StructuredOutputLLM
+from sw_ai_service.llm.scheduler import LLMScheduler, SchedulerConfig
+from sw_ai_service.tracing import TRACER
 
 
 class EngineConfig(BaseModel):
     llm_model_id: LLMOptions
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
+    cache: CacheConfig = Field(default_factory=CacheConfig)
+    node_chunk_max_tokens: int | None = Field(default=None, ge=1, description="Window size for chunked node extraction, defaults to half of the model's context window")
+    node_chunk_overlap_tokens: int = Field(default=200, ge=0)
+    node_group_mode: NodeGroupModeEnum = NodeGroupModeEnum.PER_CLASS
+    node_group_max_classes: int = Field(default=8, ge=1)
+    node_group_max_schema_tokens: int | None = Field(default=None, ge=1, description="Schema budget of a grouped extraction call, defaults to the model's max_schema_tokens")
+    incremental_chunk_max_tokens: int | None = Field(default=None, ge=1, description="Window size of incremental runs, defaults to a few thousand tokens so edits re-extract little")
+    relation_batch_mode: RelationBatchModeEnum = RelationBatchModeEnum.NONE
+    relation_batch_size: int = Field(default=25, ge=1, description="Upper bound on node pairs per batched relation check, lowered further to fit the model's context")
+    pair_pruner: PairPrunerConfig = Field(default_factory=PairPrunerConfig)
+    node_render: NodeRenderConfig = Field(default_factory=NodeRenderConfig)
+    entity_resolution: EntityResolutionConfig = Field(default_factory=EntityResolutionConfig)
 
 
 class Engine:
-    def __init__(self, config: EngineConfig):
+    def __init__(self, config: EngineConfig, llm: StructuredOutputLLM | None = None):
+        """llm replaces the OpenAI chat model of both extractors, e.g. with the fake model of the benchmarks"""
         self.config = config
-        self.node_extractor = NodeExtractor(llm=ChatOpenAI(model=config.llm_model_id))
-        self.relation_extractor = RelationExtractor(llm=ChatOpenAI(model=config.llm_model_id))
-
-    async def run(self, text: str, node_classes_list: list[type[BaseNode]], relation_classes_list: list[type[BaseRelation]], ontology_name: str) -> tuple[list[BaseNode], list[BaseRelation]]:
-        full_nodes, case2_relations = await self.node_extractor.run(
-            text=text,
-            node_classes_list=node_classes_list,
-            ontology_name=ontology_name,
+        # retries are owned by the scheduler so that backoff is shared across every pending call
+        self.scheduler = LLMScheduler(config.scheduler)
+        self.cache = LLMResponseCache(config.cache)
+        # one chat model and connection pool shared by both extractors and by every engine using this model
+        llm = llm or LLM_CLIENTS.chat_model(config.llm_model_id)
+        self.node_extractor = NodeExtractor(
+            llm=llm,
+            scheduler=self.scheduler,
+            cache=self.cache,
+            chunk_max_tokens=config.node_chunk_max_tokens,
+            chunk_overlap_tokens=config.node_chunk_overlap_tokens,
+            group_mode=config.node_group_mode,
+            group_max_classes=config.node_group_max_classes,
+            group_max_schema_tokens=config.node_group_max_schema_tokens,
+            incremental_chunk_max_tokens=config.incremental_chunk_max_tokens,
+        )
+        self.relation_extractor = RelationExtractor(
+            llm=llm,
+            scheduler=self.scheduler,
+            batch_mode=config.relation_batch_mode,
+            batch_size=config.relation_batch_size,
+            pruner=PairPruner(config.pair_pruner),
+            cache=self.cache,
+            render_config=config.node_render,
         )
-        relations = await self.relation_extractor.run(
-            full_nodes=full_nodes,
-            relation_classes_list=relation_classes_list,
+        self.entity_resolver = EntityResolver(config.entity_resolution)
+
+    def _incremental_state(self, text: str, node_classes_list: list[type[BaseNode]], relation_classes_list: list[type[BaseRelation]]) -> IncrementalState:
+        return IncrementalState(
+            llm_model_id=self.config.llm_model_id,
+            chunk_hashes=[content_hash(window) for window in self.node_extractor.incremental_windows(text)],
+            node_class_hashes={nc.__name__: class_fingerprint(nc, nc.node_config.how_to_extract, nc.node_config.cardinality, nc.node_config.description) for nc in node_classes_list},
+            relation_class_hashes={rc.__name__: class_fingerprint(rc, rc.relation_config.ask_llm) for rc in relation_classes_list},
         )
-        full_relations = case2_relations + relations
 
-        return full_nodes, full_relations
+    async def run(
+        self,
+        text: str,
+        node_classes_list: list[type[BaseNode]],
+        relation_classes_list: list[type[BaseRelation]],
+        ontology_name: str,
+        state_path: Path | None = None,
+    ) -> tuple[list[BaseNode], list[BaseRelation], list[EntityMerge]]:
+        """Extracts the graph of text and the entity merges that shaped it, empty unless entity resolution is enabled; with a state_path the run is incremental, only text windows or node classes that changed since the previous run are extracted again and only pairs touching new or changed nodes or relation classes are checked"""
+        with TRACER.span("kg.extract", ontology_name=ontology_name, text_chars=len(text), incremental=state_path is not None) as span:
+            window_memo: RunMemo[str] | None = None
+            verdict_memo: RunMemo[str] | None = None
+            if state_path is not None:
+                previous = IncrementalState.load(state_path, self.config.llm_model_id)
+                state = self._incremental_state(text, node_classes_list, relation_classes_list)
+                TRACER.log("Incremental update: ", diff_states(previous, state).model_dump())
+                window_memo = RunMemo(previous.window_results)
+                verdict_memo = RunMemo(previous.relation_verdicts)
 
-    @staticmethod
-    def plot_network(full_nodes: list[BaseNode], full_relations: list[BaseRelation]):
-        net = Network(notebook=False, height="750px", width="1500px", directed=True)
+            with TRACER.span("kg.nodes", node_classes=len(node_classes_list)) as nodes_span:
+                full_nodes, case2_relations = await self.node_extractor.run(
+                    text=text,
+                    node_classes_list=node_classes_list,
+                    ontology_name=ontology_name,
+                    memo=window_memo,
+                )
+                nodes_span.set(nodes=len(full_nodes))
+            merges: list[EntityMerge] = []
+            if self.config.entity_resolution.enabled:
+                # duplicates are merged before relation checks, every one of them would multiply the candidate pairs
+                with TRACER.span("kg.resolve"):
+                    full_nodes, case2_relations, merges = self.entity_resolver.resolve(full_nodes, case2_relations)
+            with TRACER.span("kg.relations", relation_classes=len(relation_classes_list)) as relations_span:
+                relations = await self.relation_extractor.run(
+                    full_nodes=full_nodes,
+                    relation_classes_list=relation_classes_list,
+                    text=text,
+                    memo=verdict_memo,
+                )
+                relations_span.set(relations=len(relations))
+            full_relations = case2_relations + relations
+            span.set(nodes=len(full_nodes), relations=len(full_relations))
+            self.scheduler.report()
+            self.cache.report()
 
-        # Add nodes to the network
-        for node in full_nodes:
-            title = "\n".join([f"{k}: {v}" for k, v in node.model_dump().items()])
-            net.add_node(n_id=node.node_id, label=node.__class__.__name__, title=title)
+            if state_path is not None and window_memo is not None and verdict_memo is not None:
+                TRACER.log(f"Reused {window_memo.reused} window extractions and {verdict_memo.reused} relation verdicts of the previous run")
+                span.set(reused_windows=window_memo.reused, reused_verdicts=verdict_memo.reused)
+                state.window_results = window_memo.current
+                state.relation_verdicts = verdict_memo.current
+                state.save(state_path)
 
-        for relation in full_relations:
-            relation_name = relation.__class__.__name__
-            net.add_edge(relation.source_node.node_id, relation.target_node.node_id, label=relation_name)
+        return full_nodes, full_relations, merges
 
-        net.show_buttons(filter_=["physics"])
-        net.save_graph("output.html")
+    @staticmethod
+    def plot_network(full_nodes: list[BaseNode], full_relations: list[BaseRelation], output_path: Path = Path("output.html"), max_rendered_nodes: int = 2_000):
+        """Renders the graph with a precomputed layout and physics off, graphs above max_rendered_nodes are shown clustered by node class"""
+        graph = build_graph(full_nodes, full_relations)
+        if graph.number_of_nodes() > max_rendered_nodes:
+            graph = aggregate_graph(graph)
+        render_html(graph, output_path)
+
+    @staticmethod
+    def export_graph(full_nodes: list[BaseNode], full_relations: list[BaseRelation], output_dir: Path, merges: list[EntityMerge] | None = None) -> None:
+        export_graph(full_nodes, full_relations, output_dir, merges)
@@ -0,0 +1,207 @@
+import datetime
+import enum
+import re
+import sqlite3
+import unicodedata
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from sw_ai_service.kg_extractor.pair_pruner import IGNORED_FIELDS, hashed_ngram_vectors
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+    from sw_onto_generation.base.base_relation import BaseRelation
+
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+DIGITS_PATTERN = re.compile(r"\d+")
+# rows of the similarity matrix computed at once, bounds memory for classes with many nodes
+SIMILARITY_BLOCK_ROWS = 1_024
+
+
+class EntityResolutionConfig(BaseModel):
+    enabled: bool = False
+    min_similarity: float = Field(default=0.9, ge=0, le=1, description="Cosine similarity of the n-gram vectors of two keys above which nodes of the same class are merged, 1 only merges equal keys")
+    key_fields: dict[str, list[str]] = Field(default_factory=dict, description="Fields identifying an entity per node class name, defaults to every scalar content field")
+    ngram_size: int = Field(default=3, ge=1)
+    hash_dim: int = Field(default=2**12, ge=16)
+    index_path: Path | None = Field(default=None, description="Entity index shared by every document of a corpus, nodes of an entity seen before get its node_id")
+
+
+class EntityMerge(BaseModel):
+    class_name: str
+    canonical_id: str | None
+    merged_id: str | None
+    score: float = Field(description="Similarity of the two keys, 1 for equal keys")
+    reference_text: str | None = Field(description="Where the merged node was found, kept as provenance of the canonical node")
+
+
+class ResolutionStats(BaseModel):
+    nodes_in: int = 0
+    nodes_out: int = 0
+    exact_merges: int = 0
+    fuzzy_merges: int = 0
+    index_hits: int = 0
+
+
+def normalize_text(value: Any) -> str:
+    """Case, accent and punctuation insensitive form of a value, Turkish dotless i included"""
+    if isinstance(value, enum.Enum):
+        value = value.value
+    if isinstance(value, datetime.date):
+        value = value.isoformat()
+    text = unicodedata.normalize("NFKD", str(value).replace("ı", "i").replace("I", "i"))
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    return " ".join(NON_WORD_PATTERN.sub(" ", text).split())
+
+
+class EntityIndex:
+    """Entities seen across a corpus keyed on (node class, normalized key), a lookup is one primary key read"""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entities (class_name TEXT NOT NULL, key TEXT NOT NULL, entity_id TEXT NOT NULL, mentions INTEGER NOT NULL, PRIMARY KEY (class_name, key))")
+        self._conn.commit()
+
+    def resolve(self, class_name: str, key: str, node_id: str) -> tuple[str, bool]:
+        """Id of the entity with this key and whether it was seen before, an unseen key becomes an entity with node_id"""
+        row = self._conn.execute("SELECT entity_id FROM entities WHERE class_name = ? AND key = ?", (class_name, key)).fetchone()
+        if row is None:
+            self._conn.execute("INSERT INTO entities (class_name, key, entity_id, mentions) VALUES (?, ?, ?, 1)", (class_name, key, node_id))
+            return node_id, False
+        self._conn.execute("UPDATE entities SET mentions = mentions + 1 WHERE class_name = ? AND key = ?", (class_name, key))
+        return row[0], True
+
+    def commit(self) -> None:
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+
+
+class EntityResolver:
+    """Merges nodes of one document that name the same entity, blocked by class and normalized key and scored with n-gram similarity; with an index, entities repeated across documents keep one node_id"""
+
+    def __init__(self, config: EntityResolutionConfig | None = None):
+        self.config = config or EntityResolutionConfig()
+        self.index = EntityIndex(self.config.index_path) if self.config.enabled and self.config.index_path is not None else None
+        self.stats = ResolutionStats()
+        self._key_fields: dict[type, list[str]] = {}
+
+    def key_fields(self, node_class: type[BaseModel]) -> list[str]:
+        if node_class not in self._key_fields:
+            fields = self.config.key_fields.get(node_class.__name__)
+            if fields is None:
+                fields = [name for name in node_class.model_fields if name not in IGNORED_FIELDS]
+            self._key_fields[node_class] = fields
+        return self._key_fields[node_class]
+
+    def key(self, node: "BaseNode") -> str:
+        """Normalized scalar values of the key fields, empty for nodes without content such as case-1 nodes"""
+        values = (getattr(node, name, None) for name in self.key_fields(type(node)))
+        return " | ".join(normalize_text(value) for value in values if value is not None and not isinstance(value, BaseModel | list | dict))
+
+    def _fuzzy_matches(self, keys: list[str]) -> list[tuple[int, int, float]]:
+        """(earlier, later, score) for keys similar enough to merge, numbers in the two keys must agree so different amounts or dates never merge"""
+        if self.config.min_similarity >= 1 or len(keys) < 2:
+            return []
+        vectors = hashed_ngram_vectors(keys, self.config.ngram_size, self.config.hash_dim)
+        digits = [DIGITS_PATTERN.findall(key) for key in keys]
+        matches = []
+        for start in range(0, len(keys), SIMILARITY_BLOCK_ROWS):
+            scores = vectors[start : start + SIMILARITY_BLOCK_ROWS] @ vectors.T
+            rows, cols = np.nonzero(scores >= self.config.min_similarity)
+            for row, col in zip(rows + start, cols):  # noqa: B905
+                if row < col and digits[row] == digits[col]:
+                    matches.append((int(row), int(col), float(scores[row - start, col])))
+        return matches
+
+    def _merge(self, merged: list[tuple["BaseNode", float]], node: "BaseNode", score: float) -> None:
+        merged.append((node, score))
+        if score == 1.0:
+            self.stats.exact_merges += 1
+        else:
+            self.stats.fuzzy_merges += 1
+
+    def resolve(self, nodes: list["BaseNode"], relations: list["BaseRelation"]) -> tuple[list["BaseNode"], list["BaseRelation"], list[EntityMerge]]:
+        """Canonical nodes in their original order, the relations rewired to them and which node was merged into which; relations duplicated by a merge are dropped"""
+        merged: list[tuple[BaseNode, float]] = []
+        canonical_of: dict[int, BaseNode] = {}
+        # one representative per (class, key) block, exact duplicates merge in constant time
+        blocks: dict[tuple[type, str], BaseNode] = {}
+        for node in nodes:
+            key = self.key(node)
+            if not key:
+                continue
+            representative = blocks.setdefault((type(node), key), node)
+            if representative is not node:
+                canonical_of[id(node)] = representative
+                self._merge(merged, node, 1.0)
+
+        by_class: dict[type, list[tuple[str, BaseNode]]] = {}
+        for (node_class, key), node in blocks.items():
+            by_class.setdefault(node_class, []).append((key, node))
+        for members in by_class.values():
+            # later representatives merge into the earliest one they match, chains resolve to the root
+            parent = list(range(len(members)))
+            for earlier, later, score in self._fuzzy_matches([key for key, _ in members]):
+                root = earlier
+                while parent[root] != root:
+                    root = parent[root]
+                if parent[later] == later and root != later:
+                    parent[later] = root
+                    self._merge(merged, members[later][1], score)
+            for i, (_, node) in enumerate(members):
+                root = i
+                while parent[root] != root:
+                    root = parent[root]
+                if root != i:
+                    canonical_of[id(node)] = members[root][1]
+        # exact duplicates of a fuzzy-merged representative follow it to its canonical node
+        for node_id, canonical in list(canonical_of.items()):
+            while id(canonical) in canonical_of:
+                canonical = canonical_of[id(canonical)]
+            canonical_of[node_id] = canonical
+
+        resolved_nodes = [node for node in nodes if id(node) not in canonical_of]
+        resolved_relations = []
+        seen: set[tuple[type, int, int]] = set()
+        for relation in relations:
+            source = canonical_of.get(id(relation.source_node), relation.source_node)
+            target = canonical_of.get(id(relation.target_node), relation.target_node)
+            relation_key = (type(relation), id(source), id(target))
+            if relation_key in seen or (source is target and relation.source_node is not relation.target_node):
+                continue
+            seen.add(relation_key)
+            relation.source_node, relation.target_node = source, target
+            resolved_relations.append(relation)
+
+        if self.index is not None:
+            for node in resolved_nodes:
+                key = self.key(node)
+                if key and getattr(node, "node_id", None) is not None:
+                    node.node_id, seen_before = self.index.resolve(type(node).__name__, key, node.node_id)
+                    self.stats.index_hits += seen_before
+            self.index.commit()
+
+        # recorded once canonical nodes are final, after chains are followed and the index assigned their node_id
+        merges = [
+            EntityMerge(
+                class_name=type(node).__name__,
+                canonical_id=getattr(canonical_of[id(node)], "node_id", None),
+                merged_id=getattr(node, "node_id", None),
+                score=score,
+                reference_text=getattr(node, "reference_text", None),
+            )
+            for node, score in merged
+        ]
+        self.stats.nodes_in += len(nodes)
+        self.stats.nodes_out += len(resolved_nodes)
+        TRACER.log(f"Entity resolution merged {len(nodes) - len(resolved_nodes)} of {len(nodes)} nodes")
+        TRACER.current().set(nodes_in=len(nodes), nodes_out=len(resolved_nodes))
+        return resolved_nodes, resolved_relations, merges
@@ -0,0 +1,76 @@
+import types
+from collections.abc import Callable, Iterable
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+    from sw_onto_generation.base.base_relation import BaseRelation
+
+
+class ClassPlan:
+    """What post-processing does with every extracted node of one class"""
+
+    __slots__ = ("case2_fields", "case1_class")
+
+    def __init__(self, case2_fields: list[tuple[str, type["BaseRelation"]]], case1_class: type["BaseNode"] | None):
+        # fields holding a case-2 node and the relation class linking the node to it
+        self.case2_fields = case2_fields
+        # case-1 class created once when a node of this class is extracted
+        self.case1_class = case1_class
+
+
+class ExtractionPlan:
+    """Case-1 and case-2 post-processing of an ontology, resolved once per node class instead of by reflection on every node"""
+
+    def __init__(self, case1_classes: Iterable[type["BaseNode"]], case2_classes: Iterable[type["BaseNode"]], relation_class_of: Callable[[type["BaseNode"]], type["BaseRelation"]]):
+        self.case1_classes = set(case1_classes)
+        self.case2_classes = set(case2_classes)
+        self.relation_class_of = relation_class_of
+        self._classes: dict[type[BaseNode], ClassPlan] = {}
+
+    def _case2_target(self, annotation: Any) -> type["BaseNode"] | None:
+        if annotation in self.case2_classes:
+            return annotation
+        if isinstance(annotation, types.UnionType):
+            return next((member for member in annotation.__args__ if member in self.case2_classes), None)
+        return None
+
+    def for_class(self, node_class: type["BaseNode"]) -> ClassPlan:
+        if node_class not in self._classes:
+            case2_fields = []
+            for field_name, field_info in node_class.model_fields.items():
+                target = self._case2_target(field_info.annotation)
+                if target is not None:
+                    case2_fields.append((field_name, self.relation_class_of(target)))
+            to_be_created = node_class.node_config.nodeclass_to_be_created_automatically
+            self._classes[node_class] = ClassPlan(case2_fields, to_be_created if to_be_created in self.case1_classes else None)
+        return self._classes[node_class]
+
+    def case1_nodes(self, case0_nodes: Iterable["BaseNode"]) -> list["BaseNode"]:
+        """One node of every case-1 class an extracted node asks for, in the order of the first such node"""
+        created: dict[type[BaseNode], BaseNode] = {}
+        for node in case0_nodes:
+            case1_class = self.for_class(type(node)).case1_class
+            if case1_class is not None and case1_class not in created:
+                created[case1_class] = case1_class(reason="Predefined", reference_text="Predefined")
+        return list(created.values())
+
+    def case2_nodes_and_relations(self, case0_nodes: Iterable["BaseNode"]) -> tuple[list["BaseNode"], list["BaseRelation"]]:
+        """Moves case-2 nodes out of the fields of their extracted parent and links the two, the field is removed from the parent"""
+        case2_nodes = []
+        case2_relations = []
+        for node in case0_nodes:
+            for field_name, relation_class in self.for_class(type(node)).case2_fields:
+                child = node.__dict__.pop(field_name, None)
+                if child is None:
+                    continue
+                case2_nodes.append(child)
+                case2_relations.append(
+                    relation_class(
+                        source_node=node,
+                        target_node=child,
+                        reason=f"{child.__class__.__name__} is extracted from {node.__class__.__name__}",
+                        reference_text="Predefined",
+                    )
+                )
+        return case2_nodes, case2_relations
@@ -0,0 +1,107 @@
+import json
+import math
+from collections import Counter
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import networkx as nx
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+    from sw_onto_generation.base.base_relation import BaseRelation
+
+    from sw_ai_service.kg_extractor.entity_resolution import EntityMerge
+
+TOOLTIP_MAX_CHARS = 300
+# spring layout is quadratic per iteration (and needs scipy from 500 nodes on), bigger graphs get a cheaper layout
+SPRING_LAYOUT_MAX_NODES = 400
+LAYOUT_SCALE = 1_000
+
+
+def node_record(node: "BaseNode") -> dict[str, Any]:
+    return {"node_id": node.node_id, "class": node.__class__.__name__, "data": node.model_dump(mode="json")}
+
+
+def relation_record(relation: "BaseRelation") -> dict[str, Any]:
+    return {
+        "class": relation.__class__.__name__,
+        "source": relation.source_node.node_id,
+        "target": relation.target_node.node_id,
+        "reason": relation.reason,
+        "reference_text": relation.reference_text,
+    }
+
+
+def write_jsonl(records: Iterable[dict[str, Any]], path: Path) -> None:
+    """Streams records to disk one line at a time through a temporary file"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    tmp_path.replace(path)
+
+
+def export_graph(full_nodes: list["BaseNode"], full_relations: list["BaseRelation"], output_dir: Path, merges: list["EntityMerge"] | None = None) -> None:
+    """Writes node and relation tables as JSON lines and the compact graph as GraphML; with merges, also which node was merged into which and where the merged node was found"""
+    write_jsonl(map(node_record, full_nodes), output_dir / "nodes.jsonl")
+    write_jsonl(map(relation_record, full_relations), output_dir / "relations.jsonl")
+    if merges is not None:
+        write_jsonl((merge.model_dump(mode="json") for merge in merges), output_dir / "merges.jsonl")
+    nx.write_graphml(build_graph(full_nodes, full_relations), output_dir / "graph.graphml")
+
+
+def node_tooltip(node: "BaseNode") -> str:
+    """Short tooltip from the node's own scalar fields, cheaper than a full model_dump and bounded in size"""
+    lines = [f"{key}: {value}" for key, value in node.__dict__.items() if value is not None and isinstance(value, str | int | float | bool)]
+    tooltip = "\n".join(lines)
+    return tooltip if len(tooltip) <= TOOLTIP_MAX_CHARS else tooltip[: TOOLTIP_MAX_CHARS - 3] + "..."
+
+
+def build_graph(full_nodes: list["BaseNode"], full_relations: list["BaseRelation"]) -> nx.MultiDiGraph:
+    """Compact graph with only string attributes, so it can be written to GraphML as is"""
+    graph = nx.MultiDiGraph()
+    for node in full_nodes:
+        graph.add_node(node.node_id, label=node.__class__.__name__, title=node_tooltip(node))
+    for relation in full_relations:
+        graph.add_edge(relation.source_node.node_id, relation.target_node.node_id, label=relation.__class__.__name__)
+    return graph
+
+
+def aggregate_graph(graph: nx.MultiDiGraph) -> nx.MultiDiGraph:
+    """Clustered view with one node per node class and one edge per (source class, relation class, target class), weighted by count"""
+    class_counts = Counter(label for _, label in graph.nodes(data="label"))
+    edge_counts = Counter((graph.nodes[u]["label"], label, graph.nodes[v]["label"]) for u, v, label in graph.edges(data="label"))
+    aggregated = nx.MultiDiGraph()
+    for label, count in class_counts.items():
+        aggregated.add_node(label, label=f"{label} ({count})", title=f"{count} nodes", value=count)
+    for (source, label, target), count in edge_counts.items():
+        aggregated.add_edge(source, target, label=f"{label} ({count})", value=count)
+    return aggregated
+
+
+def compute_layout(graph: nx.MultiDiGraph, seed: int = 42) -> dict[Any, tuple[float, float]]:
+    """Static coordinates computed once, so the browser does not have to run a physics simulation"""
+    if graph.number_of_nodes() == 0:
+        return {}
+    if graph.number_of_nodes() <= SPRING_LAYOUT_MAX_NODES:
+        positions = nx.spring_layout(nx.Graph(graph), seed=seed, iterations=50)
+    else:
+        # nodes of the same class are placed next to each other on a circle
+        ordered = sorted(graph.nodes, key=lambda n: graph.nodes[n].get("label", ""))
+        positions = {n: (math.cos(2 * math.pi * i / len(ordered)), math.sin(2 * math.pi * i / len(ordered))) for i, n in enumerate(ordered)}
+    return {n: (float(x) * LAYOUT_SCALE, float(y) * LAYOUT_SCALE) for n, (x, y) in positions.items()}
+
+
+def render_html(graph: nx.MultiDiGraph, output_path: Path) -> None:
+    # pyvis is only needed for rendering, export-only deployments never import it
+    from pyvis.network import Network
+
+    net = Network(notebook=False, height="750px", width="1500px", directed=True)
+    net.toggle_physics(False)
+    for n, (x, y) in compute_layout(graph).items():
+        net.add_node(n_id=n, x=x, y=y, physics=False, **graph.nodes[n])
+    for u, v, attrs in graph.edges(data=True):
+        net.add_edge(u, v, **attrs)
+    net.save_graph(str(output_path))
@@ -0,0 +1,119 @@
+import asyncio
+import hashlib
+import json
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import Any, Generic, TypeVar
+
+from pydantic import BaseModel, Field
+
+from sw_ai_service.llm.model_registry import MODEL_REGISTRY
+
+V = TypeVar("V")
+M = TypeVar("M", bound=BaseModel)
+
+# window size of incremental runs, small enough that an edit re-extracts a few windows rather than the whole document
+INCREMENTAL_CHUNK_MAX_TOKENS = 3_000
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def class_fingerprint(cls: type[BaseModel], *extra: Any) -> str:
+    """Hash of a node or relation class definition, its JSON schema plus the config values that end up in prompts"""
+    return content_hash(json.dumps([cls.__name__, MODEL_REGISTRY.json_schema(cls), *extra], sort_keys=True, ensure_ascii=False, default=str))
+
+
+class RunMemo(Generic[V]):
+    """Results of the previous run by key, the results this run reads or writes become the memo of the next run"""
+
+    def __init__(self, previous: dict[str, V] | None = None):
+        self.previous = previous or {}
+        self.current: dict[str, V] = {}
+        self.reused = 0
+
+    def get(self, key: str) -> V | None:
+        value = self.previous.get(key)
+        if value is not None:
+            self.current[key] = value
+            self.reused += 1
+        return value
+
+    def set(self, key: str, value: V) -> None:
+        self.current[key] = value
+
+
+async def extract_windows(
+    windows: list[str],
+    extract: Callable[[str], Awaitable[M | None]],
+    response_model: type[M],
+    key: Callable[[str], str],
+    memo: RunMemo[str],
+) -> list[M | None]:
+    """Extraction of every window in order, windows the previous run extracted under the same key are read from the memo instead of extracted again"""
+
+    async def extract_window(window: str) -> M | None:
+        window_key = key(window)
+        if (stored := memo.get(window_key)) is not None:
+            return response_model.model_validate_json(stored)
+        result = await extract(window)
+        if result is not None:
+            memo.set(window_key, result.model_dump_json())
+        return result
+
+    return await asyncio.gather(*[extract_window(window) for window in windows])
+
+
+class IncrementalDiff(BaseModel):
+    added_chunks: int
+    removed_chunks: int
+    unchanged_chunks: int
+    changed_node_classes: list[str] = Field(description="Node classes that are new or whose definition changed, they are extracted from every chunk")
+    removed_node_classes: list[str]
+    changed_relation_classes: list[str] = Field(description="Relation classes that are new or whose definition changed, all their pairs are checked")
+    removed_relation_classes: list[str]
+
+
+class IncrementalState(BaseModel):
+    """What an incremental run stores for the next one, memo values are serialized LLM responses"""
+
+    llm_model_id: str
+    chunk_hashes: list[str] = Field(default_factory=list)
+    node_class_hashes: dict[str, str] = Field(default_factory=dict)
+    relation_class_hashes: dict[str, str] = Field(default_factory=dict)
+    window_results: dict[str, str] = Field(default_factory=dict, description="Extraction of one group of node classes from one text window, keyed on model, prompt and schema")
+    relation_verdicts: dict[str, str] = Field(default_factory=dict, description="Relation check of one node pair, keyed on model, relation class and node contents")
+
+    @classmethod
+    def load(cls, path: Path, llm_model_id: str) -> "IncrementalState":
+        """State of the previous run, an empty state when there is none or it was made with another model"""
+        if path.exists():
+            state = cls.model_validate_json(path.read_text(encoding="utf-8"))
+            if state.llm_model_id == llm_model_id:
+                return state
+        return cls(llm_model_id=llm_model_id)
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(self.model_dump_json(), encoding="utf-8")
+        tmp_path.replace(path)
+
+
+def _changed(previous: dict[str, str], current: dict[str, str]) -> list[str]:
+    return [name for name, fingerprint in current.items() if previous.get(name) != fingerprint]
+
+
+def diff_states(previous: IncrementalState, current: IncrementalState) -> IncrementalDiff:
+    previous_chunks = set(previous.chunk_hashes)
+    current_chunks = set(current.chunk_hashes)
+    return IncrementalDiff(
+        added_chunks=len(current_chunks - previous_chunks),
+        removed_chunks=len(previous_chunks - current_chunks),
+        unchanged_chunks=len(current_chunks & previous_chunks),
+        changed_node_classes=_changed(previous.node_class_hashes, current.node_class_hashes),
+        removed_node_classes=[name for name in previous.node_class_hashes if name not in current.node_class_hashes],
+        changed_relation_classes=_changed(previous.relation_class_hashes, current.relation_class_hashes),
+        removed_relation_classes=[name for name in previous.relation_class_hashes if name not in current.relation_class_hashes],
+    )
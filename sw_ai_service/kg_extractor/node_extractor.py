@@ -1,28 +1,54 @@
 import asyncio
-import types
+import json
+from typing import TYPE_CHECKING, Any
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from pydantic import create_model
-from rich import print as rprint
-from sw_onto_generation.base.base_node import BaseNode
-from sw_onto_generation.base.base_relation import BaseRelation
-from sw_onto_generation.base.configs import HowToExtract
-from sw_onto_generation.common.common_nodes import GeneralDocumentInfo
 
-from sw_ai_service.kg_extractor.utils import filter_node_classes_by_case, filter_node_list, node_class_to_node_dict, node_dict_to_ontology
+from sw_ai_service.configs import NodeGroupModeEnum, VerbosityEnum
+from sw_ai_service.kg_extractor.extraction_plan import ExtractionPlan
+from sw_ai_service.kg_extractor.incremental import INCREMENTAL_CHUNK_MAX_TOKENS, RunMemo, extract_windows
+from sw_ai_service.kg_extractor.utils import case2_relation_class, filter_node_classes_by_case, filter_node_list, merge_ontology_instances, node_class_to_node_dict, node_dict_to_ontology
+from sw_ai_service.llm.cache import LLMResponseCache
+from sw_ai_service.llm.clients import LLM_CLIENTS, StructuredOutputLLM
+from sw_ai_service.llm.model_registry import MODEL_REGISTRY
+from sw_ai_service.llm.scheduler import LLMScheduler
+from sw_ai_service.llm.tokens import batch_by_token_budget, estimate_tokens, get_context_limits, split_into_anchored_windows, split_into_windows
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+
+# share of the context window the document text may take in a single extraction call
+CHUNK_CONTEXT_FRACTION = 0.5
 
 
 class NodeExtractor:
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(
+        self,
+        llm: StructuredOutputLLM,
+        scheduler: LLMScheduler | None = None,
+        cache: LLMResponseCache | None = None,
+        chunk_max_tokens: int | None = None,
+        chunk_overlap_tokens: int = 200,
+        group_mode: NodeGroupModeEnum = NodeGroupModeEnum.PER_CLASS,
+        group_max_classes: int = 8,
+        group_max_schema_tokens: int | None = None,
+        incremental_chunk_max_tokens: int | None = None,
+    ):
         self.llm = llm
-
-    async def _process_single_node_class(self, text: str, node_class: type[BaseNode]):
-        """Process a single node class asynchronously"""
-        rprint("Processing node class for case 0: ", node_class)
-        node_dict = node_class_to_node_dict(node_class)
-        ontology = node_dict_to_ontology(node_dict)
-        system_message = f"""
+        self.scheduler = scheduler or LLMScheduler()
+        self.cache = cache or LLMResponseCache()
+        # without an explicit size, text is only chunked when it would not fit the model's context
+        self.chunk_max_tokens = chunk_max_tokens or int(get_context_limits(self.llm.model_name).context_window * CHUNK_CONTEXT_FRACTION)
+        self.chunk_overlap_tokens = chunk_overlap_tokens
+        self.group_mode = group_mode
+        self.group_max_classes = group_max_classes
+        self.group_max_schema_tokens = group_max_schema_tokens or get_context_limits(self.llm.model_name).max_schema_tokens
+        # incremental runs use small windows of their own so an edit only re-extracts the windows around it
+        self.incremental_chunk_max_tokens = incremental_chunk_max_tokens or min(INCREMENTAL_CHUNK_MAX_TOKENS, self.chunk_max_tokens)
+
+    def _single_class_system_message(self, node_class: type["BaseNode"]) -> str:
+        return f"""
             Sen Türkçe metinlerinden içerisinden node(düğüm) çıkarma konusunda uzman bir yapay zeka.
             Senin görevin şu:
             - Metin içerisinden {node_class.__name__} node'unu çıkarmak.
@@ -31,90 +57,117 @@ class NodeExtractor:
             Node'un descriptionı senin için çok önemli, aşağıda onu bulabilirsin. Dikkatlice oku
             Node'un descriptionı: {node_class.node_config.description}
         """
+
+    def _group_system_message(self, node_classes: list[type["BaseNode"]]) -> str:
+        descriptions = "\n".join(f"            - {node_class.__name__}: {node_class.node_config.description}" for node_class in node_classes)
+        return f"""
+            Sen Türkçe metinlerinden içerisinden node(düğüm) çıkarma konusunda uzman bir yapay zeka.
+            Senin görevin şu:
+            - Metin içerisinden aşağıdaki node'ların her birini çıkarmak.
+            - Çıkan node'ları doğru formatta ve doğru şekilde, kendi alanlarında döndürmek.
+            - Çıkan node'ların doğru şekilde döndürülmesi için gerekli olan tüm bilgileri doğru şekilde döndürmek.
+            - Metinde bulunmayan node'ları boş bırakmak.
+            Node'ların descriptionları senin için çok önemli, aşağıda onları bulabilirsin. Dikkatlice oku
+{descriptions}
+        """
+
+    def incremental_windows(self, text: str) -> list[str]:
+        """Windows of an incremental run, cut at content-defined anchors so unchanged parts of an edited text keep their windows"""
+        return split_into_anchored_windows(text, self.incremental_chunk_max_tokens)
+
+    async def _process_node_class_group(self, text: str, node_classes: list[type["BaseNode"]], memo: RunMemo[str] | None = None) -> Any:
+        """Extracts several node classes with one combined ontology model, long texts are extracted window by window and merged; with a memo, windows extracted by the previous run are reused"""
+        TRACER.log("Processing node classes for case 0: ", node_classes, level=VerbosityEnum.VERBOSE)
+        node_dict = {name: value for node_class in node_classes for name, value in node_class_to_node_dict(node_class).items()}
+        ontology = node_dict_to_ontology(node_dict)
+        # a single class keeps its dedicated prompt so per-class mode stays comparable and cached responses stay valid
+        system_message = self._single_class_system_message(node_classes[0]) if len(node_classes) == 1 else self._group_system_message(node_classes)
         prompt = ChatPromptTemplate.from_messages([("system", system_message), ("user", "{text}")])
-        structured_llm = self.llm.with_structured_output(ontology)
-        chain = prompt | structured_llm
-        node_class_instances = await chain.ainvoke({"text": text})
-        rprint(node_class_instances)
+        chain = prompt | LLM_CLIENTS.structured_output(self.llm, ontology)
+
+        async def extract(window: str) -> Any:
+            return await self.cache.get_or_call(
+                lambda: self.scheduler.submit(
+                    lambda: chain.ainvoke({"text": window}),
+                    model=self.llm.model_name,
+                    tokens=estimate_tokens(system_message + window),
+                ),
+                model=self.llm.model_name,
+                prompt=prompt.invoke({"text": window}).to_string(),
+                response_model=ontology,
+            )
+
+        def memo_key(window: str) -> str:
+            return LLMResponseCache.make_key(self.llm.model_name, prompt.invoke({"text": window}).to_string(), ontology)
+
+        windows = split_into_windows(text, self.chunk_max_tokens, self.chunk_overlap_tokens) if memo is None else self.incremental_windows(text)
+        with TRACER.span("kg.node_group", node_classes=[node_class.__name__ for node_class in node_classes], windows=len(windows)):
+            if len(windows) > 1:
+                TRACER.log(f"Extracting {[node_class.__name__ for node_class in node_classes]} from {len(windows)} text windows", level=VerbosityEnum.VERBOSE)
+            if memo is None:
+                results = await asyncio.gather(*[extract(window) for window in windows])
+            else:
+                results = await extract_windows(windows, extract, ontology, memo_key, memo)
+            node_class_instances = results[0] if len(results) == 1 else merge_ontology_instances(ontology, results)
+        TRACER.log(node_class_instances, level=VerbosityEnum.VERBOSE)
         return node_class_instances
 
-    async def extract_case0_nodes(self, text: str, node_classes_list: list[type[BaseNode]]) -> list[BaseNode]:
+    def group_node_classes(self, node_classes: list[type["BaseNode"]]) -> list[list[type["BaseNode"]]]:
+        """Packs node classes into groups whose combined JSON schema stays within the model's schema budget, a class over budget is extracted alone"""
+        if self.group_mode == NodeGroupModeEnum.PER_CLASS:
+            return [[node_class] for node_class in node_classes]
+
+        def schema_tokens(node_class: type["BaseNode"]) -> int:
+            ontology = node_dict_to_ontology(node_class_to_node_dict(node_class))
+            return estimate_tokens(json.dumps(MODEL_REGISTRY.json_schema(ontology), ensure_ascii=False))
+
+        return batch_by_token_budget(node_classes, schema_tokens, max_items=self.group_max_classes, max_tokens=self.group_max_schema_tokens)
+
+    async def extract_case0_nodes(self, text: str, node_classes_list: list[type["BaseNode"]], memo: RunMemo[str] | None = None) -> list["BaseNode"]:
         """Extract case0 nodes in parallel using async/await"""
+        from sw_onto_generation.base.configs import HowToExtract
+
         case0_node_classes = filter_node_classes_by_case(HowToExtract.CASE_0, node_classes_list)
 
-        # Create tasks for parallel execution
-        tasks = [self._process_single_node_class(text, node_class) for node_class in case0_node_classes]
+        # Create tasks for parallel execution, one per group of node classes (a single class per group in per-class mode)
+        tasks = [self._process_node_class_group(text, group, memo) for group in self.group_node_classes(case0_node_classes)]
 
         # Execute all tasks in parallel
         case0_nodes = await asyncio.gather(*tasks)
 
         return filter_node_list(case0_nodes)
 
-    def extract_case1_nodes(self, case0_nodes: list[BaseNode], node_classes_list: list[type[BaseNode]]):
-        case1_classes = filter_node_classes_by_case(HowToExtract.CASE_1, node_classes_list)
-        case1_nodes = []
-        for case0_node in case0_nodes:
-            to_be_created_class = case0_node.node_config.nodeclass_to_be_created_automatically
-            if to_be_created_class in case1_classes:
-                new_node = to_be_created_class(reason="Predefined", reference_text="Predefined")
-                case1_nodes.append(new_node)
-                case1_classes.remove(to_be_created_class)
-        return case1_nodes
-
-    def extract_case2_nodes_and_relations(self, case0_nodes: list[BaseNode], node_classes_list: list[type[BaseNode]]):
-        case2_classes = filter_node_classes_by_case(HowToExtract.CASE_2, node_classes_list)
-        case2_nodes = []
-        case2_relations = []
-
-        for extracted_node in case0_nodes:
-            # check if any of the fields of the extracted_node is a case1_class but field can be union type also
-            for field_name, field_info in type(extracted_node).model_fields.items():
-                if field_info.annotation in case2_classes:
-                    if extracted_node.__dict__[field_name] is None:
-                        extracted_node.__dict__.pop(field_name)
-                    else:
-                        new_node = extracted_node.__dict__[field_name]
-                        extracted_node.__dict__.pop(field_name)
-                        case2_nodes.append(new_node)
-                        relation_class = create_model(f"Has{field_info.annotation.__name__}", __base__=BaseRelation)
-                        case2_relations.append(
-                            relation_class(
-                                source_node=extracted_node,
-                                target_node=new_node,
-                                reason=f"{new_node.__class__.__name__} is extracted from {extracted_node.__class__.__name__}",
-                                reference_text="Predefined",
-                            )
-                        )
-                elif isinstance(field_info.annotation, types.UnionType):
-                    for type_in_union in field_info.annotation.__args__:
-                        if type_in_union in case2_classes:
-                            if extracted_node.__dict__[field_name] is None:
-                                extracted_node.__dict__.pop(field_name)
-                            else:
-                                new_node = extracted_node.__dict__[field_name]
-                                extracted_node.__dict__.pop(field_name)
-                                case2_nodes.append(new_node)
-                                relation_class = create_model(f"Has{type_in_union.__name__}", __base__=BaseRelation)
-                                case2_relations.append(
-                                    relation_class(
-                                        source_node=extracted_node,
-                                        target_node=new_node,
-                                        reason=f"{new_node.__class__.__name__} is extracted from {extracted_node.__class__.__name__}",
-                                        reference_text="Predefined",
-                                    )
-                                )
-        return case2_nodes, case2_relations
-
-    def extract_general_document_info(self, ontology_name: str, case0_nodes: list[BaseNode]):
+    def extraction_plan(self, node_classes_list: list[type["BaseNode"]]) -> ExtractionPlan:
+        """Case-1 and case-2 plan of an ontology, compiled once per process for each list of node classes"""
+        from sw_onto_generation.base.configs import HowToExtract
+
+        return MODEL_REGISTRY.get_or_create(
+            ("extraction_plan", tuple(node_classes_list)),
+            lambda: ExtractionPlan(
+                filter_node_classes_by_case(HowToExtract.CASE_1, node_classes_list),
+                filter_node_classes_by_case(HowToExtract.CASE_2, node_classes_list),
+                case2_relation_class,
+            ),
+        )
+
+    def extract_case1_nodes(self, case0_nodes: list["BaseNode"], node_classes_list: list[type["BaseNode"]]):
+        return self.extraction_plan(node_classes_list).case1_nodes(case0_nodes)
+
+    def extract_case2_nodes_and_relations(self, case0_nodes: list["BaseNode"], node_classes_list: list[type["BaseNode"]]):
+        return self.extraction_plan(node_classes_list).case2_nodes_and_relations(case0_nodes)
+
+    def extract_general_document_info(self, ontology_name: str, case0_nodes: list["BaseNode"]):
+        from sw_onto_generation.common.common_nodes import GeneralDocumentInfo
+
         for node in case0_nodes:
             if isinstance(node, GeneralDocumentInfo):
                 node.doküman_tipi = ontology_name
 
         return case0_nodes
 
-    async def run(self, text: str, node_classes_list: list[type[BaseNode]], ontology_name: str) -> tuple[list[BaseNode], list]:
+    async def run(self, text: str, node_classes_list: list[type["BaseNode"]], ontology_name: str, memo: RunMemo[str] | None = None) -> tuple[list["BaseNode"], list]:
         """Main async method for extracting nodes"""
-        case0_nodes = await self.extract_case0_nodes(text=text, node_classes_list=node_classes_list)
+        case0_nodes = await self.extract_case0_nodes(text=text, node_classes_list=node_classes_list, memo=memo)
         case1_nodes = self.extract_case1_nodes(case0_nodes, node_classes_list)
         case2_nodes, case2_relations = self.extract_case2_nodes_and_relations(case0_nodes, node_classes_list)
         case0_nodes = self.extract_general_document_info(ontology_name=ontology_name, case0_nodes=case0_nodes)
@@ -0,0 +1,99 @@
+import datetime
+import enum
+from typing import TYPE_CHECKING, Any
+
+from pydantic import BaseModel, Field
+
+from sw_ai_service.llm.tokens import count_tokens, truncate_to_tokens
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+
+# provenance fields, the relation check only needs what a node is, not where or why it was extracted
+EXCLUDED_FIELDS = ["node_id", "reason", "reference_text"]
+# items of a list value rendered before the rest is summarized as a count
+MAX_LIST_ITEMS = 5
+
+
+class NodeRenderConfig(BaseModel):
+    compact: bool = Field(default=True, description="Render nodes as a projection of their content fields, off sends the full repr of every node")
+    max_node_tokens: int = Field(default=150, ge=8, description="Budget of one rendered node, counted with the model's tokenizer")
+    max_value_tokens: int = Field(default=40, ge=4, description="Budget of one string value, long free-text fields are cut before the node budget applies")
+    excluded_fields: list[str] = Field(default_factory=lambda: list(EXCLUDED_FIELDS))
+    class_fields: dict[str, list[str]] = Field(default_factory=dict, description="Fields rendered per node class name, overrides the default projection")
+
+
+class RenderStats(BaseModel):
+    nodes: int = 0
+    repr_tokens: int = 0
+    rendered_tokens: int = 0
+
+    @property
+    def saving_rate(self) -> float:
+        return 1 - self.rendered_tokens / self.repr_tokens if self.repr_tokens else 0.0
+
+
+class NodeRenderer:
+    """Renders each node once as a deterministic, token-bounded projection of its fields, the same text is reused in every prompt mentioning the node"""
+
+    def __init__(self, model: str, config: NodeRenderConfig | None = None):
+        self.model = model
+        self.config = config or NodeRenderConfig()
+        self.stats = RenderStats()
+        self._projections: dict[type[BaseModel], list[str]] = {}
+        # keyed on id, the node is kept in the value so the id cannot be reused while the entry exists
+        self._rendered: dict[int, tuple[BaseModel, str, int]] = {}
+
+    def projection(self, node_class: type[BaseModel]) -> list[str]:
+        """Fields rendered for a node class, in declaration order"""
+        if node_class not in self._projections:
+            fields = self.config.class_fields.get(node_class.__name__)
+            if fields is None:
+                fields = [name for name in node_class.model_fields if name not in self.config.excluded_fields]
+            self._projections[node_class] = fields
+        return self._projections[node_class]
+
+    def _value(self, value: Any) -> str | None:
+        if value is None or value == []:
+            return None
+        if isinstance(value, BaseModel):
+            return f"{value.__class__.__name__}({self._fields(value)})"
+        if isinstance(value, list):
+            items = [text for text in (self._value(item) for item in value[:MAX_LIST_ITEMS]) if text is not None]
+            more = f", +{len(value) - MAX_LIST_ITEMS}" if len(value) > MAX_LIST_ITEMS else ""
+            return f"[{', '.join(items)}{more}]"
+        if isinstance(value, enum.Enum):
+            value = value.value
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return truncate_to_tokens(" ".join(str(value).split()), self.config.max_value_tokens, self.model)
+
+    def _fields(self, node: BaseModel) -> str:
+        values = ((name, self._value(getattr(node, name, None))) for name in self.projection(node.__class__))
+        return "; ".join(f"{name}={text}" for name, text in values if text is not None)
+
+    def _render(self, node: "BaseNode") -> tuple[str, int]:
+        repr_tokens = count_tokens(repr(node), self.model)
+        self.stats.repr_tokens += repr_tokens
+        if not self.config.compact:
+            return repr(node), repr_tokens
+        text = truncate_to_tokens(f"{node.__class__.__name__}({self._fields(node)})", self.config.max_node_tokens, self.model)
+        return text, count_tokens(text, self.model)
+
+    def render(self, node: "BaseNode") -> str:
+        if id(node) not in self._rendered:
+            text, tokens = self._render(node)
+            self._rendered[id(node)] = (node, text, tokens)
+            self.stats.nodes += 1
+            self.stats.rendered_tokens += tokens
+        return self._rendered[id(node)][1]
+
+    def tokens(self, node: "BaseNode") -> int:
+        self.render(node)
+        return self._rendered[id(node)][2]
+
+    def report(self) -> None:
+        if self.stats.nodes:
+            TRACER.log(f"Rendered {self.stats.nodes} nodes for relation prompts in {self.stats.rendered_tokens} tokens instead of {self.stats.repr_tokens} ({self.stats.saving_rate:.1%} saved)")
+        TRACER.current().set(rendered_nodes=self.stats.nodes, rendered_node_tokens=self.stats.rendered_tokens)
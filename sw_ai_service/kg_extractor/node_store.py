@@ -0,0 +1,52 @@
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+
+
+class NodeStore:
+    """Extracted nodes indexed by class, including every ancestor in the MRO, and by node_id, so lookups replace isinstance scans"""
+
+    def __init__(self, nodes: Iterable["BaseNode"] = ()):
+        self._nodes: list[BaseNode] = []
+        self._order: dict[int, int] = {}
+        self._by_class: dict[type, list[BaseNode]] = {}
+        self._by_id: dict[str, BaseNode] = {}
+        self.extend(nodes)
+
+    def add(self, node: "BaseNode") -> None:
+        if id(node) in self._order:
+            return
+        self._order[id(node)] = len(self._nodes)
+        self._nodes.append(node)
+        for cls in type(node).__mro__:
+            self._by_class.setdefault(cls, []).append(node)
+        node_id = getattr(node, "node_id", None)
+        if node_id is not None:
+            self._by_id[node_id] = node
+
+    def extend(self, nodes: Iterable["BaseNode"]) -> None:
+        for node in nodes:
+            self.add(node)
+
+    def of_type(self, cls: type) -> list["BaseNode"]:
+        """Nodes that are instances of cls, in insertion order"""
+        return self._by_class.get(cls, [])
+
+    def of_types(self, classes: Iterable[type]) -> list["BaseNode"]:
+        """Nodes that are instances of any of classes, each once and in insertion order"""
+        classes = list(classes)
+        if len(classes) == 1:
+            return self.of_type(classes[0])
+        found = {id(node): node for cls in classes for node in self.of_type(cls)}
+        return sorted(found.values(), key=lambda node: self._order[id(node)])
+
+    def get(self, node_id: str) -> "BaseNode | None":
+        return self._by_id.get(node_id)
+
+    def __iter__(self) -> Iterator["BaseNode"]:
+        return iter(self._nodes)
+
+    def __len__(self) -> int:
+        return len(self._nodes)
@@ -0,0 +1,125 @@
+import zlib
+from typing import TYPE_CHECKING
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+
+# node fields that never help to tell two nodes apart
+IGNORED_FIELDS = {"node_id", "reason", "reference_text"}
+# reference texts that are not taken from the document and therefore have no position
+PLACEHOLDER_REFERENCES = {"", "Predefined"}
+
+
+class PairPrunerConfig(BaseModel):
+    enabled: bool = False
+    min_score: float = Field(default=0.2, ge=0, le=1, description="Recall/cost knob, pairs scoring below it are not sent to the LLM, 0 keeps every pair")
+    proximity_weight: float = Field(default=0.5, ge=0)
+    similarity_weight: float = Field(default=0.5, ge=0)
+    proximity_scale: int = Field(default=2_000, gt=0, description="Distance in characters between two reference texts at which the proximity score halves")
+    ngram_size: int = Field(default=3, ge=1)
+    hash_dim: int = Field(default=2**12, ge=16, description="Buckets of the n-gram vectors, a dense float32 row of this size is held per node while pairs are collected")
+    relation_min_scores: dict[str, float] = Field(default_factory=dict, description="Per relation class overrides of min_score, keyed by class name")
+    never_prune: list[str] = Field(default_factory=list, description="Relation class names whose pairs are always sent to the LLM")
+
+
+class PruningStats(BaseModel):
+    candidates: int = 0
+    kept: int = 0
+    per_relation: dict[str, list[int]] = Field(default_factory=dict, description="[candidates, kept] per relation class name")
+
+    @property
+    def pruning_rate(self) -> float:
+        return 1 - self.kept / self.candidates if self.candidates else 0.0
+
+    def add(self, relation_name: str, candidates: int, kept: int) -> None:
+        self.candidates += candidates
+        self.kept += kept
+        counts = self.per_relation.setdefault(relation_name, [0, 0])
+        counts[0] += candidates
+        counts[1] += kept
+
+
+def hashed_ngram_vectors(texts: list[str], ngram_size: int, dim: int) -> np.ndarray:
+    """L2-normalized character n-gram count vectors, hashed into dim buckets with a stable hash so scores are reproducible across runs"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = " ".join(text.lower().split())
+        buckets = [zlib.crc32(text[i : i + ngram_size].encode()) % dim for i in range(max(1, len(text) - ngram_size + 1))]
+        np.add.at(vectors[row], buckets, 1.0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def locate_reference(lowered_text: str, reference_text: str | None) -> float:
+    """Character offset of the reference text in the document, NaN when it cannot be found"""
+    if reference_text is None or reference_text.strip() in PLACEHOLDER_REFERENCES:
+        return np.nan
+    position = lowered_text.find(" ".join(reference_text.lower().split()))
+    return float(position) if position >= 0 else np.nan
+
+
+def node_to_text(node: "BaseNode") -> str:
+    values = [str(value) for key, value in node.__dict__.items() if key not in IGNORED_FIELDS and value is not None]
+    return " ".join([node.__class__.__name__, *values])
+
+
+class PairPruner:
+    """Scores candidate pairs locally by reference text proximity and n-gram similarity so unlikely ones never reach the LLM"""
+
+    def __init__(self, config: PairPrunerConfig | None = None):
+        self.config = config or PairPrunerConfig()
+        self.stats = PruningStats()
+        self._rows: dict[int, int] = {}
+        self._vectors = np.zeros((0, self.config.hash_dim), dtype=np.float32)
+        self._positions = np.zeros(0, dtype=np.float64)
+
+    def index(self, nodes: list["BaseNode"], text: str | None = None) -> None:
+        """Computes the vectors and document positions of every node once, before any pair is scored"""
+        self.stats = PruningStats()
+        self._rows = {id(node): row for row, node in enumerate(nodes)}
+        if not self.config.enabled:
+            return
+        self._vectors = hashed_ngram_vectors([node_to_text(node) for node in nodes], self.config.ngram_size, self.config.hash_dim)
+        lowered_text = " ".join(text.lower().split()) if text else ""
+        self._positions = np.array([locate_reference(lowered_text, getattr(node, "reference_text", None)) for node in nodes], dtype=np.float64)
+
+    def release(self) -> None:
+        """Drops the vectors and positions of the indexed nodes once every candidate pair is collected, the stats are kept for the report"""
+        self._rows = {}
+        self._vectors = np.zeros((0, self.config.hash_dim), dtype=np.float32)
+        self._positions = np.zeros(0, dtype=np.float64)
+
+    def _node_rows(self, nodes: list["BaseNode"]) -> np.ndarray:
+        return np.array([self._rows[id(node)] for node in nodes], dtype=np.intp)
+
+    def score(self, s_nodes: list["BaseNode"], t_nodes: list["BaseNode"]) -> np.ndarray:
+        s_rows, t_rows = self._node_rows(s_nodes), self._node_rows(t_nodes)
+        similarity = self._vectors[s_rows] @ self._vectors[t_rows].T
+        distance = np.abs(self._positions[s_rows][:, None] - self._positions[t_rows][None, :])
+        # a node without a known position cannot be judged on proximity, so it is not penalized for it
+        proximity = np.where(np.isnan(distance), 1.0, np.exp2(-distance / self.config.proximity_scale))
+        total_weight = self.config.proximity_weight + self.config.similarity_weight
+        if total_weight == 0:
+            return np.ones((len(s_rows), len(t_rows)))
+        return (self.config.proximity_weight * proximity + self.config.similarity_weight * similarity) / total_weight
+
+    def candidate_pairs(self, s_nodes: list["BaseNode"], t_nodes: list["BaseNode"], relation_name: str) -> list[tuple["BaseNode", "BaseNode"]]:
+        """Pairs worth asking the LLM about, a node is never paired with itself"""
+        if not s_nodes or not t_nodes:
+            return []
+        # rows are assigned per object in index(), so this is an identity check rather than model equality
+        keep = self._node_rows(s_nodes)[:, None] != self._node_rows(t_nodes)[None, :]
+        candidates = int(keep.sum())
+        if self.config.enabled and relation_name not in self.config.never_prune:
+            keep &= self.score(s_nodes, t_nodes) >= self.config.relation_min_scores.get(relation_name, self.config.min_score)
+        s_indices, t_indices = np.nonzero(keep)
+        self.stats.add(relation_name, candidates, len(s_indices))
+        return [(s_nodes[i], t_nodes[j]) for i, j in zip(s_indices, t_indices)]  # noqa: B905
+
+    def report(self) -> None:
+        TRACER.log(f"Pair pruning kept {self.stats.kept}/{self.stats.candidates} candidate pairs (pruning rate {self.stats.pruning_rate:.1%})", self.stats.per_relation)
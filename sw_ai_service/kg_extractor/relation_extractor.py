@@ -1,14 +1,49 @@
 import asyncio
+import json
+from collections import defaultdict
 from itertools import product
+from typing import TYPE_CHECKING
 
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
-from rich import print as rprint
-from sw_onto_generation.base.base_node import BaseNode
-from sw_onto_generation.base.base_relation import BaseRelation
 
-from sw_ai_service.kg_extractor.utils import get_type_classes
+from sw_ai_service.configs import RelationBatchModeEnum, VerbosityEnum
+from sw_ai_service.kg_extractor.incremental import RunMemo, class_fingerprint, content_hash
+from sw_ai_service.kg_extractor.node_render import NodeRenderConfig, NodeRenderer
+from sw_ai_service.kg_extractor.node_store import NodeStore
+from sw_ai_service.kg_extractor.pair_pruner import PairPruner
+from sw_ai_service.kg_extractor.utils import node_content_key, relation_endpoint_types
+from sw_ai_service.llm.cache import LLMResponseCache
+from sw_ai_service.llm.clients import LLM_CLIENTS, StructuredOutputLLM
+from sw_ai_service.llm.scheduler import LLMScheduler
+from sw_ai_service.llm.tokens import batch_by_token_budget, estimate_tokens, get_context_limits
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+    from sw_onto_generation.base.base_relation import BaseRelation
+
+# rough size of one verdict in the response, used to keep a batch within the model's output limit
+TOKENS_PER_VERDICT = 80
+# share of the context window a single batch prompt may use
+BATCH_CONTEXT_FRACTION = 0.5
+
+# static instructions first and the most widely shared values next, so consecutive checks share the longest prompt prefix the provider can cache
+RELATION_SYSTEM_MESSAGE = """
+            You are a helpful assistant that checks if two nodes have a relation.
+            You are given a relation class, a source node and a target node.
+            You need to check if the two nodes have a relation with the relation class.
+            Answer in Turkish.
+        """
+RELATION_PROMPT = ChatPromptTemplate.from_messages([("system", RELATION_SYSTEM_MESSAGE), ("human", "Relation class: {rc}\nSource node: {s_node}\nTarget node: {t_node}")])
+BATCH_RELATION_SYSTEM_MESSAGE = """
+            You are a helpful assistant that checks if pairs of nodes have a relation.
+            You are given a relation class, a numbered list of nodes and a numbered list of (source -> target) node pairs.
+            For every pair you need to check if the source node and the target node have a relation with the relation class.
+            Return exactly one verdict per pair, using the pair number as pair_index.
+            Answer in Turkish.
+        """
+BATCH_RELATION_PROMPT = ChatPromptTemplate.from_messages([("system", BATCH_RELATION_SYSTEM_MESSAGE), ("human", "Relation class: {rc}\n\nNodes:\n{nodes}\n\nPairs:\n{pairs}")])
 
 
 class HasRelation(BaseModel):
@@ -16,24 +51,50 @@ class HasRelation(BaseModel):
     reason: str = Field(default="", description="Bu kararı vermenizin sebebi nedir?")
 
 
+class PairVerdict(BaseModel):
+    pair_index: int = Field(description="Değerlendirilen node çiftinin numarası")
+    value: bool = Field(description="Bu iki node arasında bir ilişki var mı?")
+    reason: str = Field(description="Bu kararı vermenizin sebebi nedir?")
+
+
+class BatchedHasRelation(BaseModel):
+    verdicts: list[PairVerdict] = Field(description="Her node çifti için bir karar")
+
+
 class RelationExtractor:
-    def __init__(self, llm: ChatOpenAI):
+    def __init__(
+        self,
+        llm: StructuredOutputLLM,
+        scheduler: LLMScheduler | None = None,
+        batch_mode: RelationBatchModeEnum = RelationBatchModeEnum.NONE,
+        batch_size: int = 25,
+        pruner: PairPruner | None = None,
+        cache: LLMResponseCache | None = None,
+        render_config: NodeRenderConfig | None = None,
+    ):
         self.llm = llm
+        self.scheduler = scheduler or LLMScheduler()
+        self.cache = cache or LLMResponseCache()
+        self.pruner = pruner or PairPruner()
+        self.batch_mode = batch_mode
+        self.batch_size = batch_size
+        self.render_config = render_config or NodeRenderConfig()
 
-    async def run(self, full_nodes: list[BaseNode], relation_classes_list: list[type[BaseRelation]]) -> list[BaseRelation]:
-        predefined_relations = self.extract_predefined_relations(full_nodes=full_nodes, relation_classes_list=relation_classes_list)
-        relations_w_llm = await self.extract_relations_w_llm(full_nodes=full_nodes, relation_classes_list=relation_classes_list)
+    async def run(self, full_nodes: list["BaseNode"], relation_classes_list: list[type["BaseRelation"]], text: str | None = None, memo: RunMemo[str] | None = None) -> list["BaseRelation"]:
+        store = NodeStore(full_nodes)
+        predefined_relations = self.extract_predefined_relations(full_nodes=full_nodes, relation_classes_list=relation_classes_list, store=store)
+        relations_w_llm = await self.extract_relations_w_llm(full_nodes=full_nodes, relation_classes_list=relation_classes_list, text=text, store=store, memo=memo)
         return predefined_relations + relations_w_llm
 
-    def extract_predefined_relations(self, full_nodes: list[BaseNode], relation_classes_list: list[type[BaseRelation]]) -> list[BaseRelation]:
+    def extract_predefined_relations(self, full_nodes: list["BaseNode"], relation_classes_list: list[type["BaseRelation"]], store: NodeStore | None = None) -> list["BaseRelation"]:
         predefined_rcl = [rel for rel in relation_classes_list if not rel.relation_config.ask_llm]
+        store = store or NodeStore(full_nodes)
 
         predefined_rel_instances = []
         for rc in predefined_rcl:
-            source_class = rc.model_fields["source_node"].annotation
-            target_class = rc.model_fields["target_node"].annotation
-            source_nodes = [node for node in full_nodes if isinstance(node, source_class)]
-            target_nodes = [node for node in full_nodes if isinstance(node, target_class)]
+            source_types, target_types = relation_endpoint_types(rc)
+            source_nodes = store.of_types(source_types)
+            target_nodes = store.of_types(target_types)
             for source_node in source_nodes:
                 for target_node in target_nodes:
                     relation = rc(
@@ -46,64 +107,163 @@ class RelationExtractor:
 
         return predefined_rel_instances
 
-    async def check_relation(self, s_node: BaseNode, t_node: BaseNode, rc: type[BaseRelation]) -> HasRelation:
-        system_message = """
-            You are a helpful assistant that checks if two nodes have a relation.
-            You are given a relation class and two nodes.
-            You need to check if the two nodes have a relation with the relation class.
-            Answer in Turkish.  
-        """
-        user_message = f"""
-            Do {repr(s_node)} and {repr(t_node)} have a relation with {rc.__name__}? Answer in Turkish.
-        """
-        prompt = ChatPromptTemplate.from_messages([("system", system_message), ("human", user_message)])
-        structured_llm = self.llm.with_structured_output(HasRelation, strict=True)
-        chain = prompt | structured_llm
-        return await chain.ainvoke({"s_node": s_node, "t_node": t_node, "rc": rc.__name__})
+    def verdict_key(self, s_key: str, t_key: str, rc: type["BaseRelation"]) -> str:
+        """Key of a relation check in the incremental memo, it only changes with the model, the relation class or the content of either node"""
+        return content_hash(json.dumps([self.llm.model_name, class_fingerprint(rc), s_key, t_key]))
 
-    async def extract_relations_w_llm(self, full_nodes: list[BaseNode], relation_classes_list: list[type[BaseRelation]]) -> list[BaseRelation]:
+    def renderer(self) -> NodeRenderer:
+        """Renders the nodes of one extraction run, every prompt of the run shows a node with the same text"""
+        return NodeRenderer(self.llm.model_name, self.render_config)
+
+    async def check_relation(self, s_node: "BaseNode", t_node: "BaseNode", rc: type["BaseRelation"], renderer: NodeRenderer | None = None) -> HasRelation:
+        renderer = renderer or self.renderer()
+        chain = RELATION_PROMPT | LLM_CLIENTS.structured_output(self.llm, HasRelation, strict=True)
+        variables = {"rc": rc.__name__, "s_node": renderer.render(s_node), "t_node": renderer.render(t_node)}
+        return await self.cache.get_or_call(
+            lambda: self.scheduler.submit(
+                lambda: chain.ainvoke(variables),
+                model=self.llm.model_name,
+                tokens=estimate_tokens(RELATION_SYSTEM_MESSAGE + "".join(variables.values())),
+            ),
+            model=self.llm.model_name,
+            prompt=RELATION_PROMPT.invoke(variables).to_string(),
+            response_model=HasRelation,
+        )
+
+    async def check_relations_batch(self, pairs: list[tuple["BaseNode", "BaseNode"]], rc: type["BaseRelation"], renderer: NodeRenderer | None = None) -> list[HasRelation]:
+        """Checks several node pairs of one relation class in a single call, every node is rendered once; pairs missing from a failed or truncated response are re-checked one by one"""
+        renderer = renderer or self.renderer()
+        if len(pairs) == 1:
+            return [await self.check_relation(pairs[0][0], pairs[0][1], rc, renderer)]
+
+        node_ids: dict[int, int] = {}
+        node_lines = []
+        for node in (node for pair in pairs for node in pair):
+            if id(node) not in node_ids:
+                node_ids[id(node)] = len(node_ids)
+                node_lines.append(f"N{node_ids[id(node)]}: {renderer.render(node)}")
+        pair_lines = [f"{i}: N{node_ids[id(s_node)]} -> N{node_ids[id(t_node)]}" for i, (s_node, t_node) in enumerate(pairs)]
+
+        variables = {"rc": rc.__name__, "nodes": "\n".join(node_lines), "pairs": "\n".join(pair_lines)}
+        chain = BATCH_RELATION_PROMPT | LLM_CLIENTS.structured_output(self.llm, BatchedHasRelation, strict=True)
+
+        verdicts: dict[int, PairVerdict] = {}
+        try:
+            response = await self.cache.get_or_call(
+                lambda: self.scheduler.submit(
+                    lambda: chain.ainvoke(variables),
+                    model=self.llm.model_name,
+                    tokens=estimate_tokens(BATCH_RELATION_SYSTEM_MESSAGE + "".join(variables.values())) + TOKENS_PER_VERDICT * len(pairs),
+                ),
+                model=self.llm.model_name,
+                prompt=BATCH_RELATION_PROMPT.invoke(variables).to_string(),
+                response_model=BatchedHasRelation,
+            )
+            verdicts = {verdict.pair_index: verdict for verdict in response.verdicts if 0 <= verdict.pair_index < len(pairs)}
+        except Exception as exc:
+            TRACER.log(f"Batched relation check for {rc.__name__} failed, falling back to per-pair checks: {exc!r}")
+
+        missing = [i for i in range(len(pairs)) if i not in verdicts]
+        fallback_results = await asyncio.gather(*[self.check_relation(pairs[i][0], pairs[i][1], rc, renderer) for i in missing])
+        results = {i: HasRelation(value=verdict.value, reason=verdict.reason) for i, verdict in verdicts.items()}
+        results.update(zip(missing, fallback_results))  # noqa: B905
+        return [results[i] for i in range(len(pairs))]
+
+    def _batch_pairs(self, pairs: list[tuple["BaseNode", "BaseNode"]], renderer: NodeRenderer) -> list[list[tuple["BaseNode", "BaseNode"]]]:
+        """Splits the pairs into batches that fit both the configured batch size and the model's context and output limits"""
+        limits = get_context_limits(self.llm.model_name)
+        max_items = max(1, min(self.batch_size, limits.max_output_tokens // TOKENS_PER_VERDICT))
+        max_tokens = int(limits.context_window * BATCH_CONTEXT_FRACTION)
+        return batch_by_token_budget(pairs, lambda pair: renderer.tokens(pair[0]) + renderer.tokens(pair[1]) + TOKENS_PER_VERDICT, max_items=max_items, max_tokens=max_tokens)
+
+    async def _check_relation_group(self, pairs: list[tuple["BaseNode", "BaseNode"]], rc: type["BaseRelation"], renderer: NodeRenderer) -> list[HasRelation]:
+        batch_results = await asyncio.gather(*[self.check_relations_batch(batch, rc, renderer) for batch in self._batch_pairs(pairs, renderer)])
+        return [has_relation for batch_result in batch_results for has_relation in batch_result]
+
+    async def extract_relations_w_llm(
+        self,
+        full_nodes: list["BaseNode"],
+        relation_classes_list: list[type["BaseRelation"]],
+        text: str | None = None,
+        store: NodeStore | None = None,
+        memo: RunMemo[str] | None = None,
+    ) -> list["BaseRelation"]:
+        """Checks the candidate pairs of every relation class with the LLM; with a memo, pairs whose nodes and relation class are unchanged since the previous run reuse its verdict"""
         relation_classes_to_ask_llm = [rel for rel in relation_classes_list if rel.relation_config.ask_llm]
         extracted_relations = []
+        store = store or NodeStore(full_nodes)
+        self.pruner.index(list(store), text)
+        renderer = self.renderer()
 
         # Collect all async tasks for parallel execution
         tasks = []
         task_metadata = []
+        # candidate pairs grouped by (relation class, source node) or by relation class when batching
+        groups: dict[tuple, list[tuple[BaseNode, BaseNode]]] = defaultdict(list)
+        # verdicts taken from the memo, and the content key of every node for memo lookups
+        checked = []
+        content_keys: dict[int, str] = {}
+
+        def verdict_key(s_node: "BaseNode", t_node: "BaseNode", rc: type["BaseRelation"]) -> str:
+            for node in (s_node, t_node):
+                if id(node) not in content_keys:
+                    content_keys[id(node)] = node_content_key(node)
+            return self.verdict_key(content_keys[id(s_node)], content_keys[id(t_node)], rc)
 
         for rc in relation_classes_to_ask_llm:
-            source_types = get_type_classes(rc, "source_node")
-            target_types = get_type_classes(rc, "target_node")
+            source_types, target_types = relation_endpoint_types(rc)
             possible_relations = product(source_types, target_types)
             for s_class, t_class in possible_relations:
-                rprint(f"Preparing relation checks for {rc.__name__}, between {s_class.__name__} and {t_class.__name__}")
-                s_nodes = [node for node in full_nodes if isinstance(node, s_class)]
-                t_nodes = [node for node in full_nodes if isinstance(node, t_class)]
-                for s_node in s_nodes:
-                    for t_node in t_nodes:
-                        if s_node == t_node:
-                            continue
-                        else:
-                            task = self.check_relation(s_node, t_node, rc)
-                            tasks.append(task)
-                            task_metadata.append((s_node, t_node, rc))
-
-        rprint(f"Executing {len(tasks)} relation checks in parallel...")
+                TRACER.log(f"Preparing relation checks for {rc.__name__}, between {s_class.__name__} and {t_class.__name__}", level=VerbosityEnum.VERBOSE)
+                s_nodes = store.of_type(s_class)
+                t_nodes = store.of_type(t_class)
+                for s_node, t_node in self.pruner.candidate_pairs(s_nodes, t_nodes, rc.__name__):
+                    if memo is not None and (stored := memo.get(verdict_key(s_node, t_node, rc))) is not None:
+                        checked.append((s_node, t_node, rc, HasRelation.model_validate_json(stored)))
+                    elif self.batch_mode == RelationBatchModeEnum.RELATION_CLASS:
+                        groups[(rc,)].append((s_node, t_node))
+                    elif self.batch_mode == RelationBatchModeEnum.SOURCE_NODE:
+                        groups[(rc, id(s_node))].append((s_node, t_node))
+                    else:
+                        task = self.check_relation(s_node, t_node, rc, renderer)
+                        tasks.append(task)
+                        task_metadata.append((s_node, t_node, rc))
+
+        self.pruner.report()
+        self.pruner.release()
+        group_metadata = [(pairs, key[0]) for key, pairs in groups.items()]
+        group_tasks = [self._check_relation_group(pairs, rc, renderer) for pairs, rc in group_metadata]
+
+        if memo is not None:
+            TRACER.log(f"Reusing {len(checked)} relation verdicts of the previous run")
+        TRACER.current().set(relation_checks=len(tasks), relation_batches=len(group_tasks), reused_verdicts=len(checked))
+        TRACER.log(f"Executing {len(tasks)} relation checks and {len(group_tasks)} batched groups through the scheduler (max {self.scheduler.config.max_in_flight} in flight)...")
 
         # Execute all tasks in parallel
-        if tasks:
-            results = await asyncio.gather(*tasks)
-
-            # Process results
-            for (s_node, t_node, rc), has_relation in zip(task_metadata, results):  # noqa: B905
-                if has_relation.value:
-                    extracted_relations.append(
-                        rc(
-                            source_node=s_node,
-                            target_node=t_node,
-                            reason=has_relation.reason,
-                            reference_text="Extracted from the contract with LLM",
-                        )
+        if tasks or group_tasks:
+            results, group_results = await asyncio.gather(asyncio.gather(*tasks), asyncio.gather(*group_tasks))
+
+            # Process results, batched groups are flattened back to one verdict per pair
+            new_checks = [(s_node, t_node, rc, has_relation) for (s_node, t_node, rc), has_relation in zip(task_metadata, results)]  # noqa: B905
+            for (pairs, rc), group_result in zip(group_metadata, group_results):  # noqa: B905
+                new_checks.extend((s_node, t_node, rc, has_relation) for (s_node, t_node), has_relation in zip(pairs, group_result))  # noqa: B905
+            if memo is not None:
+                for s_node, t_node, rc, has_relation in new_checks:
+                    memo.set(verdict_key(s_node, t_node, rc), has_relation.model_dump_json())
+            checked.extend(new_checks)
+        renderer.report()
+
+        for s_node, t_node, rc, has_relation in checked:
+            if has_relation.value:
+                extracted_relations.append(
+                    rc(
+                        source_node=s_node,
+                        target_node=t_node,
+                        reason=has_relation.reason,
+                        reference_text="Extracted from the contract with LLM",
                     )
-                else:
-                    rprint(has_relation.reason)
+                )
+            else:
+                TRACER.log(has_relation.reason, level=VerbosityEnum.VERBOSE)
 
         return extracted_relations
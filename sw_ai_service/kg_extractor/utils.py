@@ -1,12 +1,24 @@
+import json
+from collections import Counter
 from datetime import datetime
-from typing import Any, Union, get_args, get_origin, get_type_hints
+from typing import TYPE_CHECKING, Any, Union, get_args, get_origin, get_type_hints
 
 from pydantic import BaseModel, Field, create_model
-from sw_onto_generation.base.base_node import BaseNode
-from sw_onto_generation.base.configs import HowToExtract
 
+from sw_ai_service.llm.model_registry import MODEL_REGISTRY
 
-def node_dict_to_ontology(node_dict: dict[str, tuple[type[BaseNode], bool, str]]) -> type[BaseModel]:
+if TYPE_CHECKING:
+    from sw_onto_generation.base.base_node import BaseNode
+    from sw_onto_generation.base.base_relation import BaseRelation
+    from sw_onto_generation.base.configs import HowToExtract
+
+
+def node_dict_to_ontology(node_dict: dict[str, tuple[type["BaseNode"], bool, str]]) -> type[BaseModel]:
+    key = ("EntityOntology", tuple((name, node_class, cardinality, description) for name, (node_class, cardinality, description) in node_dict.items()))
+    return MODEL_REGISTRY.get_or_create(key, lambda: _create_ontology(node_dict))
+
+
+def _create_ontology(node_dict: dict[str, tuple[type["BaseNode"], bool, str]]) -> type[BaseModel]:
     fields: dict[str, Any] = {}
     for key, (node_class, cardinality, description) in node_dict.items():
         field_name = key.lower().replace("node", "") + ("_nodes" if cardinality else "_node")
@@ -20,15 +32,59 @@ def node_dict_to_ontology(node_dict: dict[str, tuple[type[BaseNode], bool, str]]
     return model
 
 
-def filter_node_classes_by_case(case: HowToExtract, node_list: list[type[BaseNode]]) -> list[type[BaseNode]]:
+def case2_relation_class(node_class: type["BaseNode"]) -> type["BaseRelation"]:
+    """Relation class linking a case-0 node to the case-2 node extracted from one of its fields, created once per node class"""
+    from sw_onto_generation.base.base_relation import BaseRelation
+
+    return MODEL_REGISTRY.get_or_create(("case2_relation", node_class), lambda: create_model(f"Has{node_class.__name__}", __base__=BaseRelation))
+
+
+# fields that differ between two extractions of the same entity
+PROVENANCE_FIELDS = {"node_id", "reason", "reference_text"}
+
+
+def _strip_provenance(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_provenance(v) for k, v in value.items() if k not in PROVENANCE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_provenance(v) for v in value]
+    return value
+
+
+def node_content_key(node: BaseModel) -> str:
+    """Identifies a node by its extracted content, ignoring ids and provenance, so duplicates from different text windows compare equal"""
+    return json.dumps([node.__class__.__name__, _strip_provenance(node.model_dump(mode="json"))], sort_keys=True, ensure_ascii=False)
+
+
+def merge_ontology_instances(ontology: type[BaseModel], instances: list[BaseModel | None]) -> BaseModel:
+    """Reduces per-window extractions into one, list fields are unioned and single fields keep the most frequent value (earliest window on ties)"""
+    merged: dict[str, Any] = {}
+    present = [instance for instance in instances if instance is not None]
+    for field_name, field_info in ontology.model_fields.items():
+        values = [getattr(instance, field_name) for instance in present if getattr(instance, field_name) is not None]
+        if get_origin(field_info.annotation) is list:
+            unique: dict[str, Any] = {}
+            for node in (node for value in values for node in value):
+                unique.setdefault(node_content_key(node), node)
+            # fields no window extracted keep their default, the ontology does not accept an explicit None
+            if unique:
+                merged[field_name] = list(unique.values())
+        elif values:
+            keys = [node_content_key(value) for value in values]
+            votes = Counter(keys)
+            merged[field_name] = values[max(range(len(values)), key=lambda i: votes[keys[i]])]
+    return ontology(**merged)
+
+
+def filter_node_classes_by_case(case: "HowToExtract", node_list: list[type["BaseNode"]]) -> list[type["BaseNode"]]:
     return [node for node in node_list if node.node_config.how_to_extract == case]
 
 
-def node_class_to_node_dict(node_class: type[BaseNode]) -> dict[str, tuple[type[BaseNode], bool, str]]:
+def node_class_to_node_dict(node_class: type["BaseNode"]) -> dict[str, tuple[type["BaseNode"], bool, str]]:
     return {node_class.__name__: (node_class, node_class.node_config.cardinality, node_class.node_config.description)}
 
 
-def filter_node_list(node_list: list[BaseNode]) -> list[BaseNode]:
+def filter_node_list(node_list: list["BaseNode"]) -> list["BaseNode"]:
     filtered = []
     for node in node_list:
         if node is not None:
@@ -62,3 +118,11 @@ def get_type_classes(cls: type, attr: str) -> list[type[Any]]:
     else:
         # Other generics
         return list(get_args(t))
+
+
+def relation_endpoint_types(relation_class: type["BaseRelation"]) -> tuple[list[type[Any]], list[type[Any]]]:
+    """Source and target node types of a relation class, resolved from its type hints once per class"""
+    return MODEL_REGISTRY.get_or_create(
+        ("relation_endpoints", relation_class),
+        lambda: (get_type_classes(relation_class, "source_node"), get_type_classes(relation_class, "target_node")),
+    )
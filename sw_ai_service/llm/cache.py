@@ -0,0 +1,139 @@
+import hashlib
+import json
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+from typing import TypeVar
+
+from pydantic import BaseModel, Field
+
+from sw_ai_service.configs import CacheModeEnum
+from sw_ai_service.llm.model_registry import MODEL_REGISTRY
+from sw_ai_service.llm.tokens import count_tokens
+from sw_ai_service.tracing import TRACER, Span
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a response is not in the cache"""
+
+
+class CacheConfig(BaseModel):
+    mode: CacheModeEnum = CacheModeEnum.OFF
+    path: Path = Field(default=Path(".cache/llm_responses.sqlite"))
+    ttl_seconds: float | None = Field(default=30 * 24 * 3600, gt=0, description="Entries older than this are treated as misses, None keeps them forever")
+    max_entries: int = Field(default=100_000, ge=1, description="Least recently used entries are evicted above this size")
+
+
+class CacheStats(BaseModel):
+    hits: int = 0
+    misses: int = 0
+    writes: int = 0
+    evictions: int = 0
+
+
+class LLMResponseCache:
+    """Disk-backed cache of structured LLM responses keyed on model id, rendered prompt and response schema"""
+
+    def __init__(self, config: CacheConfig | None = None):
+        self.config = config or CacheConfig()
+        self.stats = CacheStats()
+        self._conn: sqlite3.Connection | None = None
+        if self.config.mode != CacheModeEnum.OFF:
+            self.config.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.config.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses (created_at)")
+            self._conn.commit()
+            self._size = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @property
+    def enabled(self) -> bool:
+        return self._conn is not None
+
+    @staticmethod
+    def make_key(model: str, prompt: str, response_model: type[BaseModel]) -> str:
+        payload = json.dumps([model, prompt, MODEL_REGISTRY.json_schema(response_model)], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str, response_model: type[M]) -> M | None:
+        if self._conn is None:
+            return None
+        row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or (self.config.ttl_seconds is not None and now - row[1] > self.config.ttl_seconds):
+            self.stats.misses += 1
+            if self.config.mode == CacheModeEnum.REPLAY:
+                raise CacheMissError(key)
+            return None
+        self.stats.hits += 1
+        if self.config.mode == CacheModeEnum.READ_WRITE:
+            self._conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        return response_model.model_validate_json(row[0])
+
+    def set(self, key: str, value: BaseModel) -> None:
+        if self._conn is None or self.config.mode != CacheModeEnum.READ_WRITE:
+            return
+        now = time.time()
+        exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+        self._conn.execute("INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)", (key, value.model_dump_json(), now, now))
+        self.stats.writes += 1
+        self._size += 0 if exists else 1
+        self._evict(self._conn, now)
+        self._conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        if self.config.ttl_seconds is not None:
+            expired = conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.config.ttl_seconds,)).rowcount
+            self.stats.evictions += expired
+            self._size -= expired
+        overflow = self._size - self.config.max_entries
+        if overflow > 0:
+            conn.execute("DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (overflow,))
+            self.stats.evictions += overflow
+            self._size -= overflow
+
+    @staticmethod
+    def _estimate_usage(span: Span, model: str, prompt: str, result: BaseModel) -> None:
+        """Counts the tokens of calls whose client did not report the provider's usage, kept apart as estimated_* attributes"""
+        if TRACER.config.enabled and "prompt_tokens" not in span.attributes:
+            span.set(estimated_prompt_tokens=count_tokens(prompt, model), estimated_completion_tokens=count_tokens(result.model_dump_json(), model))
+
+    async def get_or_call(self, call: Callable[[], Awaitable[M]], model: str, prompt: str, response_model: type[M]) -> M:
+        """Returns the cached response for this prompt or awaits call and stores its result, traced as one LLM call span"""
+        with TRACER.span("llm.call", model=model, response_model=response_model.__name__, cache_hit=False) as span:
+            key = self.make_key(model, prompt, response_model) if self._conn is not None else None
+            cached = self.get(key, response_model) if key is not None else None
+            if cached is not None:
+                span.set(cache_hit=True)
+                return cached
+            result = await call()
+            if result is not None:
+                self._estimate_usage(span, model, prompt, result)
+                if key is not None:
+                    self.set(key, result)
+            return result
+
+    def get_or_run(self, call: Callable[[], M], model: str, prompt: str, response_model: type[M]) -> M:
+        """Synchronous counterpart of get_or_call for blocking clients such as the agno agent"""
+        with TRACER.span("llm.call", model=model, response_model=response_model.__name__, cache_hit=False) as span:
+            key = self.make_key(model, prompt, response_model) if self._conn is not None else None
+            cached = self.get(key, response_model) if key is not None else None
+            if cached is not None:
+                span.set(cache_hit=True)
+                return cached
+            result = call()
+            if result is not None:
+                self._estimate_usage(span, model, prompt, result)
+                if key is not None:
+                    self.set(key, result)
+            return result
+
+    def report(self) -> None:
+        if self.enabled:
+            TRACER.log("LLM cache stats: ", self.stats.model_dump())
@@ -0,0 +1,132 @@
+import importlib.util
+from collections.abc import Hashable
+from typing import TYPE_CHECKING, Any, Protocol
+
+import httpx
+from pydantic import BaseModel, Field
+
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import Runnable
+    from langchain_openai import ChatOpenAI
+    from openai import AsyncOpenAI, OpenAI
+
+
+class LLMClientConfig(BaseModel):
+    max_connections: int = Field(default=256, ge=1, description="Open connections across every model and engine, should cover the scheduler's max_in_flight")
+    max_keepalive_connections: int = Field(default=64, ge=0)
+    keepalive_expiry_seconds: float = Field(default=60.0, ge=0)
+    timeout_seconds: float = Field(default=600.0, gt=0)
+    http2: bool = Field(default=False, description="Opt-in HTTP/2 multiplexing, needs the h2 package (pip install 'httpx[http2]') and is ignored without it")
+
+
+class StructuredOutputLLM(Protocol):
+    """Chat model the extractors work with, a ChatOpenAI or the fake model of the benchmarks"""
+
+    model_name: str
+
+    def with_structured_output(self, schema: type[BaseModel], *, include_raw: bool = False, **kwargs: Any) -> "Runnable": ...
+
+
+def record_usage(prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> None:
+    """Token usage the provider billed for the current LLM call, recorded on its span"""
+    TRACER.current().set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cached_prompt_tokens=cached_prompt_tokens)
+
+
+def record_agno_usage(metrics: Any) -> None:
+    """Records the usage of an agno run, agno 1.x keeps a list per model call in a dict and later versions an object with totals"""
+    if not metrics:
+        return
+    if isinstance(metrics, dict):
+        record_usage(sum(metrics.get("input_tokens", [])), sum(metrics.get("output_tokens", [])), sum(metrics.get("cached_tokens", [])))
+    else:
+        record_usage(metrics.input_tokens, metrics.output_tokens, getattr(metrics, "cache_read_tokens", 0))
+
+
+def _parsed_with_usage(output: dict[str, Any]) -> Any:
+    """Parsed response of a structured output built with include_raw, the usage of the raw message is recorded on the current span"""
+    usage = getattr(output["raw"], "usage_metadata", None)
+    if usage:
+        record_usage(usage["input_tokens"], usage["output_tokens"], usage.get("input_token_details", {}).get("cache_read", 0))
+    if output["parsing_error"] is not None:
+        raise output["parsing_error"]
+    return output["parsed"]
+
+
+class LLMClientRegistry:
+    """Process-wide LLM clients: one pooled keep-alive HTTP client pair shared by every model and engine, one chat model per model id and one structured-output runnable per (model, schema)"""
+
+    def __init__(self, config: LLMClientConfig | None = None):
+        self.config = config or LLMClientConfig()
+        self._http_client: httpx.Client | None = None
+        self._http_async_client: httpx.AsyncClient | None = None
+        self._openai_clients: tuple[OpenAI, AsyncOpenAI] | None = None
+        self._chat_models: dict[str, ChatOpenAI] = {}
+        # keyed on id, the model is kept in the value so the id cannot be reused while the entry exists
+        self._structured: dict[Hashable, tuple[Any, Runnable]] = {}
+
+    def configure(self, config: LLMClientConfig) -> None:
+        """Takes effect for clients created afterwards, existing ones keep their pool"""
+        self.config = config
+
+    def _client_options(self) -> dict[str, Any]:
+        limits = httpx.Limits(
+            max_connections=self.config.max_connections,
+            max_keepalive_connections=self.config.max_keepalive_connections,
+            keepalive_expiry=self.config.keepalive_expiry_seconds,
+        )
+        http2 = self.config.http2 and importlib.util.find_spec("h2") is not None
+        return {"limits": limits, "timeout": httpx.Timeout(self.config.timeout_seconds, connect=10.0), "http2": http2}
+
+    def http_client(self) -> httpx.Client:
+        if self._http_client is None:
+            self._http_client = httpx.Client(**self._client_options())
+        return self._http_client
+
+    def http_async_client(self) -> httpx.AsyncClient:
+        """Pooled async client, its connections belong to the event loop of its first request, see aclose"""
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(**self._client_options())
+        return self._http_async_client
+
+    def openai_clients(self) -> tuple["OpenAI", "AsyncOpenAI"]:
+        """OpenAI SDK clients on the shared pool, for agno models which take SDK clients rather than HTTP clients"""
+        if self._openai_clients is None:
+            from openai import AsyncOpenAI, OpenAI
+
+            self._openai_clients = (OpenAI(http_client=self.http_client()), AsyncOpenAI(http_client=self.http_async_client()))
+        return self._openai_clients
+
+    def chat_model(self, model: str) -> "ChatOpenAI":
+        """Chat model shared by every extractor and engine using this model, retries are owned by the scheduler"""
+        if model not in self._chat_models:
+            from langchain_openai import ChatOpenAI
+
+            self._chat_models[model] = ChatOpenAI(model=model, max_retries=0, http_client=self.http_client(), http_async_client=self.http_async_client())
+        return self._chat_models[model]
+
+    def structured_output(self, llm: StructuredOutputLLM, schema: type[BaseModel], **kwargs: Any) -> "Runnable":
+        """llm.with_structured_output(schema, **kwargs) returning the parsed response, built once instead of on every call; the provider's token usage of every call is recorded on the current span"""
+        key = (id(llm), schema, tuple(sorted(kwargs.items())))
+        if key not in self._structured:
+            from langchain_core.runnables import RunnableLambda
+
+            self._structured[key] = (llm, llm.with_structured_output(schema, include_raw=True, **kwargs) | RunnableLambda(_parsed_with_usage))
+        return self._structured[key][1]
+
+    def _reset(self) -> None:
+        self._http_client = self._http_async_client = self._openai_clients = None
+        self._chat_models.clear()
+        self._structured.clear()
+
+    async def aclose(self) -> None:
+        """Closes the pools, a process running several event loops calls this before each loop ends; engines built afterwards get fresh clients"""
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
+        self._reset()
+
+
+LLM_CLIENTS = LLMClientRegistry()
@@ -0,0 +1,38 @@
+from collections.abc import Callable, Hashable
+from typing import Any, TypeVar
+
+from pydantic import BaseModel
+
+T = TypeVar("T")
+
+
+class ModelRegistry:
+    """Process-wide memo of classes generated at runtime (ontology models, relation classes, enums) and of JSON schemas, keyed by their inputs"""
+
+    def __init__(self) -> None:
+        self._classes: dict[Hashable, Any] = {}
+        self._schemas: dict[type[BaseModel], dict[str, Any]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], T]) -> T:
+        if key in self._classes:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self._classes[key] = factory()
+        return self._classes[key]
+
+    def json_schema(self, model: type[BaseModel]) -> dict[str, Any]:
+        """JSON schema of model, generated once; the returned dict is shared and must not be mutated"""
+        if model not in self._schemas:
+            self._schemas[model] = model.model_json_schema()
+        return self._schemas[model]
+
+    def clear(self) -> None:
+        self._classes.clear()
+        self._schemas.clear()
+        self.hits = self.misses = 0
+
+
+MODEL_REGISTRY = ModelRegistry()
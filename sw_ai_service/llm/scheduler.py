@@ -0,0 +1,164 @@
+import asyncio
+import random
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from openai import APIConnectionError, RateLimitError
+from pydantic import BaseModel, Field
+
+from sw_ai_service.configs import LLMOptions
+from sw_ai_service.tracing import TRACER
+
+T = TypeVar("T")
+
+# calls whose latency the summary covers, a long-lived scheduler keeps only the most recent ones
+LATENCY_WINDOW = 10_000
+
+
+class RateLimit(BaseModel):
+    requests_per_minute: int = Field(ge=1)
+    tokens_per_minute: int = Field(ge=1)
+
+
+DEFAULT_RATE_LIMITS: dict[str, RateLimit] = {
+    LLMOptions.OPENAI_O3: RateLimit(requests_per_minute=500, tokens_per_minute=30_000),
+    LLMOptions.OPENAI_O3_MINI: RateLimit(requests_per_minute=1_000, tokens_per_minute=100_000),
+    LLMOptions.OPENAI_GPT4o: RateLimit(requests_per_minute=500, tokens_per_minute=30_000),
+    LLMOptions.OPENAI_GPT4o_MINI: RateLimit(requests_per_minute=500, tokens_per_minute=200_000),
+    LLMOptions.OPENAI_GPT4_1_NANO: RateLimit(requests_per_minute=500, tokens_per_minute=200_000),
+}
+
+
+class SchedulerConfig(BaseModel):
+    max_in_flight: int = Field(default=32, ge=1, description="Maximum number of LLM requests running at the same time")
+    rate_limits: dict[str, RateLimit] = Field(default_factory=lambda: dict(DEFAULT_RATE_LIMITS))
+    default_rate_limit: RateLimit = Field(default_factory=lambda: RateLimit(requests_per_minute=500, tokens_per_minute=30_000))
+    max_retries: int = Field(default=6, ge=0)
+    base_delay: float = Field(default=1.0, gt=0, description="First backoff delay in seconds, doubled on every retry")
+    max_delay: float = Field(default=60.0, gt=0)
+
+
+class SchedulerStats(BaseModel):
+    queued: int = 0
+    in_flight: int = 0
+    max_queue_depth: int = 0
+    completed: int = 0
+    failed: int = 0
+    retries: int = 0
+    latencies: deque[float] = Field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW), description="Latencies of the last LATENCY_WINDOW calls")
+
+    def summary(self) -> dict[str, float]:
+        latencies = sorted(self.latencies)
+        n = len(latencies)
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "latency_mean": sum(latencies) / n if n else 0.0,
+            "latency_p50": latencies[n // 2] if n else 0.0,
+            "latency_p95": latencies[min(n - 1, int(n * 0.95))] if n else 0.0,
+        }
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if isinstance(exc, RateLimitError | APIConnectionError):
+        return True
+    return getattr(exc, "status_code", None) == 429
+
+
+class _RateWindow:
+    """Sliding one-minute window of request and token usage for a single model"""
+
+    def __init__(self, limit: RateLimit, period: float = 60.0):
+        self.limit = limit
+        self.period = period
+        self._events: deque[tuple[float, int]] = deque()
+        self._tokens = 0
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, delay: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    async def acquire(self, tokens: int) -> None:
+        # a single request larger than the budget would otherwise wait forever
+        tokens = min(tokens, self.limit.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                while self._events and now - self._events[0][0] >= self.period:
+                    _, expired_tokens = self._events.popleft()
+                    self._tokens -= expired_tokens
+                if len(self._events) < self.limit.requests_per_minute and self._tokens + tokens <= self.limit.tokens_per_minute:
+                    self._events.append((now, tokens))
+                    self._tokens += tokens
+                    return
+                await asyncio.sleep(self._events[0][0] + self.period - now)
+
+
+class LLMScheduler:
+    """Shared gate for every LLM call: caps in-flight requests, budgets RPM/TPM per model and retries rate-limit errors with jittered backoff"""
+
+    def __init__(self, config: SchedulerConfig | None = None):
+        self.config = config or SchedulerConfig()
+        self.stats = SchedulerStats()
+        self._semaphore = asyncio.Semaphore(self.config.max_in_flight)
+        self._windows: dict[str, _RateWindow] = {}
+
+    def _window(self, model: str) -> _RateWindow:
+        if model not in self._windows:
+            limit = self.config.rate_limits.get(model, self.config.default_rate_limit)
+            self._windows[model] = _RateWindow(limit)
+        return self._windows[model]
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter keeps retrying callers from hitting the provider in lockstep
+        return random.uniform(0, min(self.config.max_delay, self.config.base_delay * 2**attempt))  # noqa: S311
+
+    async def submit(self, call: Callable[[], Awaitable[T]], model: str, tokens: int = 0) -> T:
+        window = self._window(model)
+        # waits and retries are recorded on the span of the LLM call this request belongs to
+        span = TRACER.current()
+        attempt = 0
+        while True:
+            self.stats.queued += 1
+            self.stats.max_queue_depth = max(self.stats.max_queue_depth, self.stats.queued)
+            queued_at = time.perf_counter()
+            try:
+                await window.acquire(tokens)
+                await self._semaphore.acquire()
+            finally:
+                self.stats.queued -= 1
+                span.add("queue_seconds", time.perf_counter() - queued_at)
+            self.stats.in_flight += 1
+            start = time.perf_counter()
+            try:
+                result = await call()
+            except Exception as exc:
+                if not is_retryable_error(exc) or attempt >= self.config.max_retries:
+                    self.stats.failed += 1
+                    raise
+                delay = self._backoff(attempt)
+                window.pause(delay)
+                self.stats.retries += 1
+                span.add("retries", 1)
+                attempt += 1
+            else:
+                self.stats.latencies.append(time.perf_counter() - start)
+                span.set(latency_seconds=time.perf_counter() - start)
+                self.stats.completed += 1
+                return result
+            finally:
+                self.stats.in_flight -= 1
+                self._semaphore.release()
+
+    def report(self) -> None:
+        TRACER.log("LLM scheduler stats: ", self.stats.summary())
@@ -0,0 +1,111 @@
+import zlib
+from collections.abc import Callable, Iterable
+from functools import lru_cache
+from typing import Any, TypeVar
+
+from sw_ai_service.configs import DEFAULT_CONTEXT_LIMITS, LLM_CONTEXT_LIMITS, LLMContextLimits
+
+T = TypeVar("T")
+
+CHARS_PER_TOKEN = 4
+# on average one line in this many closes an anchored window once it is half full
+ANCHOR_MODULUS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for rate-limit budgeting, roughly 4 characters per token"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+@lru_cache(maxsize=32)
+def get_tokenizer(model: str) -> Any | None:
+    """tiktoken encoding of the model, None when tiktoken does not know the model or its vocabulary cannot be loaded (it is downloaded once, then cached)"""
+    try:
+        import tiktoken
+
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Exact token count with the model's tokenizer, the cheap estimate when it is not available"""
+    tokenizer = get_tokenizer(model)
+    return len(tokenizer.encode(text, disallowed_special=())) if tokenizer is not None else estimate_tokens(text)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str, marker: str = "…") -> str:
+    """Cuts text to at most max_tokens tokens of the model, a cut text ends with marker"""
+    tokenizer = get_tokenizer(model)
+    if tokenizer is None:
+        # the largest text estimate_tokens counts as max_tokens
+        max_chars = (max_tokens - 1) * CHARS_PER_TOKEN + CHARS_PER_TOKEN - 1
+        return text if len(text) <= max_chars else text[: max(0, max_chars - len(marker))] + marker
+    tokens = tokenizer.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return tokenizer.decode(tokens[: max(0, max_tokens - len(tokenizer.encode(marker)))]) + marker
+
+
+def get_context_limits(model: str) -> LLMContextLimits:
+    return LLM_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMITS)
+
+
+def batch_by_token_budget(items: Iterable[T], cost: Callable[[T], int], max_items: int, max_tokens: int) -> list[list[T]]:
+    """Greedily packs items into batches of at most max_items whose summed cost stays within max_tokens, an item larger than the budget gets a batch of its own"""
+    batches: list[list[T]] = []
+    current: list[T] = []
+    current_tokens = 0
+    for item in items:
+        item_tokens = cost(item)
+        if current and (len(current) >= max_items or current_tokens + item_tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(item)
+        current_tokens += item_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def split_into_windows(text: str, max_tokens: int, overlap_tokens: int = 0) -> list[str]:
+    """Splits text into windows of about max_tokens that overlap by overlap_tokens, cutting at whitespace where possible"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    overlap_chars = min(overlap_tokens * CHARS_PER_TOKEN, max_chars // 2)
+    if len(text) <= max_chars:
+        return [text]
+    windows = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            # prefer to cut after the last whitespace in the second half of the window
+            cut = text.rfind(" ", start + max_chars // 2, end)
+            end = cut + 1 if cut != -1 else end
+        windows.append(text[start:end])
+        if end == len(text):
+            break
+        start = max(end - overlap_chars, start + 1)
+    return windows
+
+
+def split_into_anchored_windows(text: str, max_tokens: int) -> list[str]:
+    """Splits text into consecutive windows of at most max_tokens that end at lines chosen by their own content, so an edit only changes the windows around it instead of shifting every later cut"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return [text]
+    windows = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        for piece in split_into_windows(line, max_tokens):
+            if current and len(current) + len(piece) > max_chars:
+                windows.append(current)
+                current = ""
+            current += piece
+            # anchors only depend on the line itself, so the cuts of an edited text line up again right after the edit
+            if len(current) >= max_chars // 2 and zlib.crc32(piece.encode()) % ANCHOR_MODULUS == 0:
+                windows.append(current)
+                current = ""
+    if current:
+        windows.append(current)
+    return windows
@@ -1,35 +1,234 @@
+import asyncio
+import importlib
+import os
+import tempfile
+from collections.abc import AsyncIterator, Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from langchain_community.document_loaders import PyPDFLoader, UnstructuredPDFLoader
-from pydantic import BaseModel
+from langchain_core.documents import Document
+from pydantic import BaseModel, Field
+from pypdf import PdfReader, PdfWriter
 
 from sw_ai_service.configs import PDFLoaderEnum, PDFLoaderModeEnum
+from sw_ai_service.llm.tokens import CHARS_PER_TOKEN
+from sw_ai_service.tracing import TRACER
+
+if TYPE_CHECKING:
+    from langchain_community.document_loaders import PyPDFLoader, UnstructuredPDFLoader
+
+# separator used between pages when they are joined into a single text
+PAGE_SEPARATOR = " "
+# separators the loaders use in single mode, so the process pool path returns the same text as run
+SINGLE_MODE_SEPARATORS = {PDFLoaderEnum.PYPDF: "\n\f", PDFLoaderEnum.UNSTRUCTURED: "\n\n"}
+# heavy modules imported once when a parse worker starts instead of on its first task
+WARM_IMPORTS = {
+    PDFLoaderEnum.PYPDF: ["pypdf", "langchain_community.document_loaders.pdf"],
+    PDFLoaderEnum.UNSTRUCTURED: ["pypdf", "langchain_community.document_loaders.pdf", "unstructured.partition.pdf"],
+}
 
 
 class EngineConfig(BaseModel):
     pdf_loader_id: PDFLoaderEnum
     page_mode: PDFLoaderModeEnum
     pdf_path: Path
+    chunk_max_tokens: int = Field(default=4_000, ge=1, description="Upper bound on the size of the chunks yielded by the streaming API")
+    parse_workers: int | None = Field(default=None, ge=1, description="Size of the parse process pool, defaults to the number of CPUs")
+    pages_per_task: int = Field(default=4, ge=1, description="Pages parsed by one process pool task")
+
+
+class TextChunk(BaseModel):
+    text: str
+    start_page: int
+    end_page: int
+    char_offset: int = Field(description="Offset of the chunk in the text returned by run in page mode")
+
+
+def page_index(document: Document, fallback: int) -> int:
+    """Zero based page number of a loaded page, PyPDF reports `page` and Unstructured reports a one based `page_number`"""
+    if "page" in document.metadata:
+        return int(document.metadata["page"])
+    if "page_number" in document.metadata:
+        return int(document.metadata["page_number"]) - 1
+    return fallback
+
+
+class PageChunker:
+    """Packs consecutive pages into chunks of at most max_tokens, splitting pages larger than that; only the open chunk is held in memory"""
+
+    def __init__(self, max_tokens: int):
+        self.max_chars = max_tokens * CHARS_PER_TOKEN
+        self._parts: list[str] = []
+        self._size = 0
+        self._start_page = self._end_page = 0
+        self._chunk_offset = self._offset = 0
+
+    def _flush(self) -> TextChunk:
+        chunk = TextChunk(text=PAGE_SEPARATOR.join(self._parts), start_page=self._start_page, end_page=self._end_page, char_offset=self._chunk_offset)
+        self._parts, self._size = [], 0
+        return chunk
+
+    def add(self, page: int, text: str) -> list[TextChunk]:
+        """Adds a page and returns the chunks it completed"""
+        completed = []
+        if self._offset > 0:
+            self._offset += len(PAGE_SEPARATOR)
+        for start in range(0, max(len(text), 1), self.max_chars):
+            piece = text[start : start + self.max_chars]
+            if self._parts and self._size + len(PAGE_SEPARATOR) + len(piece) > self.max_chars:
+                completed.append(self._flush())
+            if not self._parts:
+                self._start_page, self._chunk_offset = page, self._offset + start
+            self._size += len(piece) + (len(PAGE_SEPARATOR) if self._parts else 0)
+            self._parts.append(piece)
+            self._end_page = page
+        self._offset += len(text)
+        return completed
+
+    def close(self) -> list[TextChunk]:
+        return [self._flush()] if self._parts else []
+
+
+def chunk_pages(pages: Iterable[tuple[int, str]], max_tokens: int) -> Iterator[TextChunk]:
+    chunker = PageChunker(max_tokens)
+    for page, text in pages:
+        yield from chunker.add(page, text)
+    yield from chunker.close()
+
+
+def _warm_worker(pdf_loader_id: PDFLoaderEnum) -> None:
+    for module in WARM_IMPORTS[pdf_loader_id]:
+        importlib.import_module(module)
+
+
+def count_pages(pdf_path: Path) -> int:
+    return len(PdfReader(pdf_path).pages)
+
+
+def parse_page_range(config: "EngineConfig", start: int, stop: int) -> list[tuple[int, str]]:
+    """Parses pages [start, stop) with the configured loader, runs in a parse worker"""
+    # the range is copied into a temporary PDF so the loader only does the work for these pages
+    reader = PdfReader(config.pdf_path)
+    writer = PdfWriter()
+    for i in range(start, stop):
+        writer.add_page(reader.pages[i])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        part_path = Path(tmp_dir) / f"pages_{start}_{stop}.pdf"
+        writer.write(part_path)
+        part_config = config.model_copy(update={"pdf_path": part_path, "page_mode": PDFLoaderModeEnum.PAGE})
+        documents = Engine(part_config).get_model(part_config).lazy_load()
+        return [(start + page_index(document, i), document.page_content) for i, document in enumerate(documents)]
+
+
+_PARSE_POOLS: dict[tuple[PDFLoaderEnum, int], ProcessPoolExecutor] = {}
+
+
+def _parse_pool_key(pdf_loader_id: PDFLoaderEnum, workers: int | None) -> tuple[PDFLoaderEnum, int]:
+    return pdf_loader_id, workers or os.cpu_count() or 1
+
+
+def has_parse_pool(pdf_loader_id: PDFLoaderEnum, workers: int | None = None) -> bool:
+    return _parse_pool_key(pdf_loader_id, workers) in _PARSE_POOLS
+
+
+def get_parse_pool(pdf_loader_id: PDFLoaderEnum, workers: int | None = None) -> ProcessPoolExecutor:
+    """Process pool shared by every engine using this loader, its workers import the loader libraries when they start"""
+    key = _parse_pool_key(pdf_loader_id, workers)
+    if key not in _PARSE_POOLS:
+        _PARSE_POOLS[key] = ProcessPoolExecutor(max_workers=key[1], initializer=_warm_worker, initargs=(pdf_loader_id,))
+    return _PARSE_POOLS[key]
+
+
+def shutdown_parse_pool(pdf_loader_id: PDFLoaderEnum, workers: int | None = None) -> None:
+    """Shuts down one shared pool and leaves the others running, the next get_parse_pool call creates it again"""
+    pool = _PARSE_POOLS.pop(_parse_pool_key(pdf_loader_id, workers), None)
+    if pool is not None:
+        pool.shutdown()
+
+
+def shutdown_parse_pools() -> None:
+    for pool in _PARSE_POOLS.values():
+        pool.shutdown()
+    _PARSE_POOLS.clear()
 
 
 class Engine:
     def __init__(self, config: EngineConfig):
         self.config = config
 
-    def get_model(self, config: EngineConfig) -> PyPDFLoader | UnstructuredPDFLoader:
+    def get_model(self, config: EngineConfig) -> "PyPDFLoader | UnstructuredPDFLoader":
+        # loaders are imported on first use, a process only pays for the loader it is configured with
+        # both loaders call single mode "single", page by page mode is "page" for PyPDFLoader and "paged" for UnstructuredPDFLoader
+        paged = config.page_mode == PDFLoaderModeEnum.PAGE
         if config.pdf_loader_id == PDFLoaderEnum.PYPDF:
-            return PyPDFLoader(file_path=config.pdf_path, mode=config.page_mode)
+            from langchain_community.document_loaders import PyPDFLoader
+
+            return PyPDFLoader(file_path=config.pdf_path, mode="page" if paged else "single")
         elif config.pdf_loader_id == PDFLoaderEnum.UNSTRUCTURED:
-            return UnstructuredPDFLoader(file_path=config.pdf_path, mode=config.page_mode)
+            from langchain_community.document_loaders import UnstructuredPDFLoader
+
+            return UnstructuredPDFLoader(file_path=config.pdf_path, mode="paged" if paged else "single")
         else:
             raise ValueError(f"Invalid PDF loader id: {config.pdf_loader_id}")
 
-    def run(self) -> str:
-        loader = self.get_model(self.config)
+    def _page_loader(self) -> "PyPDFLoader | UnstructuredPDFLoader":
+        # streaming always works page by page, whatever page_mode run uses; get_model names the mode the way each loader expects
+        return self.get_model(self.config.model_copy(update={"page_mode": PDFLoaderModeEnum.PAGE}))
+
+    def iter_pages(self) -> Iterator[tuple[int, str]]:
+        """Yields (page index, page text) as the loader parses each page"""
+        for i, document in enumerate(self._page_loader().lazy_load()):
+            yield page_index(document, i), document.page_content
+
+    def iter_chunks(self, max_tokens: int | None = None) -> Iterator[TextChunk]:
+        return chunk_pages(self.iter_pages(), max_tokens or self.config.chunk_max_tokens)
+
+    async def astream_pages(self) -> AsyncIterator[tuple[int, str]]:
+        """Async counterpart of iter_pages, parsing runs in the loader's executor so the event loop stays free"""
+        i = 0
+        async for document in self._page_loader().alazy_load():
+            yield page_index(document, i), document.page_content
+            i += 1
+
+    async def astream_chunks(self, max_tokens: int | None = None) -> AsyncIterator[TextChunk]:
+        """Yields every chunk as soon as it is complete, so downstream stages can start while later pages are still parsed"""
+        chunker = PageChunker(max_tokens or self.config.chunk_max_tokens)
+        async for page, text in self.astream_pages():
+            for chunk in chunker.add(page, text):
+                yield chunk
+        for chunk in chunker.close():
+            yield chunk
+
+    async def aparse_pages(self, pool: Executor | None = None) -> list[tuple[int, str]]:
+        """Parses the document in page ranges spread over a process pool, the event loop stays free while workers parse"""
+        pool = pool or get_parse_pool(self.config.pdf_loader_id, self.config.parse_workers)
+        loop = asyncio.get_running_loop()
+        n_pages = await loop.run_in_executor(pool, count_pages, self.config.pdf_path)
+        step = self.config.pages_per_task
+        ranges = [(start, min(start + step, n_pages)) for start in range(0, n_pages, step)]
+        parts = await asyncio.gather(*[loop.run_in_executor(pool, parse_page_range, self.config, start, stop) for start, stop in ranges])
+        return [page for part in parts for page in part]
+
+    async def arun(self, pool: Executor | None = None) -> str:
+        """Async counterpart of run that parses in a process pool"""
+        with TRACER.span("pdf.parse", pdf_loader_id=self.config.pdf_loader_id, pdf_path=str(self.config.pdf_path)) as span:
+            texts = [text for _, text in await self.aparse_pages(pool)]
+            span.set(pages=len(texts))
         if self.config.page_mode == PDFLoaderModeEnum.SINGLE:
-            content = loader.load()[0].page_content
+            return SINGLE_MODE_SEPARATORS[self.config.pdf_loader_id].join(texts)
         elif self.config.page_mode == PDFLoaderModeEnum.PAGE:
-            content = " ".join([page.page_content for page in loader.load()])
+            return PAGE_SEPARATOR.join(texts)
         else:
             raise ValueError(f"Invalid page mode: {self.config.page_mode}")
+
+    def run(self) -> str:
+        loader = self.get_model(self.config)
+        with TRACER.span("pdf.parse", pdf_loader_id=self.config.pdf_loader_id, pdf_path=str(self.config.pdf_path)):
+            if self.config.page_mode == PDFLoaderModeEnum.SINGLE:
+                content = next(loader.lazy_load()).page_content
+            elif self.config.page_mode == PDFLoaderModeEnum.PAGE:
+                content = PAGE_SEPARATOR.join(page.page_content for page in loader.lazy_load())
+            else:
+                raise ValueError(f"Invalid page mode: {self.config.page_mode}")
         return content
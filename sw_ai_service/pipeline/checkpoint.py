@@ -0,0 +1,68 @@
+import hashlib
+import json
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+
+from sw_ai_service.configs import DocumentStageEnum
+
+
+class DocumentProgress(BaseModel):
+    doc_id: str
+    pdf_path: Path
+    stage: DocumentStageEnum = Field(default=DocumentStageEnum.PENDING, description="Last stage that completed, a failed stage leaves it unchanged and sets error")
+    error: str | None = None
+
+
+def document_id(pdf_path: Path) -> str:
+    """Stable id of a document, readable file stem plus a short hash of the resolved path so equal names in different folders do not collide"""
+    digest = hashlib.sha1(str(pdf_path.resolve()).encode(), usedforsecurity=False).hexdigest()[:10]
+    return f"{pdf_path.stem}-{digest}"
+
+
+class CheckpointStore:
+    """Append-only JSON-lines log of per-document progress, the last line of a document wins so an interrupted run resumes where it stopped"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.progress: dict[str, DocumentProgress] = {}
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    progress = DocumentProgress.model_validate_json(line)
+                    self.progress[progress.doc_id] = progress
+
+    def get(self, pdf_path: Path) -> DocumentProgress:
+        doc_id = document_id(pdf_path)
+        return self.progress.get(doc_id) or DocumentProgress(doc_id=doc_id, pdf_path=pdf_path)
+
+    def record(self, progress: DocumentProgress) -> None:
+        self.progress[progress.doc_id] = progress
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(progress.model_dump_json() + "\n")
+
+    def is_done(self, pdf_path: Path) -> bool:
+        return self.get(pdf_path).stage in (DocumentStageEnum.EXTRACTED, DocumentStageEnum.SKIPPED)
+
+
+def discover_documents(input_dir: Path | None = None, manifest: Path | None = None) -> list[Path]:
+    """PDF paths from a directory (recursively) and/or a manifest with one path per line, relative paths are resolved against the manifest"""
+    paths: list[Path] = []
+    if input_dir is not None:
+        paths.extend(sorted(input_dir.rglob("*.pdf")))
+    if manifest is not None:
+        for line in manifest.read_text(encoding="utf-8").splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                path = Path(line)
+                paths.append(path if path.is_absolute() else manifest.parent / path)
+    return list(dict.fromkeys(paths))
+
+
+def write_json(path: Path, payload: object) -> None:
+    """Writes through a temporary file so a crash never leaves a half-written result behind"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    tmp_path.replace(path)
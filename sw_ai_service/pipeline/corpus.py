@@ -0,0 +1,218 @@
+import argparse
+import asyncio
+import os
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor
+from pathlib import Path
+
+from pydantic import BaseModel, Field
+from rich import print as rprint
+from sw_onto_generation import DIR_STRUCTURE
+from sw_onto_generation.utils import get_all_common_and_specific_root_classes
+
+from sw_ai_service.configs import ClassificationModeEnum, DocumentStageEnum, LLMOptions, PDFLoaderEnum, PDFLoaderModeEnum, VerbosityEnum
+from sw_ai_service.doc_classifier.engine import DocClassifierResponse
+from sw_ai_service.doc_classifier.engine import Engine as DocClassifierEngine
+from sw_ai_service.doc_classifier.engine import EngineConfig as DocClassifierEngineConfig
+from sw_ai_service.doc_classifier.local_classifier import LocalClassifierConfig
+from sw_ai_service.kg_extractor.engine import Engine as KGExtractorEngine
+from sw_ai_service.kg_extractor.engine import EngineConfig as KGExtractorEngineConfig
+from sw_ai_service.kg_extractor.entity_resolution import EntityResolutionConfig
+from sw_ai_service.kg_extractor.graph_export import export_graph
+from sw_ai_service.llm.clients import LLM_CLIENTS
+from sw_ai_service.pdf_content_extractor.engine import Engine as PDFContentExtractorEngine
+from sw_ai_service.pdf_content_extractor.engine import EngineConfig as PDFContentExtractorEngineConfig
+from sw_ai_service.pdf_content_extractor.engine import get_parse_pool, has_parse_pool, shutdown_parse_pool
+from sw_ai_service.pipeline.checkpoint import CheckpointStore, DocumentProgress, discover_documents, write_json
+from sw_ai_service.tracing import TRACER, TracingConfig
+
+
+class CorpusConfig(BaseModel):
+    input_dir: Path | None = None
+    manifest: Path | None = None
+    output_dir: Path
+    pdf_loader_id: PDFLoaderEnum = PDFLoaderEnum.PYPDF
+    page_mode: PDFLoaderModeEnum = PDFLoaderModeEnum.SINGLE
+    doc_classifier: DocClassifierEngineConfig
+    kg_extractor: KGExtractorEngineConfig
+    parse_workers: int = Field(default_factory=lambda: os.cpu_count() or 1, ge=1, description="Processes parsing PDF page ranges in parallel, also the number of documents parsed at once")
+    classify_concurrency: int = Field(default=8, ge=1)
+    extract_concurrency: int = Field(default=4, ge=1, description="Documents in the KG extraction stage at once, their LLM calls share one scheduler")
+    queue_size: int = Field(default=16, ge=1, description="Capacity of the queues between stages, a full queue pauses the stage before it")
+    tracing: TracingConfig = Field(default_factory=TracingConfig)
+
+
+class DocumentWork(BaseModel):
+    progress: DocumentProgress
+    text: str | None = None
+    classification: DocClassifierResponse | None = None
+
+
+class CorpusRunner:
+    """Pipelines parsing, classification and KG extraction across documents with bounded queues and resumable per-document checkpoints"""
+
+    def __init__(self, config: CorpusConfig):
+        self.config = config
+        TRACER.configure(config.tracing)
+        self.checkpoints = CheckpointStore(config.output_dir / "checkpoint.jsonl")
+        self.doc_classifier_engine = DocClassifierEngine(config.doc_classifier)
+        self.kg_extractor_engine = KGExtractorEngine(config.kg_extractor)
+
+    def _doc_dir(self, progress: DocumentProgress) -> Path:
+        return self.config.output_dir / progress.doc_id
+
+    def _load_work(self, progress: DocumentProgress) -> DocumentWork:
+        """Restores the outputs of the stages a previous run already finished"""
+        work = DocumentWork(progress=progress)
+        doc_dir = self._doc_dir(progress)
+        if progress.stage in (DocumentStageEnum.PARSED, DocumentStageEnum.CLASSIFIED):
+            work.text = (doc_dir / "text.txt").read_text(encoding="utf-8")
+        if progress.stage == DocumentStageEnum.CLASSIFIED:
+            work.classification = DocClassifierResponse.model_validate_json((doc_dir / "classification.json").read_text(encoding="utf-8"))
+        return work
+
+    def _advance(self, work: DocumentWork, stage: DocumentStageEnum) -> None:
+        work.progress = work.progress.model_copy(update={"stage": stage, "error": None})
+        self.checkpoints.record(work.progress)
+
+    def _fail(self, work: DocumentWork, exc: Exception) -> None:
+        TRACER.log(f"[red]{work.progress.pdf_path} failed after stage {work.progress.stage}: {exc!r}", level=VerbosityEnum.QUIET)
+        work.progress = work.progress.model_copy(update={"error": repr(exc)})
+        self.checkpoints.record(work.progress)
+
+    async def _parse(self, work: DocumentWork, pool: Executor) -> bool:
+        if work.text is None:
+            pdf_config = PDFContentExtractorEngineConfig(pdf_loader_id=self.config.pdf_loader_id, page_mode=self.config.page_mode, pdf_path=work.progress.pdf_path)
+            work.text = await PDFContentExtractorEngine(pdf_config).arun(pool)
+            text_path = self._doc_dir(work.progress) / "text.txt"
+            text_path.parent.mkdir(parents=True, exist_ok=True)
+            text_path.write_text(work.text, encoding="utf-8")
+            self._advance(work, DocumentStageEnum.PARSED)
+        return True
+
+    async def _classify(self, work: DocumentWork) -> bool:
+        if work.text is None:
+            raise ValueError("document reached classification without text")
+        if work.classification is None:
+            work.classification = await self.doc_classifier_engine.arun(work.text, DIR_STRUCTURE)
+            write_json(self._doc_dir(work.progress) / "classification.json", work.classification.model_dump(mode="json"))
+            self._advance(work, DocumentStageEnum.CLASSIFIED)
+        if work.classification.ontology_name in (None, "UNK"):
+            # there is no ontology to extract with, the document is not retried on resume
+            self._advance(work, DocumentStageEnum.SKIPPED)
+            return False
+        return True
+
+    async def _extract(self, work: DocumentWork) -> bool:
+        if work.text is None or work.classification is None or work.classification.ontology_name is None:
+            raise ValueError("document reached extraction without text or an ontology")
+        node_classes_list, relation_classes_list = get_all_common_and_specific_root_classes(lib_name=work.classification.lib_name, ontology_name=work.classification.ontology_name)
+        full_nodes, full_relations, merges = await self.kg_extractor_engine.run(work.text, node_classes_list, relation_classes_list, work.classification.ontology_name)
+        export_graph(full_nodes, full_relations, self._doc_dir(work.progress), merges if self.config.kg_extractor.entity_resolution.enabled else None)
+        self._advance(work, DocumentStageEnum.EXTRACTED)
+        return True
+
+    async def _stage(self, name: str, concurrency: int, inbox: asyncio.Queue, outbox: asyncio.Queue | None, step: Callable[[DocumentWork], Awaitable[bool]]) -> None:
+        """Runs step on every item of inbox with the given concurrency and forwards the items it accepts, None marks the end of the stream"""
+
+        async def worker() -> None:
+            while (work := await inbox.get()) is not None:
+                try:
+                    with TRACER.span(f"corpus.{name}", doc_id=work.progress.doc_id):
+                        forward = await step(work)
+                except Exception as exc:
+                    self._fail(work, exc)
+                    forward = False
+                if forward and outbox is not None:
+                    await outbox.put(work)
+            # wake up the next sibling worker
+            await inbox.put(None)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        if outbox is not None:
+            await outbox.put(None)
+        TRACER.log(f"Corpus stage {name} finished")
+
+    async def run(self) -> dict[str, int]:
+        """Processes the documents not done yet, the engines keep their LLM clients so a runner can run again, e.g. to resume after a failure"""
+        documents = discover_documents(self.config.input_dir, self.config.manifest)
+        pending = [self.checkpoints.get(path) for path in documents if not self.checkpoints.is_done(path)]
+        TRACER.log(f"Corpus has {len(documents)} documents, {len(pending)} left to process")
+
+        to_parse: asyncio.Queue = asyncio.Queue(maxsize=self.config.queue_size)
+        to_classify: asyncio.Queue = asyncio.Queue(maxsize=self.config.queue_size)
+        to_extract: asyncio.Queue = asyncio.Queue(maxsize=self.config.queue_size)
+
+        async def feed() -> None:
+            for progress in pending:
+                await to_parse.put(self._load_work(progress))
+            await to_parse.put(None)
+
+        # documents are split into page ranges on the shared pool, so a few large PDFs still use every worker
+        # a pool another engine of this process already uses, e.g. the service's, is left running
+        owns_pool = not has_parse_pool(self.config.pdf_loader_id, self.config.parse_workers)
+        pool = get_parse_pool(self.config.pdf_loader_id, self.config.parse_workers)
+        try:
+            await asyncio.gather(
+                feed(),
+                self._stage("parse", self.config.parse_workers, to_parse, to_classify, lambda work: self._parse(work, pool)),
+                self._stage("classify", self.config.classify_concurrency, to_classify, to_extract, self._classify),
+                self._stage("extract", self.config.extract_concurrency, to_extract, None, self._extract),
+            )
+        finally:
+            if owns_pool:
+                shutdown_parse_pool(self.config.pdf_loader_id, self.config.parse_workers)
+            TRACER.report()
+
+        stages = [self.checkpoints.get(path).stage for path in documents]
+        return {stage: stages.count(stage) for stage in DocumentStageEnum}
+
+
+async def run_corpus(config: CorpusConfig) -> dict[str, int]:
+    """Runs a corpus and closes the shared LLM clients before the event loop ends, their connections belong to that loop"""
+    try:
+        return await CorpusRunner(config).run()
+    finally:
+        await LLM_CLIENTS.aclose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Extract knowledge graphs from a corpus of PDFs")
+    parser.add_argument("--input-dir", type=Path)
+    parser.add_argument("--manifest", type=Path)
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--classifier-model", type=LLMOptions, default=LLMOptions.OPENAI_GPT4_1_NANO)
+    parser.add_argument("--classifier-mode", type=ClassificationModeEnum, default=ClassificationModeEnum.TWO_STEP)
+    parser.add_argument("--classifier-prefix-tokens", type=int, help="Classify from the start of each document first, the full text is only sent when the score is low")
+    parser.add_argument("--local-classifier", type=Path, help="Model trained with sw_ai_service.doc_classifier.local_classifier, confident predictions skip the LLM")
+    parser.add_argument("--verbosity", type=VerbosityEnum, default=VerbosityEnum.NORMAL, help="verbose also prints every extracted node and relation verdict")
+    parser.add_argument("--trace-path", type=Path, help="Write spans per stage and per LLM call to this JSON-lines file")
+    parser.add_argument("--extractor-model", type=LLMOptions, default=LLMOptions.OPENAI_O3_MINI)
+    parser.add_argument("--entity-index", type=Path, help="Merge duplicate nodes within each document and give entities repeated across the corpus one node_id through this index")
+    args = parser.parse_args()
+    if args.input_dir is None and args.manifest is None:
+        parser.error("one of --input-dir or --manifest is required")
+
+    config = CorpusConfig(
+        input_dir=args.input_dir,
+        manifest=args.manifest,
+        output_dir=args.output_dir,
+        doc_classifier=DocClassifierEngineConfig(
+            llm_model_id=args.classifier_model,
+            markdown=True,
+            debug_mode=False,
+            mode=args.classifier_mode,
+            prefix_tokens=args.classifier_prefix_tokens,
+            local_classifier=LocalClassifierConfig(model_path=args.local_classifier),
+        ),
+        kg_extractor=KGExtractorEngineConfig(
+            llm_model_id=args.extractor_model,
+            entity_resolution=EntityResolutionConfig(enabled=args.entity_index is not None, index_path=args.entity_index),
+        ),
+        tracing=TracingConfig(enabled=args.trace_path is not None, export_path=args.trace_path, verbosity=args.verbosity),
+    )
+    rprint(asyncio.run(run_corpus(config)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import hashlib
+import tempfile
+import time
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Any
+
+from aiohttp import web
+from pydantic import BaseModel, Field
+
+from sw_ai_service.configs import LLMOptions, PDFLoaderEnum, PDFLoaderModeEnum, VerbosityEnum
+from sw_ai_service.doc_classifier.engine import Engine as DocClassifierEngine
+from sw_ai_service.doc_classifier.engine import EngineConfig as DocClassifierEngineConfig
+from sw_ai_service.doc_classifier.local_classifier import UNK
+from sw_ai_service.llm.clients import LLM_CLIENTS
+from sw_ai_service.pdf_content_extractor.engine import Engine as PDFContentExtractorEngine
+from sw_ai_service.pdf_content_extractor.engine import EngineConfig as PDFContentExtractorEngineConfig
+from sw_ai_service.pdf_content_extractor.engine import get_parse_pool, shutdown_parse_pools
+from sw_ai_service.tracing import TRACER, TracingConfig
+
+STAGES = ["parse", "classify", "extract"]
+
+
+class ServiceConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = Field(default=8080, ge=1, le=65535)
+    max_upload_mb: int = Field(default=100, ge=1)
+    pdf_loader_id: PDFLoaderEnum = PDFLoaderEnum.PYPDF
+    page_mode: PDFLoaderModeEnum = PDFLoaderModeEnum.SINGLE
+    parse_workers: int | None = Field(default=None, ge=1)
+    doc_classifier: DocClassifierEngineConfig
+    # validated when the first extraction builds the engine, so the service starts without importing the KG extractor
+    kg_extractor: dict[str, Any] = Field(default_factory=lambda: {"llm_model_id": LLMOptions.OPENAI_O3_MINI}, description="Fields of the KG extractor EngineConfig")
+    tracing: TracingConfig = Field(default_factory=lambda: TracingConfig(verbosity=VerbosityEnum.NORMAL))
+
+
+class StageEvent(BaseModel):
+    stage: str
+    doc_hash: str
+    seconds: float
+    data: dict[str, Any] = Field(default_factory=dict)
+    error: str | None = None
+
+
+class DocumentJob:
+    """Stage events of one document run, every request for the same document replays them from the start and then follows the live ones"""
+
+    def __init__(self, doc_hash: str):
+        self.doc_hash = doc_hash
+        self.events: list[StageEvent] = []
+        self.done = False
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: StageEvent) -> None:
+        async with self._changed:
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def finish(self) -> None:
+        async with self._changed:
+            self.done = True
+            self._changed.notify_all()
+
+    async def follow(self) -> AsyncIterator[StageEvent]:
+        seen = 0
+        while True:
+            async with self._changed:
+                while seen == len(self.events) and not self.done:
+                    await self._changed.wait()
+                events = self.events[seen:]
+            if not events:
+                return
+            for event in events:
+                yield event
+            seen += len(events)
+
+
+class DocumentService:
+    """Long-running pipeline keeping its engines, their HTTP clients and the generated ontology models warm across requests; identical documents in flight share one run"""
+
+    def __init__(self, config: ServiceConfig, workdir: Path, dir_structure: dict | None = None, agent_factory: Any = None, llm: Any = None):
+        """dir_structure, agent_factory and llm replace the ontology package and the LLM clients, e.g. with the fake model of the benchmarks"""
+        self.config = config
+        self.workdir = workdir
+        self.dir_structure = dir_structure
+        self.llm = llm
+        TRACER.configure(config.tracing)
+        self.doc_classifier_engine = DocClassifierEngine(config.doc_classifier, agent_factory=agent_factory)
+        self._kg_extractor_engine: Any = None
+        self._jobs: dict[str, DocumentJob] = {}
+        # running jobs are referenced here so they are not garbage collected while no request follows them
+        self._tasks: set[asyncio.Task] = set()
+        self.requests = 0
+        self.coalesced = 0
+
+    @property
+    def kg_extractor_engine(self) -> Any:
+        if self._kg_extractor_engine is None:
+            from sw_ai_service.kg_extractor.engine import Engine as KGExtractorEngine
+            from sw_ai_service.kg_extractor.engine import EngineConfig as KGExtractorEngineConfig
+
+            self._kg_extractor_engine = KGExtractorEngine(KGExtractorEngineConfig.model_validate(self.config.kg_extractor), llm=self.llm)
+        return self._kg_extractor_engine
+
+    def submit(self, pdf_bytes: bytes, until: str) -> DocumentJob:
+        """Job running the stages up to until on the document, joined when the same document and stages are already in flight"""
+        self.requests += 1
+        key = hashlib.sha256(pdf_bytes + until.encode()).hexdigest()
+        if key in self._jobs:
+            self.coalesced += 1
+            return self._jobs[key]
+        job = self._jobs[key] = DocumentJob(key)
+        task = asyncio.create_task(self._run(job, pdf_bytes, STAGES[: STAGES.index(until) + 1]))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: DocumentJob, pdf_bytes: bytes, stages: list[str]) -> None:
+        pdf_path = self.workdir / f"{job.doc_hash}.pdf"
+        stage = stages[0]
+        start = time.perf_counter()
+        try:
+            with TRACER.span("service.document", doc_hash=job.doc_hash, stages=stages):
+                pdf_path.write_bytes(pdf_bytes)
+                pdf_config = PDFContentExtractorEngineConfig(pdf_loader_id=self.config.pdf_loader_id, page_mode=self.config.page_mode, pdf_path=pdf_path)
+                text = await PDFContentExtractorEngine(pdf_config).arun(get_parse_pool(self.config.pdf_loader_id, self.config.parse_workers))
+                await job.publish(StageEvent(stage=stage, doc_hash=job.doc_hash, seconds=time.perf_counter() - start, data={"characters": len(text)}))
+                if "classify" not in stages:
+                    return
+
+                stage, start = "classify", time.perf_counter()
+                if self.dir_structure is None:
+                    from sw_onto_generation import DIR_STRUCTURE
+
+                    self.dir_structure = DIR_STRUCTURE
+                classification = await self.doc_classifier_engine.arun(text, self.dir_structure)
+                await job.publish(StageEvent(stage=stage, doc_hash=job.doc_hash, seconds=time.perf_counter() - start, data=classification.model_dump(mode="json")))
+                if "extract" not in stages:
+                    return
+
+                stage, start = "extract", time.perf_counter()
+                if classification.ontology_name in (None, UNK):
+                    await job.publish(StageEvent(stage=stage, doc_hash=job.doc_hash, seconds=0.0, data={"skipped": True}))
+                    return
+                from sw_onto_generation.utils import get_all_common_and_specific_root_classes
+
+                from sw_ai_service.kg_extractor.graph_export import node_record, relation_record
+
+                node_classes_list, relation_classes_list = get_all_common_and_specific_root_classes(lib_name=classification.lib_name, ontology_name=classification.ontology_name)
+                full_nodes, full_relations, merges = await self.kg_extractor_engine.run(text, node_classes_list, relation_classes_list, classification.ontology_name)
+                data = {
+                    "nodes": [node_record(node) for node in full_nodes],
+                    "relations": [relation_record(relation) for relation in full_relations],
+                    "merges": [merge.model_dump(mode="json") for merge in merges],
+                }
+                await job.publish(StageEvent(stage=stage, doc_hash=job.doc_hash, seconds=time.perf_counter() - start, data=data))
+        except Exception as exc:
+            TRACER.log(f"[red]Document {job.doc_hash} failed in stage {stage}: {exc!r}")
+            await job.publish(StageEvent(stage=stage, doc_hash=job.doc_hash, seconds=time.perf_counter() - start, error=repr(exc)))
+        finally:
+            del self._jobs[job.doc_hash]
+            pdf_path.unlink(missing_ok=True)
+            await job.finish()
+
+    async def handle_document(self, request: web.Request) -> web.StreamResponse:
+        """POST /documents?until=<stage> with the PDF as body, streams one JSON line per finished stage"""
+        until = request.query.get("until", STAGES[-1])
+        if until not in STAGES:
+            raise web.HTTPBadRequest(text=f"until must be one of {STAGES}")
+        pdf_bytes = await request.read()
+        if not pdf_bytes:
+            raise web.HTTPBadRequest(text="the request body must be a PDF")
+        job = self.submit(pdf_bytes, until)
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async for event in job.follow():
+            await response.write((event.model_dump_json() + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok", "in_flight": len(self._jobs), "requests": self.requests, "coalesced": self.coalesced})
+
+    async def close(self) -> None:
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        shutdown_parse_pools()
+        await LLM_CLIENTS.aclose()
+        TRACER.report()
+
+
+def create_app(service: DocumentService) -> web.Application:
+    app = web.Application(client_max_size=service.config.max_upload_mb * 1024**2)
+    app.router.add_post("/documents", service.handle_document)
+    app.router.add_get("/health", service.handle_health)
+
+    async def close(_: web.Application) -> None:
+        await service.close()
+
+    app.on_cleanup.append(close)
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve the pipeline over HTTP, stage results are streamed as JSON lines")
+    parser.add_argument("--host", default=ServiceConfig.model_fields["host"].default)
+    parser.add_argument("--port", type=int, default=ServiceConfig.model_fields["port"].default)
+    parser.add_argument("--pdf-loader", type=PDFLoaderEnum, default=PDFLoaderEnum.PYPDF)
+    parser.add_argument("--classifier-model", type=LLMOptions, default=LLMOptions.OPENAI_GPT4_1_NANO)
+    parser.add_argument("--extractor-model", type=LLMOptions, default=LLMOptions.OPENAI_O3_MINI)
+    parser.add_argument("--verbosity", type=VerbosityEnum, default=VerbosityEnum.NORMAL)
+    parser.add_argument("--trace-path", type=Path, help="Write spans per request stage and per LLM call to this JSON-lines file")
+    args = parser.parse_args()
+
+    config = ServiceConfig(
+        host=args.host,
+        port=args.port,
+        pdf_loader_id=args.pdf_loader,
+        doc_classifier=DocClassifierEngineConfig(llm_model_id=args.classifier_model, markdown=False, debug_mode=False),
+        kg_extractor={"llm_model_id": args.extractor_model},
+        tracing=TracingConfig(enabled=args.trace_path is not None, export_path=args.trace_path, verbosity=args.verbosity),
+    )
+    with tempfile.TemporaryDirectory() as workdir:
+        web.run_app(create_app(DocumentService(config, Path(workdir))), host=config.host, port=config.port)
+
+
+if __name__ == "__main__":
+    main()
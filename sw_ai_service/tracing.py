@@ -0,0 +1,154 @@
+import json
+import os
+import time
+from collections import defaultdict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel, Field
+from rich import print as rprint
+
+from sw_ai_service.configs import VerbosityEnum
+
+VERBOSITY_ORDER = [VerbosityEnum.QUIET, VerbosityEnum.NORMAL, VerbosityEnum.VERBOSE]
+# finished spans are written to the export file in batches of this size
+FLUSH_EVERY = 1_000
+# attributes summed per span name in the summary
+SUMMED_ATTRIBUTES = ["prompt_tokens", "cached_prompt_tokens", "completion_tokens", "estimated_prompt_tokens", "estimated_completion_tokens", "retries", "cache_hit"]
+
+
+class TracingConfig(BaseModel):
+    enabled: bool = Field(default=False, description="Record spans per engine stage and per LLM call")
+    export_path: Path | None = Field(default=None, description="JSON-lines file the spans are appended to, one OpenTelemetry-style span per line")
+    verbosity: VerbosityEnum = Field(default=VerbosityEnum.VERBOSE, description="Console output, quiet prints nothing, normal prints stage summaries, verbose also prints every node and verdict")
+
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: str | None, attributes: dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = attributes
+        self.error: str | None = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, key: str, value: float) -> None:
+        self.attributes[key] = self.attributes.get(key, 0) + value
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": self.attributes,
+            "status": {"code": "ERROR", "message": self.error} if self.error is not None else {"code": "OK"},
+        }
+
+
+class _NoopSpan(Span):
+    def __init__(self) -> None:
+        super().__init__("noop", "", None, {})
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+_CURRENT_SPAN: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """Process-wide spans for engine stages and LLM calls plus verbosity-aware console logging; the current span follows asyncio tasks through a context variable"""
+
+    def __init__(self, config: TracingConfig | None = None):
+        self.config = config or TracingConfig()
+        self._finished: list[Span] = []
+        self._totals: dict[str, dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def configure(self, config: TracingConfig) -> None:
+        self.flush()
+        self.config = config
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Times the block as a child of the current span, exceptions mark the span as failed and propagate"""
+        if not self.config.enabled:
+            yield _NOOP_SPAN
+            return
+        parent = _CURRENT_SPAN.get()
+        span = Span(name, parent.trace_id if parent is not None else os.urandom(16).hex(), parent.span_id if parent is not None else None, attributes)
+        token = _CURRENT_SPAN.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.error = repr(exc)
+            raise
+        finally:
+            _CURRENT_SPAN.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def current(self) -> Span:
+        """Innermost open span, a no-op span when tracing is off or no span is open"""
+        return _CURRENT_SPAN.get() or _NOOP_SPAN
+
+    def _finish(self, span: Span) -> None:
+        totals = self._totals[span.name]
+        totals["count"] += 1
+        totals["seconds"] += span.duration
+        totals["errors"] += span.error is not None
+        for key in SUMMED_ATTRIBUTES:
+            if isinstance(span.attributes.get(key), int | float):
+                totals[key] += span.attributes[key]
+        if self.config.export_path is not None:
+            self._finished.append(span)
+            if len(self._finished) >= FLUSH_EVERY:
+                self.flush()
+
+    def flush(self) -> None:
+        if not self._finished or self.config.export_path is None:
+            self._finished.clear()
+            return
+        self.config.export_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.config.export_path.open("a", encoding="utf-8") as f:
+            for span in self._finished:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+        self._finished.clear()
+
+    def enabled_for(self, level: VerbosityEnum) -> bool:
+        return VERBOSITY_ORDER.index(level) <= VERBOSITY_ORDER.index(self.config.verbosity)
+
+    def log(self, *objects: Any, level: VerbosityEnum = VerbosityEnum.NORMAL) -> None:
+        if self.enabled_for(level):
+            rprint(*objects)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {name: dict(totals) for name, totals in self._totals.items()}
+
+    def report(self) -> None:
+        if self.config.enabled:
+            self.log("Trace summary per span: ", self.summary())
+        self.flush()
+
+
+TRACER = Tracer()
@@ -0,0 +1,77 @@
+import asyncio
+import enum
+from pathlib import Path
+
+import pytest
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel, Field
+
+from sw_ai_service.benchmark.fake_llm import FakeLLM, FakeLLMConfig, FakeLLMError
+from sw_ai_service.benchmark.run import Benchmark, BenchmarkConfig, BenchmarkScenario
+from sw_ai_service.llm.scheduler import LLMScheduler, SchedulerConfig
+
+
+class Role(enum.StrEnum):
+    LANDLORD = "landlord"
+    TENANT = "tenant"
+
+
+class Party(BaseModel):
+    name: str
+    role: Role
+    share: int = Field(ge=0, le=100)
+
+
+class Contract(BaseModel):
+    title: str | None = None
+    parties: list[Party]
+    signed: bool
+
+
+def test_fake_llm_returns_schema_valid_outputs_through_a_chain() -> None:
+    fake = FakeLLM(FakeLLMConfig(latency_seconds=0, list_items=3))
+    chain = ChatPromptTemplate.from_messages([("system", "Extract the contract"), ("user", "{text}")]) | fake.with_structured_output(Contract)
+
+    contract = asyncio.run(chain.ainvoke({"text": "Kira sözleşmesi"}))
+    assert isinstance(contract, Contract)
+    assert len(contract.parties) == 3
+    assert all(party.role == Role.LANDLORD and party.share == 100 for party in contract.parties)
+    assert fake.stats.calls == 1 and fake.stats.input_tokens > 0 and fake.stats.output_tokens > 0
+
+
+def test_fake_llm_errors_are_retried_by_the_scheduler() -> None:
+    fake = FakeLLM(FakeLLMConfig(latency_seconds=0, error_rate=0.3, seed=1))
+    scheduler = LLMScheduler(SchedulerConfig(base_delay=0.001, max_delay=0.01, max_retries=20))
+
+    async def run() -> list[BaseModel]:
+        return await asyncio.gather(*[scheduler.submit(lambda: fake.arespond("prompt", Party), model=fake.model_name) for _ in range(20)])
+
+    assert len(asyncio.run(run())) == 20
+    assert fake.stats.errors == scheduler.stats.retries > 0
+
+
+def test_fake_llm_enforces_its_rate_limit() -> None:
+    fake = FakeLLM(FakeLLMConfig(latency_seconds=0, requests_per_minute=2))
+    fake.respond("a", Party)
+    fake.respond("b", Party)
+    with pytest.raises(FakeLLMError) as exc_info:
+        fake.respond("c", Party)
+    assert exc_info.value.status_code == 429
+    assert fake.stats.rate_limited == 1
+
+
+def test_benchmark_parses_and_classifies_synthetic_documents(tmp_path: Path) -> None:
+    config = BenchmarkConfig(
+        scenarios=[BenchmarkScenario(name="tiny", pages=3, lines_per_page=2)],
+        stages=["parse", "classify"],
+        fake_llm=FakeLLMConfig(latency_seconds=0, error_rate=0.2),
+        parse_workers=1,
+    )
+    results = asyncio.run(Benchmark(config, tmp_path, dir_structure={"Sozlesmeler": {"KiraSozlesmesi": {}}}).run())
+
+    assert [result.stage for result in results] == ["parse", "classify"]
+    assert results[0].llm_calls == 0 and results[0].details["pages"] == 3
+    # the classifier has no retry path, it runs without errors whatever the configured rate and says so
+    assert results[1].details == {"lib_name": "Sozlesmeler", "ontology_name": "KiraSozlesmesi", "error_rate": 0.0}
+    assert results[1].llm_errors == 0
+    assert results[1].llm_calls == 2 and results[1].tokens_estimated > 0
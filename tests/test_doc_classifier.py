@@ -0,0 +1,97 @@
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from sw_ai_service.benchmark.fake_llm import FakeAgent, FakeLLM, FakeLLMConfig
+from sw_ai_service.configs import ClassificationModeEnum, LLMOptions
+from sw_ai_service.doc_classifier.engine import DocClassifierResponse, Engine, EngineConfig, document_type_classification_response, document_types
+from sw_ai_service.doc_classifier.local_classifier import LocalClassifier, LocalClassifierConfig
+
+DIR_STRUCTURE: dict[str, dict] = {"Sozlesmeler": {"KiraSozlesmesi": {}, "IsSozlesmesi": {}}, "Dilekceler": {"IcraDilekcesi": {}}}
+
+
+def make_engine(**kwargs: Any) -> Engine:
+    return Engine(EngineConfig(llm_model_id=LLMOptions.OPENAI_GPT4_1_NANO, markdown=False, debug_mode=False, **kwargs))
+
+
+def test_combined_response_covers_every_library_and_ontology() -> None:
+    names = document_types(DIR_STRUCTURE)
+    assert names == ("Sozlesmeler/KiraSozlesmesi", "Sozlesmeler/IsSozlesmesi", "Dilekceler/IcraDilekcesi", "UNK")
+
+    engine = make_engine(mode=ClassificationModeEnum.COMBINED)
+    response_model = document_type_classification_response(names)
+    confident = response_model(document_type="Sozlesmeler/IsSozlesmesi", score=90, rationale="")
+    unsure = response_model(document_type="Sozlesmeler/IsSozlesmesi", score=20, rationale="")
+    assert engine._document_type_result(confident) == DocClassifierResponse(lib_name="Sozlesmeler", ontology_name="IsSozlesmesi")
+    assert engine._document_type_result(unsure) == DocClassifierResponse(lib_name="UNK", ontology_name="UNK")
+
+
+def test_prefix_is_escalated_to_full_text_only_below_min_score() -> None:
+    engine = make_engine(prefix_tokens=10, min_score=60)
+    document = "kira " * 100
+    seen: list[str] = []
+    scores: list[int] = []
+
+    def classify(text: str, dir_structure: dict) -> tuple[DocClassifierResponse, int]:
+        seen.append(text)
+        return DocClassifierResponse(lib_name="Sozlesmeler", ontology_name="KiraSozlesmesi"), scores[len(seen) - 1]
+
+    engine._classify = classify  # type: ignore[method-assign]
+    scores.extend([40, 95])
+    assert engine.run(document, DIR_STRUCTURE).ontology_name == "KiraSozlesmesi"
+    assert [len(sample) for sample in seen] == [40, len(document)]
+
+    seen.clear()
+    scores[:] = [80]
+    engine.run(document, DIR_STRUCTURE)
+    assert [len(sample) for sample in seen] == [40]
+
+
+def test_confident_local_prediction_skips_the_llm(tmp_path: Path) -> None:
+    texts = ["kiracı kira bedeli depozito"] * 4 + ["işveren işçi ücret mesai"] * 4
+    labels = ["Sozlesmeler/KiraSozlesmesi"] * 4 + ["Sozlesmeler/IsSozlesmesi"] * 4
+    LocalClassifier.fit(texts, labels).save(tmp_path / "model.npz")
+    engine = make_engine(local_classifier=LocalClassifierConfig(model_path=tmp_path / "model.npz", min_confidence=0.5))
+
+    def classify(text: str, dir_structure: dict) -> tuple[DocClassifierResponse, int]:
+        raise AssertionError("the LLM should not be asked")
+
+    engine._classify = classify  # type: ignore[method-assign]
+    assert engine.run("kiracı depozito kira bedeli", DIR_STRUCTURE) == DocClassifierResponse(lib_name="Sozlesmeler", ontology_name="KiraSozlesmesi")
+
+
+def test_local_unknown_prediction_asks_the_llm(tmp_path: Path) -> None:
+    texts = ["kiracı kira bedeli depozito"] * 4 + ["tarif un şeker yumurta fırın"] * 4
+    labels = ["Sozlesmeler/KiraSozlesmesi"] * 4 + ["UNK"] * 4
+    LocalClassifier.fit(texts, labels).save(tmp_path / "model.npz")
+    engine = make_engine(local_classifier=LocalClassifierConfig(model_path=tmp_path / "model.npz", min_confidence=0.5))
+    assert engine.local_classifier is not None
+    assert engine.local_classifier.predict("un şeker yumurta")[0] == "UNK"
+
+    def classify(text: str, dir_structure: dict) -> tuple[DocClassifierResponse, int]:
+        return DocClassifierResponse(lib_name="Dilekceler", ontology_name="IcraDilekcesi"), 90
+
+    engine._classify = classify  # type: ignore[method-assign]
+    assert engine.run("un şeker yumurta", DIR_STRUCTURE) == DocClassifierResponse(lib_name="Dilekceler", ontology_name="IcraDilekcesi")
+
+
+def test_every_call_gets_a_new_agent() -> None:
+    fake = FakeLLM(FakeLLMConfig(latency_seconds=0))
+    agents: list[FakeAgent] = []
+
+    def agent_factory(response_model: type[BaseModel]) -> FakeAgent:
+        agents.append(fake.agent(response_model))
+        return agents[-1]
+
+    engine = Engine(EngineConfig(llm_model_id=LLMOptions.OPENAI_GPT4_1_NANO, markdown=False, debug_mode=False), agent_factory=agent_factory)
+    response_model = document_type_classification_response(document_types(DIR_STRUCTURE))
+
+    async def classify_concurrently() -> list[Any]:
+        return await asyncio.gather(*[engine._aask(f"belge {i}", response_model) for i in range(3)])
+
+    assert all(isinstance(response, response_model) for response in asyncio.run(classify_concurrently()))
+    engine._ask("belge 3", response_model)
+    # agno agents remember every run, a shared one would keep each document it classified
+    assert len(agents) == 4 and len({id(agent) for agent in agents}) == 4
@@ -0,0 +1,69 @@
+from pathlib import Path
+from typing import Any
+
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.entity_resolution import EntityResolutionConfig, EntityResolver, normalize_text
+
+
+class PartyNode(BaseModel):
+    node_id: str
+    name: str
+    reason: str = ""
+    reference_text: str = ""
+
+
+class AmountNode(BaseModel):
+    node_id: str
+    value: str
+    reference_text: str = ""
+
+
+class SignatureNode(BaseModel):
+    node_id: str
+    reason: str = "Predefined"
+
+
+class FakeRelation(BaseModel):
+    source_node: Any
+    target_node: Any
+
+
+def test_normalize_text_ignores_case_accents_and_punctuation() -> None:
+    assert normalize_text("IŞIK Ltd. Şti.") == normalize_text("ışık ltd sti") == "isik ltd sti"
+
+
+def test_duplicates_merge_and_relations_follow_the_canonical_node() -> None:
+    nodes = [
+        PartyNode(node_id="p1", name="Ahmet Yılmaz", reference_text="Kiracı Ahmet Yılmaz"),
+        PartyNode(node_id="p2", name="AHMET YILMAZ"),
+        PartyNode(node_id="p3", name="Ahmet Yilmaz."),
+        PartyNode(node_id="p4", name="Mehmet Kaya"),
+        AmountNode(node_id="a1", value="10.000 TL"),
+        AmountNode(node_id="a2", value="20.000 TL"),
+        SignatureNode(node_id="s1"),
+        SignatureNode(node_id="s2"),
+    ]
+    relations = [FakeRelation(source_node=nodes[0], target_node=nodes[4]), FakeRelation(source_node=nodes[1], target_node=nodes[4]), FakeRelation(source_node=nodes[3], target_node=nodes[5])]
+    resolver = EntityResolver(EntityResolutionConfig(enabled=True, min_similarity=0.8))
+
+    resolved_nodes, resolved_relations, merges = resolver.resolve(nodes, relations)
+
+    assert [node.node_id for node in resolved_nodes] == ["p1", "p4", "a1", "a2", "s1", "s2"]
+    assert len(resolved_relations) == 2 and resolved_relations[0].source_node is nodes[0]
+    assert {(merge.merged_id, merge.canonical_id) for merge in merges} == {("p2", "p1"), ("p3", "p1")}
+    assert resolver.stats.nodes_in == 8 and resolver.stats.nodes_out == 6
+
+
+def test_entity_index_keeps_ids_stable_across_documents(tmp_path: Path) -> None:
+    config = EntityResolutionConfig(enabled=True, index_path=tmp_path / "entities.sqlite")
+    first, _, _ = EntityResolver(config).resolve([PartyNode(node_id="p1", name="Ahmet Yılmaz")], [])
+    resolver = EntityResolver(config)
+    nodes = [PartyNode(node_id="q1", name="ahmet yılmaz"), PartyNode(node_id="q2", name="Ayşe Demir"), PartyNode(node_id="q3", name="Ahmet YILMAZ", reference_text="Ahmet YILMAZ imza")]
+    second, _, merges = resolver.resolve(nodes, [])
+
+    assert [node.node_id for node in second] == [first[0].node_id, "q2"]
+    # provenance points at the node_id the canonical node ends up with
+    assert [(merge.merged_id, merge.canonical_id, merge.reference_text) for merge in merges] == [("q3", "p1", "Ahmet YILMAZ imza")]
+    assert resolver.index is not None
+    assert resolver.stats.index_hits == 1 and len(resolver.index) == 2
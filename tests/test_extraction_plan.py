@@ -0,0 +1,74 @@
+from types import SimpleNamespace
+from typing import Any, ClassVar
+
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.extraction_plan import ExtractionPlan
+
+
+class FakeNode(BaseModel):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(nodeclass_to_be_created_automatically=None)
+    reason: str = ""
+    reference_text: str = ""
+
+
+class SignatureNode(FakeNode):
+    pass
+
+
+class AddressNode(FakeNode):
+    city: str = ""
+
+
+class DateNode(FakeNode):
+    value: str = ""
+
+
+class PartyNode(FakeNode):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(nodeclass_to_be_created_automatically=SignatureNode)
+    name: str
+    address: AddressNode | None = None
+    birth_date: DateNode | None = None
+
+
+class FakeRelation(BaseModel):
+    source_node: Any
+    target_node: Any
+    reason: str
+    reference_text: str
+
+
+def make_plan() -> tuple[ExtractionPlan, list[type]]:
+    requested = []
+
+    def relation_class_of(node_class: type) -> type[FakeRelation]:
+        requested.append(node_class)
+        return FakeRelation
+
+    return ExtractionPlan([SignatureNode], [AddressNode, DateNode], relation_class_of), requested
+
+
+def test_plan_is_compiled_once_per_class() -> None:
+    plan, requested = make_plan()
+    first = plan.for_class(PartyNode)
+    assert plan.for_class(PartyNode) is first
+    assert [name for name, _ in first.case2_fields] == ["address", "birth_date"]
+    assert first.case1_class is SignatureNode
+    expected: list[type] = [AddressNode, DateNode]
+    assert requested == expected
+
+
+def test_case1_nodes_are_created_once_per_class() -> None:
+    plan, _ = make_plan()
+    case1_nodes = plan.case1_nodes([PartyNode(name="A"), PartyNode(name="B"), AddressNode()])
+    assert [type(node) for node in case1_nodes] == [SignatureNode]
+
+
+def test_case2_children_are_moved_out_and_linked() -> None:
+    plan, _ = make_plan()
+    address = AddressNode(city="İzmir")
+    parents = [PartyNode(name="A", address=address), PartyNode(name="B")]
+    case2_nodes, relations = plan.case2_nodes_and_relations(parents)
+    assert case2_nodes == [address]
+    assert relations[0].source_node is parents[0] and relations[0].target_node is address
+    assert all("address" not in parent.__dict__ and "birth_date" not in parent.__dict__ for parent in parents)
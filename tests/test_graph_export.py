@@ -0,0 +1,73 @@
+import json
+from pathlib import Path
+
+import networkx as nx
+import pytest
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.entity_resolution import EntityMerge
+from sw_ai_service.kg_extractor.graph_export import aggregate_graph, build_graph, compute_layout, export_graph, render_html
+
+
+class Node(BaseModel):
+    node_id: str
+    name: str
+    reason: str = "Predefined"
+    reference_text: str = "Predefined"
+
+
+class Party(Node):
+    pass
+
+
+class Contract(Node):
+    pass
+
+
+class HasParty(BaseModel):
+    source_node: Node
+    target_node: Node
+    reason: str = ""
+    reference_text: str = ""
+
+
+def make_graph_inputs(n_parties: int) -> tuple[list[Node], list[HasParty]]:
+    contract = Contract(node_id="contract", name="Kira sözleşmesi")
+    parties = [Party(node_id=f"party-{i}", name=f"Taraf {i}") for i in range(n_parties)]
+    return [contract, *parties], [HasParty(source_node=contract, target_node=party) for party in parties]
+
+
+def test_export_graph_writes_tables_and_graphml(tmp_path: Path) -> None:
+    nodes, relations = make_graph_inputs(3)
+    export_graph(nodes, relations, tmp_path)
+
+    node_lines = (tmp_path / "nodes.jsonl").read_text(encoding="utf-8").splitlines()
+    relation_lines = (tmp_path / "relations.jsonl").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["class"] for line in node_lines] == ["Contract", "Party", "Party", "Party"]
+    assert json.loads(relation_lines[0])["source"] == "contract"
+    assert nx.read_graphml(tmp_path / "graph.graphml").number_of_edges() == 3
+    assert not (tmp_path / "merges.jsonl").exists()
+
+    merge = EntityMerge(class_name="Party", canonical_id="party-0", merged_id="party-9", score=1.0, reference_text="Taraf 0 imza")
+    export_graph(nodes, relations, tmp_path, [merge])
+    assert EntityMerge.model_validate_json((tmp_path / "merges.jsonl").read_text(encoding="utf-8")) == merge
+
+
+def test_aggregate_graph_clusters_by_class() -> None:
+    nodes, relations = make_graph_inputs(50)
+    aggregated = aggregate_graph(build_graph(nodes, relations))
+
+    assert sorted(aggregated.nodes) == ["Contract", "Party"]
+    assert [attrs["value"] for _, _, attrs in aggregated.edges(data=True)] == [50]
+
+
+def test_render_html_uses_static_layout(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    # pyvis copies its javascript assets into the working directory
+    monkeypatch.chdir(tmp_path)
+    nodes, relations = make_graph_inputs(5)
+    graph = build_graph(nodes, relations)
+    assert set(compute_layout(graph)) == set(graph.nodes)
+
+    render_html(graph, tmp_path / "graph.html")
+    html = (tmp_path / "graph.html").read_text(encoding="utf-8")
+    assert '"physics": false' in html or '"enabled": false' in html
@@ -0,0 +1,70 @@
+import asyncio
+from pathlib import Path
+
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.incremental import INCREMENTAL_CHUNK_MAX_TOKENS, IncrementalState, RunMemo, class_fingerprint, content_hash, diff_states, extract_windows
+from sw_ai_service.llm.tokens import split_into_anchored_windows
+
+
+class Party(BaseModel):
+    name: str
+
+
+class PartyWithRole(BaseModel):
+    name: str
+    role: str
+
+
+def test_run_memo_keeps_only_what_the_run_used() -> None:
+    memo = RunMemo({"a": "1", "b": "2"})
+    assert memo.get("a") == "1"
+    assert memo.get("c") is None
+    memo.set("c", "3")
+    assert memo.current == {"a": "1", "c": "3"}
+    assert memo.reused == 1
+
+
+def test_class_fingerprint_changes_with_schema_and_config() -> None:
+    assert class_fingerprint(Party) == class_fingerprint(Party)
+    assert class_fingerprint(Party) != class_fingerprint(PartyWithRole)
+    assert class_fingerprint(Party, "description") != class_fingerprint(Party, "new description")
+
+
+def test_diff_states_and_round_trip(tmp_path: Path) -> None:
+    previous = IncrementalState(llm_model_id="m", chunk_hashes=["c1", "c2"], node_class_hashes={"Party": "p1", "Date": "d1"}, relation_class_hashes={"HasParty": "r1"})
+    current = IncrementalState(llm_model_id="m", chunk_hashes=["c1", "c3"], node_class_hashes={"Party": "p2", "Amount": "a1"}, relation_class_hashes={"HasParty": "r1"})
+    diff = diff_states(previous, current)
+    assert (diff.added_chunks, diff.removed_chunks, diff.unchanged_chunks) == (1, 1, 1)
+    assert diff.changed_node_classes == ["Party", "Amount"]
+    assert diff.removed_node_classes == ["Date"]
+    assert diff.changed_relation_classes == []
+
+    previous.save(tmp_path / "state.json")
+    assert IncrementalState.load(tmp_path / "state.json", "m") == previous
+    assert IncrementalState.load(tmp_path / "state.json", "other").chunk_hashes == []
+
+
+def test_edit_in_one_window_reuses_the_other_windows() -> None:
+    text = "".join(f"Madde {i}: kiracı kira bedelini her ayın {i % 28 + 1}. gününe kadar öder.\n" for i in range(2_000))
+    edited = text.replace("Madde 1000:", "Madde 1000 (değişik):")
+    extracted: list[str] = []
+
+    async def extract(window: str) -> Party:
+        extracted.append(window)
+        return Party(name=content_hash(window))
+
+    async def run(text: str, memo: RunMemo[str]) -> list[Party | None]:
+        return await extract_windows(split_into_anchored_windows(text, INCREMENTAL_CHUNK_MAX_TOKENS), extract, Party, content_hash, memo)
+
+    first = RunMemo[str]()
+    first_results = asyncio.run(run(text, first))
+    assert len(first_results) > 4
+    assert len(extracted) == len(first_results)
+
+    extracted.clear()
+    second = RunMemo(first.current)
+    second_results = asyncio.run(run(edited, second))
+    assert 1 <= len(extracted) <= 2
+    assert second.reused == len(second_results) - len(extracted)
+    assert sum(result in first_results for result in second_results) == second.reused
@@ -0,0 +1,64 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.utils import merge_ontology_instances, node_content_key, node_dict_to_ontology
+
+
+class PartyNode(BaseModel):
+    node_id: str
+    name: str
+    reference_text: str = ""
+
+
+class ContractDateNode(BaseModel):
+    node_id: str
+    date: str
+    reference_text: str = ""
+
+
+ONTOLOGY = node_dict_to_ontology({"PartyNode": (PartyNode, True, "Taraflar"), "ContractDateNode": (ContractDateNode, False, "Sözleşme tarihi")})
+
+
+def window(parties: list[PartyNode] | None = None, date: ContractDateNode | None = None) -> BaseModel:
+    """Extraction of one window, like the LLM a window leaves out what it did not find"""
+    fields = {"party_nodes": parties, "contractdate_node": date}
+    return ONTOLOGY(**{name: value for name, value in fields.items() if value is not None})
+
+
+def merge(windows: list[BaseModel | None]) -> Any:
+    return merge_ontology_instances(ONTOLOGY, windows)
+
+
+def test_node_content_key_ignores_ids_and_provenance() -> None:
+    assert node_content_key(PartyNode(node_id="1", name="Ahmet", reference_text="a")) == node_content_key(PartyNode(node_id="2", name="Ahmet", reference_text="b"))
+    assert node_content_key(PartyNode(node_id="1", name="Ahmet")) != node_content_key(PartyNode(node_id="1", name="Ayşe"))
+
+
+def test_list_fields_are_unioned_by_content_in_window_order() -> None:
+    first = PartyNode(node_id="1", name="Ahmet", reference_text="ilk pencere")
+    windows: list[BaseModel | None] = [
+        window([first, PartyNode(node_id="2", name="Ayşe")]),
+        window([PartyNode(node_id="3", name="Ahmet", reference_text="ikinci pencere"), PartyNode(node_id="4", name="Mehmet")]),
+        window(None),
+    ]
+    merged = merge(windows)
+    assert [party.name for party in merged.party_nodes] == ["Ahmet", "Ayşe", "Mehmet"]
+    # the first extraction of a duplicate is kept with its provenance
+    assert merged.party_nodes[0] is first
+
+
+def test_single_fields_take_the_majority_and_ties_go_to_the_earliest_window() -> None:
+    dates = [ContractDateNode(node_id=str(i), date=date) for i, date in enumerate(["2024-01-01", "2024-02-01", "2024-02-01"])]
+    majority = merge([window(date=date) for date in dates])
+    assert majority.contractdate_node is dates[1]
+
+    tie = merge([window(date=dates[1]), window(date=None), window(date=dates[0])])
+    assert tie.contractdate_node is dates[1]
+
+
+def test_windows_without_values_merge_to_an_empty_instance() -> None:
+    cases: list[list[BaseModel | None]] = [[None, None], [window(), None, window([])]]
+    for windows in cases:
+        merged = merge(windows)
+        assert merged.party_nodes is None and merged.contractdate_node is None
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pydantic import BaseModel
+
+from sw_ai_service.configs import CacheModeEnum
+from sw_ai_service.llm.cache import CacheConfig, CacheMissError, LLMResponseCache
+
+
+class Answer(BaseModel):
+    value: bool
+    reason: str
+
+
+def make_cache(tmp_path: Path, **kwargs: Any) -> LLMResponseCache:
+    return LLMResponseCache(CacheConfig(path=tmp_path / "cache.sqlite", **kwargs))
+
+
+def test_cache_hits_skip_the_call(tmp_path: Path) -> None:
+    cache = make_cache(tmp_path, mode=CacheModeEnum.READ_WRITE)
+    calls = 0
+
+    async def call() -> Answer:
+        nonlocal calls
+        calls += 1
+        return Answer(value=True, reason="evet")
+
+    async def run() -> list[Answer]:
+        return [await cache.get_or_call(call, model="test-model", prompt="prompt", response_model=Answer) for _ in range(3)]
+
+    assert asyncio.run(run()) == [Answer(value=True, reason="evet")] * 3
+    assert calls == 1
+    assert cache.stats.hits == 2
+    assert cache.stats.misses == 1
+
+
+def test_cache_key_depends_on_model_prompt_and_schema() -> None:
+    class OtherAnswer(BaseModel):
+        value: bool
+
+    key = LLMResponseCache.make_key("test-model", "prompt", Answer)
+    assert key == LLMResponseCache.make_key("test-model", "prompt", Answer)
+    assert key != LLMResponseCache.make_key("other-model", "prompt", Answer)
+    assert key != LLMResponseCache.make_key("test-model", "other prompt", Answer)
+    assert key != LLMResponseCache.make_key("test-model", "prompt", OtherAnswer)
+
+
+def test_cache_persists_across_instances_and_replays(tmp_path: Path) -> None:
+    cache = make_cache(tmp_path, mode=CacheModeEnum.READ_WRITE)
+    cache.get_or_run(lambda: Answer(value=False, reason="hayır"), model="test-model", prompt="prompt", response_model=Answer)
+
+    replay = make_cache(tmp_path, mode=CacheModeEnum.REPLAY)
+    assert replay.get_or_run(lambda: pytest.fail("should not be called"), model="test-model", prompt="prompt", response_model=Answer).reason == "hayır"
+    with pytest.raises(CacheMissError):
+        replay.get_or_run(lambda: Answer(value=True, reason=""), model="test-model", prompt="new prompt", response_model=Answer)
+
+
+def test_cache_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = make_cache(tmp_path, mode=CacheModeEnum.READ_WRITE, max_entries=2)
+    keys = [cache.make_key("test-model", f"prompt {i}", Answer) for i in range(3)]
+    cache.set(keys[0], Answer(value=True, reason="0"))
+    cache.set(keys[1], Answer(value=True, reason="1"))
+    time.sleep(0.01)
+    assert cache.get(keys[0], Answer) is not None
+    cache.set(keys[2], Answer(value=True, reason="2"))
+    assert cache.get(keys[1], Answer) is None
+    assert cache.get(keys[0], Answer) is not None
+    assert cache.stats.evictions == 1
+
+
+def test_cache_expires_entries_after_ttl(tmp_path: Path) -> None:
+    cache = make_cache(tmp_path, mode=CacheModeEnum.READ_WRITE, ttl_seconds=0.01)
+    key = cache.make_key("test-model", "prompt", Answer)
+    cache.set(key, Answer(value=True, reason=""))
+    time.sleep(0.02)
+    assert cache.get(key, Answer) is None
@@ -0,0 +1,44 @@
+import asyncio
+import importlib.util
+
+import pytest
+from pydantic import BaseModel
+
+from sw_ai_service.benchmark.fake_llm import FakeLLM
+from sw_ai_service.llm.clients import LLMClientConfig, LLMClientRegistry
+
+
+class Verdict(BaseModel):
+    value: bool
+
+
+class Other(BaseModel):
+    name: str
+
+
+def test_structured_runnables_are_built_once_per_model_and_schema() -> None:
+    registry = LLMClientRegistry()
+    fake, other_fake = FakeLLM(), FakeLLM()
+    runnable = registry.structured_output(fake, Verdict, strict=True)
+    assert registry.structured_output(fake, Verdict, strict=True) is runnable
+    assert registry.structured_output(fake, Other, strict=True) is not runnable
+    assert registry.structured_output(fake, Verdict) is not runnable
+    assert registry.structured_output(other_fake, Verdict, strict=True) is not runnable
+
+
+def test_chat_models_share_one_pool_until_closed(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    registry = LLMClientRegistry(LLMClientConfig(max_connections=8))
+    model = registry.chat_model("gpt-4.1-nano")
+    assert registry.chat_model("gpt-4.1-nano") is model
+    assert registry.chat_model("o3-mini").http_async_client is model.http_async_client is registry.http_async_client()
+
+    asyncio.run(registry.aclose())
+    assert registry.chat_model("gpt-4.1-nano") is not model
+    assert model.http_async_client.is_closed
+
+
+def test_http2_is_opt_in_and_needs_h2(monkeypatch: pytest.MonkeyPatch) -> None:
+    assert LLMClientRegistry()._client_options()["http2"] is False
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name: None)
+    assert LLMClientRegistry(LLMClientConfig(http2=True))._client_options()["http2"] is False
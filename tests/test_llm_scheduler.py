@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from sw_ai_service.llm.scheduler import LATENCY_WINDOW, LLMScheduler, RateLimit, SchedulerConfig, SchedulerStats
+
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+
+def test_scheduler_caps_in_flight_requests() -> None:
+    scheduler = LLMScheduler(SchedulerConfig(max_in_flight=3))
+    peak = 0
+
+    async def call() -> int:
+        nonlocal peak
+        peak = max(peak, scheduler.stats.in_flight)
+        await asyncio.sleep(0.01)
+        return 1
+
+    async def run() -> list[int]:
+        return await asyncio.gather(*[scheduler.submit(call, model="test-model") for _ in range(20)])
+
+    assert sum(asyncio.run(run())) == 20
+    assert peak == 3
+    assert scheduler.stats.completed == 20
+
+
+def test_scheduler_retries_rate_limit_errors() -> None:
+    scheduler = LLMScheduler(SchedulerConfig(base_delay=0.001, max_delay=0.01))
+    attempts = 0
+
+    async def call() -> str:
+        nonlocal attempts
+        attempts += 1
+        if attempts < 3:
+            raise FakeRateLimitError()
+        return "ok"
+
+    assert asyncio.run(scheduler.submit(call, model="test-model")) == "ok"
+    assert scheduler.stats.retries == 2
+
+
+def test_scheduler_does_not_retry_other_errors() -> None:
+    scheduler = LLMScheduler(SchedulerConfig(base_delay=0.001))
+
+    async def call() -> None:
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(scheduler.submit(call, model="test-model"))
+    assert scheduler.stats.failed == 1
+    assert scheduler.stats.retries == 0
+
+
+def test_scheduler_respects_requests_per_minute() -> None:
+    config = SchedulerConfig(rate_limits={"test-model": RateLimit(requests_per_minute=2, tokens_per_minute=1_000)})
+    scheduler = LLMScheduler(config)
+    window = scheduler._window("test-model")
+    window.period = 0.05
+
+    async def call() -> None:
+        return None
+
+    async def run() -> float:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*[scheduler.submit(call, model="test-model", tokens=10) for _ in range(4)])
+        return loop.time() - start
+
+    assert asyncio.run(run()) >= 0.05
+
+
+def test_scheduler_stats_keep_a_bounded_latency_window() -> None:
+    stats = SchedulerStats()
+    stats.latencies.extend(float(i) for i in range(LATENCY_WINDOW + 100))
+    assert len(stats.latencies) == LATENCY_WINDOW
+    assert stats.latencies[0] == 100.0
+    assert stats.summary()["latency_p50"] == 100.0 + LATENCY_WINDOW // 2
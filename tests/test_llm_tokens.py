@@ -0,0 +1,44 @@
+from sw_ai_service.configs import DEFAULT_CONTEXT_LIMITS, LLMOptions
+from sw_ai_service.llm.tokens import batch_by_token_budget, get_context_limits, split_into_anchored_windows, split_into_windows
+
+
+def test_batch_by_token_budget_respects_max_items() -> None:
+    batches = batch_by_token_budget(range(7), cost=lambda _: 1, max_items=3, max_tokens=100)
+    assert batches == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_batch_by_token_budget_respects_max_tokens() -> None:
+    batches = batch_by_token_budget([5, 5, 5, 20, 1], cost=lambda x: x, max_items=10, max_tokens=12)
+    assert batches == [[5, 5], [5], [20], [1]]
+
+
+def test_get_context_limits_falls_back_to_default() -> None:
+    assert get_context_limits(LLMOptions.OPENAI_GPT4o).context_window == 128_000
+    assert get_context_limits("unknown-model") == DEFAULT_CONTEXT_LIMITS
+
+
+def test_split_into_windows_overlaps_and_covers_text() -> None:
+    text = " ".join(f"word{i}" for i in range(500))
+    windows = split_into_windows(text, max_tokens=100, overlap_tokens=10)
+    assert len(windows) > 1
+    assert all(len(window) <= 400 for window in windows)
+    assert windows[0].startswith("word0 ") and windows[-1].endswith("word499")
+    for previous, current in zip(windows, windows[1:]):  # noqa: B905
+        assert previous[-40:].split()[-1] in current
+
+
+def test_split_into_windows_keeps_short_text_whole() -> None:
+    assert split_into_windows("kısa metin", max_tokens=100) == ["kısa metin"]
+
+
+def test_split_into_anchored_windows_realigns_after_an_edit() -> None:
+    lines = [f"Madde {i}: taraflar bu maddeyi {i * 7} gün içinde yerine getirir.\n" for i in range(400)]
+    text = "".join(lines)
+    edited = "".join(lines[:50] + ["Madde 50: değiştirilmiş ve uzatılmış bir hüküm metni.\n"] + lines[51:])
+
+    windows = split_into_anchored_windows(text, max_tokens=200)
+    edited_windows = split_into_anchored_windows(edited, max_tokens=200)
+    assert "".join(windows) == text and "".join(edited_windows) == edited
+    assert all(len(window) <= 800 for window in windows)
+    # only the windows around the edited line differ
+    assert len(set(edited_windows) - set(windows)) <= 2
@@ -0,0 +1,52 @@
+import json
+import random
+from pathlib import Path
+
+from sw_ai_service.doc_classifier.local_classifier import LocalClassifier, load_training_documents, train_and_evaluate
+
+VOCABULARY = {
+    "Sozlesmeler/KiraSozlesmesi": ["kiraya veren", "kiracı", "kira bedeli", "mecur", "depozito", "tahliye"],
+    "Sozlesmeler/IsSozlesmesi": ["işveren", "işçi", "ücret", "mesai", "yıllık izin", "kıdem tazminatı"],
+    "Dilekceler/IcraDilekcesi": ["icra müdürlüğü", "alacaklı", "borçlu", "haciz", "takip talebi", "ödeme emri"],
+}
+
+
+def make_corpus(n_per_type: int, seed: int = 0) -> tuple[list[str], list[str]]:
+    rng = random.Random(seed)  # noqa: S311
+    texts, labels = [], []
+    for label, words in VOCABULARY.items():
+        for _ in range(n_per_type):
+            texts.append(" ".join(rng.choice(words) for _ in range(60)))
+            labels.append(label)
+    return texts, labels
+
+
+def test_train_and_evaluate_separates_document_types(tmp_path: Path) -> None:
+    texts, labels = make_corpus(10)
+    model, report = train_and_evaluate(texts, labels, min_confidence=0.5)
+    assert report.accuracy == 1.0
+    assert report.coverage_at_min_confidence > 0
+    assert sum(calibration_bin.count for calibration_bin in report.bins) == report.n_eval
+
+    model.save(tmp_path / "model.npz")
+    loaded = LocalClassifier.load(tmp_path / "model.npz")
+    assert loaded.labels == model.labels
+    assert loaded.predict(texts[0]) == model.predict(texts[0])
+    assert loaded.predict("depozito kira bedeli tahliye kiracı")[0] == "Sozlesmeler/KiraSozlesmesi"
+
+
+def test_held_out_documents_are_split_between_calibration_and_report() -> None:
+    texts, labels = make_corpus(10)
+    _, report = train_and_evaluate(texts, labels, min_confidence=0.5)
+    assert report.n_calibration == 3
+    assert report.n_eval == 3
+    assert report.n_train + report.n_calibration + report.n_eval == len(texts)
+
+
+def test_load_training_documents_keeps_unknown_as_a_label(tmp_path: Path) -> None:
+    for doc_id, classification in [("a", {"lib_name": "Sozlesmeler", "ontology_name": "KiraSozlesmesi"}), ("b", {"lib_name": "UNK", "ontology_name": "UNK"})]:
+        (tmp_path / doc_id).mkdir()
+        (tmp_path / doc_id / "text.txt").write_text(f"metin {doc_id}", encoding="utf-8")
+        (tmp_path / doc_id / "classification.json").write_text(json.dumps(classification), encoding="utf-8")
+
+    assert load_training_documents(tmp_path) == (["metin a", "metin b"], ["Sozlesmeler/KiraSozlesmesi", "UNK"])
@@ -0,0 +1,22 @@
+from pydantic import BaseModel, create_model
+
+from sw_ai_service.llm.model_registry import ModelRegistry
+
+
+def test_registry_creates_each_class_once() -> None:
+    registry = ModelRegistry()
+    first = registry.get_or_create(("Answer", "value"), lambda: create_model("Answer", value=(bool, False)))
+    second = registry.get_or_create(("Answer", "value"), lambda: create_model("Answer", value=(bool, False)))
+    other = registry.get_or_create(("Answer", "reason"), lambda: create_model("Answer", reason=(str, "")))
+    assert first is second
+    assert first is not other
+    assert (registry.hits, registry.misses) == (1, 2)
+
+
+def test_registry_memoizes_json_schema() -> None:
+    class Answer(BaseModel):
+        value: bool
+
+    registry = ModelRegistry()
+    assert registry.json_schema(Answer) is registry.json_schema(Answer)
+    assert registry.json_schema(Answer)["properties"]["value"]["type"] == "boolean"
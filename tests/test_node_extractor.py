@@ -0,0 +1,94 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from typing import Any, ClassVar
+
+from pydantic import BaseModel, Field
+
+from sw_ai_service.benchmark.fake_llm import FakeLLM, FakeLLMConfig
+from sw_ai_service.configs import NodeGroupModeEnum
+from sw_ai_service.kg_extractor.node_extractor import NodeExtractor
+from sw_ai_service.kg_extractor.utils import node_class_to_node_dict, node_dict_to_ontology
+from sw_ai_service.llm.model_registry import MODEL_REGISTRY
+from sw_ai_service.llm.tokens import estimate_tokens
+
+
+class PartyNode(BaseModel):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(cardinality=True, description="Sözleşmenin tarafları")
+    name: str
+
+
+class DateNode(BaseModel):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(cardinality=False, description="Sözleşme tarihi")
+    value: str
+
+
+class AddressNode(BaseModel):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(cardinality=False, description="Kiralanan taşınmazın adresi")
+    city: str
+
+
+class AmountNode(BaseModel):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(cardinality=False, description="Kira bedeli")
+    value: float
+
+
+class ClauseNode(BaseModel):
+    node_config: ClassVar[SimpleNamespace] = SimpleNamespace(cardinality=True, description="Sözleşmenin maddeleri")
+    number: int
+    text: str = Field(description="Maddenin tam metni, " + "başlığı, alt bentleri ve atıf yaptığı diğer maddeler dahil " * 40)
+
+
+SMALL: list[type[BaseModel]] = [PartyNode, DateNode, AddressNode, AmountNode]
+
+
+class RecordingLLM(FakeLLM):
+    """Fake model keeping the prompts it was sent"""
+
+    def __init__(self) -> None:
+        super().__init__(FakeLLMConfig(latency_seconds=0))
+        self.prompts: list[str] = []
+
+    async def arespond(self, prompt: str, response_model: type[BaseModel]) -> BaseModel:
+        self.prompts.append(prompt)
+        return await super().arespond(prompt, response_model)
+
+
+def schema_tokens(node_class: type[BaseModel]) -> int:
+    return estimate_tokens(json.dumps(MODEL_REGISTRY.json_schema(node_dict_to_ontology(node_class_to_node_dict(node_class))), ensure_ascii=False))
+
+
+def make_extractor(llm: RecordingLLM | None = None, **kwargs: Any) -> NodeExtractor:
+    return NodeExtractor(llm or RecordingLLM(), group_mode=NodeGroupModeEnum.GROUPED, **kwargs)
+
+
+def test_groups_are_capped_by_max_classes() -> None:
+    expected: list[list[type[BaseModel]]] = [[PartyNode, DateNode, AddressNode], [AmountNode]]
+    assert make_extractor(group_max_classes=3).group_node_classes(SMALL) == expected
+
+
+def test_groups_are_capped_by_the_schema_budget() -> None:
+    budget = schema_tokens(PartyNode) + schema_tokens(DateNode)
+    groups = make_extractor(group_max_schema_tokens=budget).group_node_classes(SMALL)
+    assert groups[0] == SMALL[:2]
+    assert [node_class for group in groups for node_class in group] == SMALL
+    assert all(sum(schema_tokens(node_class) for node_class in group) <= budget for group in groups)
+
+
+def test_a_class_over_the_budget_gets_a_group_of_its_own() -> None:
+    budget = sum(schema_tokens(node_class) for node_class in SMALL)
+    assert schema_tokens(ClauseNode) > budget
+    expected: list[list[type[BaseModel]]] = [[PartyNode], [ClauseNode], [DateNode, AddressNode]]
+    assert make_extractor(group_max_schema_tokens=budget).group_node_classes([node_class for group in expected for node_class in group]) == expected
+
+
+def test_per_class_mode_keeps_the_single_class_prompt() -> None:
+    llm, grouped_llm = RecordingLLM(), RecordingLLM()
+    extractor = NodeExtractor(llm)
+    assert extractor.group_node_classes(SMALL) == [[node_class] for node_class in SMALL]
+
+    asyncio.run(extractor._process_node_class_group("Kiracı Ahmet Yılmaz", [PartyNode]))
+    grouped = make_extractor(grouped_llm)
+    asyncio.run(grouped._process_node_class_group("Kiracı Ahmet Yılmaz", [PartyNode, DateNode]))
+    assert extractor._single_class_system_message(PartyNode).strip() in llm.prompts[0]
+    assert grouped._group_system_message([PartyNode, DateNode]).strip() in grouped_llm.prompts[0]
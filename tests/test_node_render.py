@@ -0,0 +1,56 @@
+import enum
+
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.node_render import NodeRenderConfig, NodeRenderer
+from sw_ai_service.llm.tokens import count_tokens, truncate_to_tokens
+
+# unknown to tiktoken, so counts use the offline estimate
+MODEL = "unknown-model"
+
+
+class Currency(enum.Enum):
+    TRY = "TL"
+
+
+class AmountNode(BaseModel):
+    node_id: str = "a1"
+    value: float
+    currency: Currency = Currency.TRY
+    reason: str = "Sözleşmenin ödeme maddesinde geçiyor " * 20
+    reference_text: str = "Kira bedeli aylık 10.000 TL olarak belirlenmiştir " * 20
+
+
+class PartyNode(BaseModel):
+    node_id: str = "p1"
+    name: str
+    description: str | None = None
+    amounts: list[AmountNode] = []
+    reason: str = "Kiracı olarak geçiyor " * 20
+
+
+def test_compact_rendering_projects_content_fields() -> None:
+    renderer = NodeRenderer(MODEL)
+    text = renderer.render(PartyNode(name="Ahmet Yılmaz", amounts=[AmountNode(value=10_000)]))
+    assert text == "PartyNode(name=Ahmet Yılmaz; amounts=[AmountNode(value=10000.0; currency=TL)])"
+    assert renderer.stats.rendered_tokens < renderer.stats.repr_tokens / 5
+
+
+def test_rendering_is_bounded_and_reused() -> None:
+    renderer = NodeRenderer(MODEL, NodeRenderConfig(max_node_tokens=30, max_value_tokens=10))
+    node = PartyNode(name="Ahmet", description="uzun açıklama " * 100)
+    text = renderer.render(node)
+    assert renderer.render(node) is text
+    assert count_tokens(text, MODEL) <= 30 and text.endswith("…)")
+    assert renderer.stats.nodes == 1
+
+
+def test_class_fields_override_and_repr_fallback() -> None:
+    node = PartyNode(name="Ahmet", description="kiracı")
+    assert NodeRenderer(MODEL, NodeRenderConfig(class_fields={"PartyNode": ["description"]})).render(node) == "PartyNode(description=kiracı)"
+    assert NodeRenderer(MODEL, NodeRenderConfig(compact=False)).render(node) == repr(node)
+
+
+def test_truncate_to_tokens_keeps_short_text() -> None:
+    assert truncate_to_tokens("kısa", 10, MODEL) == "kısa"
+    assert count_tokens(truncate_to_tokens("x" * 100, 5, MODEL), MODEL) == 5
@@ -0,0 +1,40 @@
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.node_store import NodeStore
+
+
+class Node(BaseModel):
+    node_id: str
+
+
+class Party(Node):
+    pass
+
+
+class Company(Party):
+    pass
+
+
+class Date(Node):
+    pass
+
+
+def test_node_store_indexes_by_class_ancestors_and_id() -> None:
+    nodes = [Company(node_id="c"), Date(node_id="d"), Party(node_id="p")]
+    store = NodeStore(nodes)
+
+    assert store.of_type(Party) == [nodes[0], nodes[2]]
+    assert store.of_type(Company) == [nodes[0]]
+    assert store.of_type(Node) == nodes
+    assert store.of_type(str) == []
+    assert store.get("d") is nodes[1]
+    assert len(store) == 3
+
+
+def test_node_store_of_types_keeps_insertion_order_without_duplicates() -> None:
+    nodes = [Date(node_id="d"), Company(node_id="c"), Party(node_id="p")]
+    store = NodeStore(nodes)
+    store.add(nodes[0])
+
+    assert store.of_types([Party, Date, Company]) == nodes
+    assert len(store) == 3
@@ -0,0 +1,64 @@
+from pydantic import BaseModel
+
+from sw_ai_service.kg_extractor.pair_pruner import PairPruner, PairPrunerConfig, hashed_ngram_vectors
+
+TEXT = "Kiracı Ahmet Yılmaz. " + "x" * 50_000 + " Kira bedeli 10.000 TL. Depozito 20.000 TL."
+
+
+class FakeNode(BaseModel):
+    name: str
+    reference_text: str
+
+
+def make_nodes() -> list[FakeNode]:
+    return [
+        FakeNode(name="Ahmet Yılmaz", reference_text="Kiracı Ahmet Yılmaz"),
+        FakeNode(name="10.000 TL", reference_text="Kira bedeli 10.000 TL"),
+        FakeNode(name="20.000 TL", reference_text="Depozito 20.000 TL"),
+    ]
+
+
+def test_hashed_ngram_vectors_are_normalized() -> None:
+    vectors = hashed_ngram_vectors(["kira bedeli", "kira bedeli", "", "depozito"], ngram_size=3, dim=256)
+    assert abs(float(vectors[0] @ vectors[1]) - 1.0) < 1e-5
+    assert float(vectors[0] @ vectors[3]) < 0.5
+
+
+def test_disabled_pruner_only_skips_self_pairs() -> None:
+    nodes = make_nodes()
+    pruner = PairPruner()
+    pruner.index(nodes, TEXT)
+    pairs = pruner.candidate_pairs(nodes, nodes, "HasRelation")
+    assert len(pairs) == 6
+    assert all(s is not t for s, t in pairs)
+    assert pruner.stats.pruning_rate == 0.0
+
+
+def test_pruner_drops_distant_dissimilar_pairs() -> None:
+    nodes = make_nodes()
+    pruner = PairPruner(PairPrunerConfig(enabled=True, min_score=0.3))
+    pruner.index(nodes, TEXT)
+    pairs = pruner.candidate_pairs(nodes[:1], nodes[1:], "HasRelation")
+    assert pairs == []
+    pairs = pruner.candidate_pairs(nodes[1:2], nodes[2:], "HasRelation")
+    assert pairs == [(nodes[1], nodes[2])]
+    assert pruner.stats.candidates == 3
+    assert pruner.stats.kept == 1
+
+
+def test_never_prune_keeps_every_pair() -> None:
+    nodes = make_nodes()
+    pruner = PairPruner(PairPrunerConfig(enabled=True, min_score=1.0, never_prune=["HasRelation"]))
+    pruner.index(nodes, TEXT)
+    assert len(pruner.candidate_pairs(nodes[:1], nodes[1:], "HasRelation")) == 2
+
+
+def test_release_drops_the_node_vectors_but_keeps_the_stats() -> None:
+    nodes = make_nodes()
+    pruner = PairPruner(PairPrunerConfig(enabled=True, min_score=0.0))
+    pruner.index(nodes, TEXT)
+    assert pruner._vectors.shape == (3, 2**12)
+    pruner.candidate_pairs(nodes, nodes, "HasRelation")
+    pruner.release()
+    assert pruner._vectors.size == 0 and pruner._positions.size == 0
+    assert pruner.stats.kept == 6
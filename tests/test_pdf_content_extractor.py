@@ -0,0 +1,148 @@
+import asyncio
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import langchain_community.document_loaders
+import pytest
+from langchain_community.document_loaders import PyPDFLoader
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from sw_ai_service.benchmark.synthetic import make_pdf
+from sw_ai_service.configs import PDFLoaderEnum, PDFLoaderModeEnum
+from sw_ai_service.pdf_content_extractor.engine import (
+    PAGE_SEPARATOR,
+    WARM_IMPORTS,
+    Engine,
+    EngineConfig,
+    chunk_pages,
+    get_parse_pool,
+    has_parse_pool,
+    parse_page_range,
+    shutdown_parse_pool,
+    shutdown_parse_pools,
+)
+
+
+def test_workers_warm_up_the_loader_get_model_imports() -> None:
+    # get_model imports the loaders from langchain_community.document_loaders, which resolves them from this module
+    assert PyPDFLoader.__module__ == "langchain_community.document_loaders.pdf"
+    assert all("langchain_community.document_loaders.pdf" in modules for modules in WARM_IMPORTS.values())
+
+
+def test_chunk_pages_keeps_page_offsets() -> None:
+    pages = [(0, "a" * 10), (1, "b" * 10), (2, "c" * 30)]
+    chunks = list(chunk_pages(pages, max_tokens=6))
+    full_text = PAGE_SEPARATOR.join(text for _, text in pages)
+
+    assert [(chunk.start_page, chunk.end_page) for chunk in chunks] == [(0, 1), (2, 2), (2, 2)]
+    for chunk in chunks:
+        assert full_text[chunk.char_offset : chunk.char_offset + len(chunk.text)] == chunk.text
+    assert all(len(chunk.text) <= 24 for chunk in chunks)
+
+
+def test_chunk_pages_is_lazy() -> None:
+    consumed = []
+
+    def pages() -> Iterator[tuple[int, str]]:
+        for i in range(100):
+            consumed.append(i)
+            yield i, "x" * 40
+
+    chunks = chunk_pages(pages(), max_tokens=10)
+    first = next(chunks)
+    assert first.start_page == 0
+    assert len(consumed) <= 2
+
+
+@pytest.mark.parametrize("page_mode", [PDFLoaderModeEnum.PAGE, PDFLoaderModeEnum.SINGLE])
+def test_arun_matches_run_when_parsing_in_a_process_pool(tmp_path: Path, page_mode: PDFLoaderModeEnum) -> None:
+    pdf_path = tmp_path / "contract.pdf"
+    pdf_path.write_bytes(make_pdf([f"Madde {i}" for i in range(5)]))
+    engine = Engine(EngineConfig(pdf_loader_id=PDFLoaderEnum.PYPDF, page_mode=page_mode, pdf_path=pdf_path, parse_workers=2, pages_per_task=2))
+    try:
+        pages = asyncio.run(engine.aparse_pages())
+        text = asyncio.run(engine.arun(get_parse_pool(PDFLoaderEnum.PYPDF, 2)))
+    finally:
+        shutdown_parse_pools()
+
+    assert [page for page, _ in pages] == [0, 1, 2, 3, 4]
+    assert [page_text for _, page_text in pages] == [f"Madde {i}" for i in range(5)]
+    assert text == engine.run()
+
+
+def test_shutting_down_one_parse_pool_leaves_the_others_running() -> None:
+    try:
+        shared = get_parse_pool(PDFLoaderEnum.PYPDF, 1)
+        get_parse_pool(PDFLoaderEnum.PYPDF, 2)
+        shutdown_parse_pool(PDFLoaderEnum.PYPDF, 2)
+        assert not has_parse_pool(PDFLoaderEnum.PYPDF, 2)
+        assert get_parse_pool(PDFLoaderEnum.PYPDF, 1) is shared
+        assert shared.submit(sum, [1, 2]).result() == 3
+    finally:
+        shutdown_parse_pools()
+
+
+class PagedUnstructuredLoader(BaseLoader):
+    """Stand-in for UnstructuredPDFLoader accepting the same modes, paged mode yields one document per page with a one based page_number"""
+
+    def __init__(self, file_path: Path, mode: str = "single"):
+        if mode not in {"single", "elements", "paged"}:
+            raise ValueError(f"Got {mode} for `mode`")
+        self.file_path = file_path
+        self.mode = mode
+
+    def lazy_load(self) -> Iterator[Document]:
+        pages = [page.extract_text() for page in PdfReader(self.file_path).pages]
+        if self.mode == "single":
+            yield Document(page_content="\n\n".join(pages))
+            return
+        for i, text in enumerate(pages):
+            yield Document(page_content=text, metadata={"page_number": i + 1})
+
+
+def make_contract(tmp_path: Path, pages: int = 5) -> Path:
+    pdf_path = tmp_path / "contract.pdf"
+    pdf_path.write_bytes(make_pdf([f"Madde {i}" for i in range(pages)]))
+    return pdf_path
+
+
+@pytest.mark.parametrize("page_mode", [PDFLoaderModeEnum.PAGE, PDFLoaderModeEnum.SINGLE])
+def test_unstructured_loader_parses_page_ranges_in_its_paged_mode(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, page_mode: PDFLoaderModeEnum) -> None:
+    monkeypatch.setattr(langchain_community.document_loaders, "UnstructuredPDFLoader", PagedUnstructuredLoader)
+    config = EngineConfig(pdf_loader_id=PDFLoaderEnum.UNSTRUCTURED, page_mode=page_mode, pdf_path=make_contract(tmp_path), pages_per_task=2)
+
+    assert parse_page_range(config, 2, 4) == [(2, "Madde 2"), (3, "Madde 3")]
+    # a thread pool keeps the stand-in loader in this process
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        text = asyncio.run(Engine(config).arun(pool))
+    assert text == Engine(config).run()
+
+
+def test_unstructured_loader_streams_pages(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(langchain_community.document_loaders, "UnstructuredPDFLoader", PagedUnstructuredLoader)
+    engine = Engine(EngineConfig(pdf_loader_id=PDFLoaderEnum.UNSTRUCTURED, page_mode=PDFLoaderModeEnum.SINGLE, pdf_path=make_contract(tmp_path), chunk_max_tokens=4))
+
+    assert list(engine.iter_pages()) == [(i, f"Madde {i}") for i in range(5)]
+    chunks = list(engine.iter_chunks())
+    assert [(chunk.start_page, chunk.end_page) for chunk in chunks] == [(0, 1), (2, 3), (4, 4)]
+
+    async def stream() -> tuple[list[tuple[int, str]], int]:
+        return [page async for page in engine.astream_pages()], len([chunk async for chunk in engine.astream_chunks()])
+
+    assert asyncio.run(stream()) == (list(engine.iter_pages()), len(chunks))
+
+
+@pytest.mark.parametrize("page_mode", [PDFLoaderModeEnum.PAGE, PDFLoaderModeEnum.SINGLE])
+def test_real_unstructured_loader_parses_in_a_process_pool_and_streams(tmp_path: Path, page_mode: PDFLoaderModeEnum) -> None:
+    pytest.importorskip("unstructured.partition.pdf")
+    engine = Engine(EngineConfig(pdf_loader_id=PDFLoaderEnum.UNSTRUCTURED, page_mode=page_mode, pdf_path=make_contract(tmp_path), parse_workers=2, pages_per_task=2))
+    try:
+        text = asyncio.run(engine.arun(get_parse_pool(PDFLoaderEnum.UNSTRUCTURED, 2)))
+    finally:
+        shutdown_parse_pools()
+
+    assert all(f"Madde {i}" in text for i in range(5))
+    assert [page for page, _ in engine.iter_pages()] == [0, 1, 2, 3, 4]
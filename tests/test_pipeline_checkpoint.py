@@ -0,0 +1,35 @@
+from pathlib import Path
+
+from sw_ai_service.configs import DocumentStageEnum
+from sw_ai_service.pipeline.checkpoint import CheckpointStore, discover_documents, document_id
+
+
+def test_checkpoint_store_resumes_last_stage(tmp_path: Path) -> None:
+    pdf_path = tmp_path / "contract.pdf"
+    store = CheckpointStore(tmp_path / "checkpoint.jsonl")
+    progress = store.get(pdf_path)
+    assert progress.stage == DocumentStageEnum.PENDING
+
+    store.record(progress.model_copy(update={"stage": DocumentStageEnum.PARSED}))
+    store.record(progress.model_copy(update={"stage": DocumentStageEnum.CLASSIFIED, "error": "boom"}))
+
+    reloaded = CheckpointStore(tmp_path / "checkpoint.jsonl")
+    assert reloaded.get(pdf_path).stage == DocumentStageEnum.CLASSIFIED
+    assert reloaded.get(pdf_path).error == "boom"
+    assert not reloaded.is_done(pdf_path)
+
+
+def test_document_id_distinguishes_equal_names(tmp_path: Path) -> None:
+    assert document_id(tmp_path / "a" / "contract.pdf") != document_id(tmp_path / "b" / "contract.pdf")
+    assert document_id(tmp_path / "a" / "contract.pdf").startswith("contract-")
+
+
+def test_discover_documents_merges_directory_and_manifest(tmp_path: Path) -> None:
+    (tmp_path / "docs" / "nested").mkdir(parents=True)
+    for name in ["docs/a.pdf", "docs/nested/b.pdf", "docs/notes.txt"]:
+        (tmp_path / name).write_bytes(b"")
+    manifest = tmp_path / "manifest.txt"
+    manifest.write_text("# corpus\ndocs/a.pdf\nother.pdf\n", encoding="utf-8")
+
+    paths = discover_documents(tmp_path / "docs", manifest)
+    assert paths == [tmp_path / "docs" / "a.pdf", tmp_path / "docs" / "nested" / "b.pdf", tmp_path / "other.pdf"]
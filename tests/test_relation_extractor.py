@@ -0,0 +1,138 @@
+import asyncio
+import re
+from collections.abc import Callable
+from typing import Any
+
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from sw_ai_service.configs import LLM_CONTEXT_LIMITS, LLMContextLimits
+from sw_ai_service.kg_extractor.relation_extractor import TOKENS_PER_VERDICT, BatchedHasRelation, HasRelation, PairVerdict, RelationExtractor
+
+# unknown to tiktoken, so counts use the offline estimate
+MODEL = "unknown-model"
+
+
+class Party(BaseModel):
+    node_id: str = "p"
+    name: str
+
+
+class HasCounterparty(BaseModel):
+    """Relation class, the checks only use its name"""
+
+
+def pair_names(prompt: str) -> list[str]:
+    """Source and target names of every numbered pair of a batch prompt, in pair order"""
+    nodes = dict(re.findall(r"^(N\d+): Party\(name=(\w+)\)$", prompt, re.MULTILINE))
+    return [f"{nodes[s]}->{nodes[t]}" for s, t in re.findall(r"^\d+: (N\d+) -> (N\d+)$", prompt, re.MULTILINE)]
+
+
+class ScriptedLLM:
+    """Structured-output stand-in, batch prompts are answered by a script and single checks name the pair they were asked about"""
+
+    def __init__(self, batch: Callable[[list[str]], list[PairVerdict]]):
+        self.model_name = MODEL
+        self.batch = batch
+        self.batch_prompts: list[str] = []
+        self.single_checks: list[str] = []
+
+    def respond(self, schema: type[BaseModel], prompt: str) -> BaseModel:
+        if schema is BatchedHasRelation:
+            self.batch_prompts.append(prompt)
+            return BatchedHasRelation(verdicts=self.batch(pair_names(prompt)))
+        names = "->".join(re.findall(r"(?:Source|Target) node: Party\(name=(\w+)\)", prompt))
+        self.single_checks.append(names)
+        return HasRelation(value=True, reason=names)
+
+    def with_structured_output(self, schema: type[BaseModel], include_raw: bool = False, **kwargs: Any) -> RunnableLambda:
+        def invoke(prompt_value: Any) -> dict[str, Any]:
+            return {"raw": AIMessage(content=""), "parsed": self.respond(schema, prompt_value.to_string()), "parsing_error": None}
+
+        async def ainvoke(prompt_value: Any) -> dict[str, Any]:
+            return invoke(prompt_value)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def answer_all(names: list[str]) -> list[PairVerdict]:
+    # answered out of order, the pair_index maps each verdict back to its pair
+    return [PairVerdict(pair_index=i, value=i % 2 == 0, reason=name) for i, name in reversed(list(enumerate(names)))]
+
+
+def make_pairs(n: int) -> list[tuple[Party, Party]]:
+    landlord = Party(name="Ahmet")
+    return [(landlord, Party(node_id=f"t{i}", name=f"Kiraci{i}")) for i in range(n)]
+
+
+def check(llm: ScriptedLLM, pairs: list[tuple[Party, Party]]) -> list[HasRelation]:
+    return asyncio.run(RelationExtractor(llm).check_relations_batch(pairs, HasCounterparty))
+
+
+def test_batch_verdicts_are_mapped_back_by_pair_index() -> None:
+    llm = ScriptedLLM(answer_all)
+    pairs = make_pairs(3)
+    results = check(llm, pairs)
+    assert [result.reason for result in results] == ["Ahmet->Kiraci0", "Ahmet->Kiraci1", "Ahmet->Kiraci2"]
+    assert [result.value for result in results] == [True, False, True]
+    assert llm.single_checks == []
+    # the shared source node is listed once
+    assert len(llm.batch_prompts) == 1 and llm.batch_prompts[0].count("Party(name=Ahmet)") == 1
+
+
+def test_out_of_range_and_missing_indices_are_checked_one_by_one() -> None:
+    def partial(names: list[str]) -> list[PairVerdict]:
+        return [PairVerdict(pair_index=index, value=False, reason="toplu") for index in (len(names), -1, 1)]
+
+    llm = ScriptedLLM(partial)
+    results = check(llm, make_pairs(3))
+    assert [result.reason for result in results] == ["Ahmet->Kiraci0", "toplu", "Ahmet->Kiraci2"]
+    assert sorted(llm.single_checks) == ["Ahmet->Kiraci0", "Ahmet->Kiraci2"]
+
+
+def test_failed_batch_falls_back_to_per_pair_checks_in_order() -> None:
+    def fail(names: list[str]) -> list[PairVerdict]:
+        raise ValueError("truncated response")
+
+    llm = ScriptedLLM(fail)
+    results = check(llm, make_pairs(4))
+    assert [result.reason for result in results] == [f"Ahmet->Kiraci{i}" for i in range(4)]
+    assert len(llm.single_checks) == 4
+
+
+def test_single_pair_skips_the_batch_prompt() -> None:
+    llm = ScriptedLLM(answer_all)
+    assert [result.reason for result in check(llm, make_pairs(1))] == ["Ahmet->Kiraci0"]
+    assert llm.batch_prompts == []
+
+
+def test_batches_respect_batch_size_and_output_limit() -> None:
+    extractor = RelationExtractor(ScriptedLLM(answer_all), batch_size=2)
+    pairs = make_pairs(5)
+    batches = extractor._batch_pairs(pairs, extractor.renderer())
+    assert [len(batch) for batch in batches] == [2, 2, 1]
+    assert [pair for batch in batches for pair in batch] == pairs
+
+    # the default limits allow 16_384 output tokens, about 204 verdicts per response
+    extractor.batch_size = 500
+    assert [len(batch) for batch in extractor._batch_pairs(make_pairs(450), extractor.renderer())] == [204, 204, 42]
+
+
+def test_batches_respect_the_context_budget(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(LLM_CONTEXT_LIMITS, MODEL, LLMContextLimits(context_window=2 * 3 * (TOKENS_PER_VERDICT + 20), max_output_tokens=16_384))
+    extractor = RelationExtractor(ScriptedLLM(answer_all))
+    renderer = extractor.renderer()
+    pairs = make_pairs(7)
+    batches = extractor._batch_pairs(pairs, renderer)
+    assert [pair for batch in batches for pair in batch] == pairs
+    assert all(len(batch) <= 3 for batch in batches) and len(batches) >= 3
+
+
+def test_groups_split_into_batches_keep_the_pair_order() -> None:
+    llm = ScriptedLLM(answer_all)
+    extractor = RelationExtractor(llm, batch_size=2)
+    results = asyncio.run(extractor._check_relation_group(make_pairs(5), HasCounterparty, extractor.renderer()))
+    assert [result.reason for result in results] == [f"Ahmet->Kiraci{i}" for i in range(5)]
+    assert len(llm.batch_prompts) == 2 and len(llm.single_checks) == 1
@@ -0,0 +1,51 @@
+import asyncio
+import json
+from pathlib import Path
+
+from aiohttp.test_utils import TestClient, TestServer
+
+from sw_ai_service.benchmark.fake_llm import FakeLLM, FakeLLMConfig
+from sw_ai_service.benchmark.synthetic import make_pdf, synthetic_pages
+from sw_ai_service.configs import LLMOptions, VerbosityEnum
+from sw_ai_service.doc_classifier.engine import EngineConfig as DocClassifierEngineConfig
+from sw_ai_service.service.app import DocumentService, ServiceConfig, create_app
+from sw_ai_service.tracing import TRACER, TracingConfig
+
+DIR_STRUCTURE: dict[str, dict] = {"Sozlesmeler": {"KiraSozlesmesi": {}}}
+
+
+def test_identical_documents_in_flight_share_one_run(tmp_path: Path) -> None:
+    previous = TRACER.config
+    fake = FakeLLM(FakeLLMConfig(latency_seconds=0.05))
+    config = ServiceConfig(
+        parse_workers=1,
+        doc_classifier=DocClassifierEngineConfig(llm_model_id=LLMOptions.OPENAI_GPT4_1_NANO, markdown=False, debug_mode=False),
+        tracing=TracingConfig(verbosity=VerbosityEnum.QUIET),
+    )
+    service = DocumentService(config, tmp_path, dir_structure=DIR_STRUCTURE, agent_factory=fake.agent)
+    pdf = make_pdf(synthetic_pages(3, lines_per_page=2))
+
+    async def run() -> tuple[list[list[dict]], int, dict]:
+        async with TestClient(TestServer(create_app(service))) as client:
+
+            async def post() -> list[dict]:
+                response = await client.post("/documents?until=classify", data=pdf)
+                assert response.status == 200
+                return [json.loads(line) for line in (await response.text()).splitlines()]
+
+            streams = list(await asyncio.gather(post(), post()))
+            bad = await client.post("/documents?until=render", data=pdf)
+            health = await (await client.get("/health")).json()
+            return streams, bad.status, health
+
+    try:
+        streams, bad_status, health = asyncio.run(run())
+    finally:
+        TRACER.configure(previous)
+
+    assert streams[0] == streams[1]
+    assert [event["stage"] for event in streams[0]] == ["parse", "classify"]
+    assert streams[0][1]["data"] == {"lib_name": "Sozlesmeler", "ontology_name": "KiraSozlesmesi"}
+    assert fake.stats.calls == 2
+    assert bad_status == 400
+    assert health == {"status": "ok", "in_flight": 0, "requests": 2, "coalesced": 1}
@@ -0,0 +1,100 @@
+import asyncio
+import json
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+from pydantic import BaseModel
+
+from sw_ai_service.benchmark.fake_llm import FakeLLM
+from sw_ai_service.configs import CacheModeEnum, VerbosityEnum
+from sw_ai_service.llm.cache import CacheConfig, LLMResponseCache
+from sw_ai_service.llm.clients import LLMClientRegistry, record_agno_usage
+from sw_ai_service.tracing import TRACER, Tracer, TracingConfig
+
+
+class Answer(BaseModel):
+    value: str
+
+
+@pytest.fixture
+def traced(tmp_path: Path) -> Iterator[Path]:
+    export_path = tmp_path / "spans.jsonl"
+    previous = TRACER.config
+    TRACER.configure(TracingConfig(enabled=True, export_path=export_path, verbosity=VerbosityEnum.QUIET))
+    yield export_path
+    TRACER.configure(previous)
+
+
+def read_spans(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_spans_nest_across_tasks_and_record_errors(traced: Path) -> None:
+    async def child(i: int) -> None:
+        with TRACER.span("child", index=i):
+            await asyncio.sleep(0)
+
+    async def run() -> None:
+        with TRACER.span("parent"):
+            await asyncio.gather(child(0), child(1))
+        with pytest.raises(ValueError), TRACER.span("failing"):
+            raise ValueError("boom")
+
+    asyncio.run(run())
+    TRACER.flush()
+    spans = {(span["name"], span["attributes"].get("index")): span for span in read_spans(traced)}
+    parent = spans[("parent", None)]
+    assert spans[("child", 0)]["parentSpanId"] == spans[("child", 1)]["parentSpanId"] == parent["spanId"]
+    assert spans[("child", 0)]["traceId"] == parent["traceId"]
+    assert spans[("failing", None)]["status"]["code"] == "ERROR"
+    assert spans[("failing", None)]["traceId"] != parent["traceId"]
+
+
+def test_cached_llm_calls_are_traced_with_tokens(traced: Path, tmp_path: Path) -> None:
+    cache = LLMResponseCache(CacheConfig(mode=CacheModeEnum.READ_WRITE, path=tmp_path / "cache.sqlite"))
+
+    async def call() -> Answer:
+        return Answer(value="evet")
+
+    for _ in range(2):
+        asyncio.run(cache.get_or_call(call, model="m", prompt="soru " * 40, response_model=Answer))
+    TRACER.flush()
+
+    spans = read_spans(traced)
+    assert [span["attributes"]["cache_hit"] for span in spans] == [False, True]
+    # the call reports no provider usage, so its tokens are only estimated
+    assert "prompt_tokens" not in spans[0]["attributes"]
+    assert spans[0]["attributes"]["estimated_prompt_tokens"] > 0 and spans[0]["attributes"]["estimated_completion_tokens"] > 0
+    assert "estimated_prompt_tokens" not in spans[1]["attributes"]
+    assert TRACER.summary()["llm.call"]["cache_hit"] >= 1
+
+
+def test_llm_calls_record_the_provider_usage(traced: Path) -> None:
+    fake = FakeLLM()
+    runnable = LLMClientRegistry().structured_output(fake, Answer)
+    cache = LLMResponseCache()
+
+    async def call() -> Answer:
+        return await runnable.ainvoke("soru " * 40)
+
+    assert isinstance(asyncio.run(cache.get_or_call(call, model="m", prompt="soru " * 40, response_model=Answer)), Answer)
+    with TRACER.span("agno.call") as span:
+        record_agno_usage({"input_tokens": [10, 5], "output_tokens": [3, 2], "cached_tokens": [4, 0]})
+        assert (span.attributes["prompt_tokens"], span.attributes["completion_tokens"], span.attributes["cached_prompt_tokens"]) == (15, 5, 4)
+    TRACER.flush()
+
+    attributes = read_spans(traced)[0]["attributes"]
+    assert (attributes["prompt_tokens"], attributes["completion_tokens"]) == (fake.stats.input_tokens, fake.stats.output_tokens)
+    assert "estimated_prompt_tokens" not in attributes
+
+
+def test_log_respects_verbosity(capsys: pytest.CaptureFixture[str]) -> None:
+    tracer = Tracer(TracingConfig(verbosity=VerbosityEnum.NORMAL))
+    tracer.log("summary line")
+    tracer.log("per item line", level=VerbosityEnum.VERBOSE)
+    assert capsys.readouterr().out == "summary line\n"
+
+    with tracer.span("disabled") as span:
+        span.set(ignored=True)
+    assert tracer.summary() == {}